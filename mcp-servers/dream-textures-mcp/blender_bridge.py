@@ -7,34 +7,1802 @@ import bpy
 import sys
 import json
 import base64
+import gc
+import hashlib
 import io
 import os
-from flask import Flask, request, jsonify
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# Blender does not put the script directory on sys.path for --python scripts
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bridge_startup import EarlyServer, StartupPhases, bind_listener, parse_args
+
+# Bind the port before anything slow, so orchestrators never see connection
+# refused; the early server answers until Flask takes the socket over in __main__
+startup = StartupPhases()
+if __name__ == '__main__':
+    args = parse_args()
+    startup.enter('bind')
+    listener = bind_listener(args.host, args.port)
+    early_server = EarlyServer(listener, startup)
+    early_server.start()
+    print(f"✓ Listening on http://{args.host}:{args.port}; starting up")
+
+startup.enter('imports')
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
+from werkzeug.serving import make_server
+
+from bridge_cache import ResultCache, SingleFlight
+from bridge_store import JobStore
+from bridge_memory import RECYCLE_EXIT_CODE, MemoryMonitor, rss_bytes, tracemalloc_stats
+from bridge_dispatch import MainThreadDispatcher
+from bridge_encode import EncodedImage, Encoding, encode_image, encoding_for, normalize_format
+from bridge_maps import DERIVABLE_MAPS, PACKINGS, derive_maps, lod_levels, pack_channels
+from bridge_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry as metrics, stage_seconds
+from bridge_transport import client_disconnected, json_safe, render_result
+from bridge_jobs import JobManager, CANCELLED, FINISHED_STATES, SUCCEEDED
+from bridge_tiles import TileBlender, extract_tile, normalize_tiling, tile_grid, tiling_for
+from bridge_scheduler import BULK, INTERACTIVE, PRIORITY_CLASSES, QueueFull
+
+startup.enter('setup')
+app = Flask(__name__)
+CORS(app)
+
+# Max seconds to wait for a single map to finish diffusing
+GENERATION_TIMEOUT = 120
+
+# Number of generations that may run at once (they share one GPU)
+JOB_WORKERS = int(os.environ.get('DREAM_BRIDGE_JOB_WORKERS', '1'))
+
+# Seconds a finished job stays fetchable through /jobs/<id>
+JOB_RETENTION = int(os.environ.get('DREAM_BRIDGE_JOB_RETENTION', '3600'))
+
+# Jobs allowed to wait in the queue, in total and per client; 0 means unbounded
+MAX_QUEUED = int(os.environ.get('DREAM_BRIDGE_MAX_QUEUED', '32'))
+MAX_QUEUED_PER_CLIENT = int(os.environ.get('DREAM_BRIDGE_MAX_QUEUED_PER_CLIENT', '8'))
+
+# Fair-share weights as "client=weight,..."; a client is an API key or X-Client-Id
+CLIENT_WEIGHTS = os.environ.get('DREAM_BRIDGE_CLIENT_WEIGHTS', '')
+
+# Default priority class per job kind; single maps overtake bulk PBR sets
+JOB_PRIORITIES = {
+    'texture': INTERACTIVE,
+    'variations': INTERACTIVE,
+    'refine': INTERACTIVE,
+    'pbr-set': BULK
+}
+
+# Default preview cadence for /jobs/<id>/events; 0 disables previews
+PREVIEW_EVERY = int(os.environ.get('DREAM_BRIDGE_PREVIEW_EVERY', '5'))
+
+# Default longest edge of preview images, in pixels, and the largest a request may ask for
+PREVIEW_SIZE = int(os.environ.get('DREAM_BRIDGE_PREVIEW_SIZE', '128'))
+MAX_PREVIEW_SIZE = 1024
+
+# Seconds between SSE keep-alive comments
+EVENTS_KEEPALIVE = 15
+
+# Seconds between checks that a synchronous request's client is still connected
+DISCONNECT_POLL = 1.0
+
+# Result cache for fixed-seed requests; a disk limit of 0 keeps it in memory only
+CACHE_DIR = os.environ.get('DREAM_BRIDGE_CACHE_DIR', os.path.expanduser('~/.cache/dream-textures-bridge'))
+CACHE_MEMORY_MB = int(os.environ.get('DREAM_BRIDGE_CACHE_MEMORY_MB', '256'))
+CACHE_DISK_MB = int(os.environ.get('DREAM_BRIDGE_CACHE_DISK_MB', '2048'))
+
+# Persistent job store, so pending jobs and finished results survive a restart; empty disables it
+STORE_DIR = os.environ.get('DREAM_BRIDGE_STORE_DIR', os.path.expanduser('~/.local/share/dream-textures-bridge'))
+# Finished jobs are kept this many seconds, and the oldest dropped while result files exceed the size
+STORE_TTL = int(os.environ.get('DREAM_BRIDGE_STORE_TTL', '86400'))
+STORE_MB = int(os.environ.get('DREAM_BRIDGE_STORE_MB', '1024'))
+
+# Threads that encode finished images, off the job workers' critical path
+ENCODE_WORKERS = int(os.environ.get('DREAM_BRIDGE_ENCODE_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+# Above this size maps are generated at TILE_SIZE and refined tile by tile
+# (unless a request sets "tiling": "off"), keeping every diffusion pass tile-sized
+MAX_DIRECT_RESOLUTION = int(os.environ.get('DREAM_BRIDGE_MAX_DIRECT_RESOLUTION', '1024'))
+TILE_SIZE = int(os.environ.get('DREAM_BRIDGE_TILE_SIZE', '512'))
+TILE_OVERLAP = int(os.environ.get('DREAM_BRIDGE_TILE_OVERLAP', '64'))
+
+# Largest resolution a request may ask for; tiled canvases grow with its square
+MAX_RESOLUTION = int(os.environ.get('DREAM_BRIDGE_MAX_RESOLUTION', '4096'))
+
+# "quality": "draft" first generates at most this size and step count, then
+# (unless "refine" is false) upscales and refines the draft with img2img
+DRAFT_RESOLUTION = int(os.environ.get('DREAM_BRIDGE_DRAFT_RESOLUTION', '256'))
+DRAFT_STEPS = int(os.environ.get('DREAM_BRIDGE_DRAFT_STEPS', '8'))
+# img2img strength of the refine pass; enough to add detail, low enough to keep the draft's layout
+DRAFT_REFINE_STRENGTH = 0.55
+# Share of a draft job's progress spent on the draft itself
+DRAFT_PROGRESS = 0.25
+QUALITY_MODES = ('draft', 'final')
+
+# Request fields that only choose how maps are encoded
+ENCODING_FIELDS = ('format', 'compression', 'jpeg_quality', 'quality')
+
+# Encode each finished map while the next one generates; 0 encodes before moving on
+PIPELINE_ENCODE = os.environ.get('DREAM_BRIDGE_PIPELINE', '1') != '0'
+
+# Largest batch submitted to the backend in one generate call; 1 disables batching
+MAX_BATCH_SIZE = int(os.environ.get('DREAM_BRIDGE_MAX_BATCH', '4'))
+
+# Seconds between sweeps of leaked Blender images and orphan datablocks, which
+# also sample RSS for the soft limit; 0 disables both
+MEMORY_SWEEP_INTERVAL = int(os.environ.get('DREAM_BRIDGE_MEMORY_SWEEP', '300'))
+# Above this RSS the bridge stops taking work, drains and exits with
+# RECYCLE_EXIT_CODE for its supervisor to restart it; 0 disables
+MEMORY_SOFT_LIMIT_MB = int(os.environ.get('DREAM_BRIDGE_MEMORY_SOFT_LIMIT_MB', '0'))
+# Seconds a draining bridge waits for its jobs before exiting anyway (a job
+# store re-queues what is left), then for their responses to go out
+DRAIN_TIMEOUT = int(os.environ.get('DREAM_BRIDGE_DRAIN_TIMEOUT', '600'))
+DRAIN_GRACE = 5
+# Frames tracemalloc keeps per allocation for /debug/memory; tracing costs
+# CPU and memory, so 0 leaves it off
+TRACEMALLOC_FRAMES = int(os.environ.get('DREAM_BRIDGE_TRACEMALLOC', '0'))
+
+# Upper bound on LOD levels per /generate-pbr-set request
+MAX_LODS = 8
+
+# Upper bound on images per /generate-variations request
+MAX_VARIATIONS = 16
+
+# Run a tiny generation at startup so the first real request finds the pipeline loaded
+WARMUP = os.environ.get('DREAM_BRIDGE_WARMUP', '1') != '0'
+WARMUP_RESOLUTION = int(os.environ.get('DREAM_BRIDGE_WARMUP_RESOLUTION', '256'))
+WARMUP_STEPS = 2
+
+# Prompt suffixes used by /generate-texture
+TEXTURE_PROMPT_SUFFIXES = {
+    'normal': 'normal map, blue purple surface detail, bump map',
+    'roughness': 'roughness map, grayscale surface variation, smooth to rough',
+    'metallic': 'metallic map, grayscale metal mask, black non-metal white metal',
+    'ao': 'ambient occlusion map, grayscale cavity shadows'
+}
+
+# Prompt suffixes used by /generate-pbr-set
+PBR_SET_PROMPT_SUFFIXES = {
+    'albedo': 'color map, diffuse texture, photorealistic material',
+    'normal': 'normal map, blue purple tangent space, surface detail',
+    'roughness': 'roughness map, grayscale, smooth black rough white',
+    'metallic': 'metallic map, grayscale, metal white non-metal black',
+    'ao': 'ambient occlusion, grayscale, cavity shadows'
+}
+
+# How /generate-pbr-set produces maps other than albedo:
+#   diffuse  one diffusion pass per map
+#   derive   one albedo pass; the rest are computed from it with NumPy kernels
+PBR_SET_MODES = ('diffuse', 'derive')
+
+# Started before the addon loads, so its allocations are attributed too
+if TRACEMALLOC_FRAMES > 0:
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+
+# Read once here so /health never has to touch bpy
+blender_version = bpy.app.version_string
+
+# Owns all bpy access; Blender's main thread serves it (see __main__)
+dispatcher = MainThreadDispatcher()
+
+
+class Runtime:
+    """Backend and models resolved once at startup, plus readiness and warm-up timing"""
+
+    def __init__(self):
+        self.backend = None
+        # The default model, and every installed model by model_base
+        self.model = None
+        self.models = {}
+        self.batching = False
+        self.ready = threading.Event()
+        # Set once the bridge stops taking work to recycle itself
+        self.draining = threading.Event()
+        self.started_at = startup.started_at
+        # Read on the main thread once the addon is enabled, so /health never touches bpy
+        self.addon_enabled = False
+        self.resolve_seconds = None
+        self.warmup_seconds = None
+        self.ready_seconds = None
+        self.error = None
+
+    @property
+    def accepting(self):
+        """Ready and not draining: new work is taken"""
+        return self.ready.is_set() and not self.draining.is_set()
+
+    def to_dict(self):
+        return {
+            'ready': self.accepting,
+            'draining': self.draining.is_set(),
+            'model': self.model.model_base if self.model else None,
+            'batching': self.batching,
+            'resolve_seconds': self.resolve_seconds,
+            'warmup_enabled': WARMUP,
+            'warmup_seconds': self.warmup_seconds,
+            'ready_seconds': self.ready_seconds,
+            'startup': startup.to_dict(),
+            'error': self.error
+        }
+
+
+runtime = Runtime()
+
+cache = ResultCache(CACHE_DIR, CACHE_MEMORY_MB * 1024 * 1024, CACHE_DISK_MB * 1024 * 1024)
+store = JobStore(STORE_DIR, STORE_TTL, STORE_MB * 1024 * 1024) if STORE_DIR else None
+flights = SingleFlight()
+encoder = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix='dream-encode')
+
+# Exposed at GET /metrics; stage timings live in bridge_metrics.stage_seconds
+request_count = metrics.counter(
+    'dream_bridge_requests_total', 'HTTP requests by endpoint, method and status', ('endpoint', 'method', 'status'))
+request_seconds = metrics.histogram(
+    'dream_bridge_request_seconds', 'HTTP request latency by endpoint', ('endpoint', 'method'))
+response_bytes = metrics.counter(
+    'dream_bridge_response_bytes_total', 'Response body bytes returned by endpoint', ('endpoint',))
+generations_in_flight = metrics.gauge(
+    'dream_bridge_generations_in_flight', 'Backend generate calls currently running')
+generation_timeouts = metrics.counter(
+    'dream_bridge_generation_timeouts_total', 'Backend generate calls that hit the deadline')
+map_failures = metrics.counter(
+    'dream_bridge_map_failures_total', 'Maps that failed to generate or derive, by map type', ('map_type',))
+generation_aborts = metrics.counter(
+    'dream_bridge_generation_aborts_total', 'Backend generate calls stopped early, by reason', ('reason',))
+reclaimed_gpu_seconds = metrics.counter(
+    'dream_bridge_reclaimed_gpu_seconds_total', 'Estimated GPU time freed by stopping generations early')
+job_cancellations = metrics.counter(
+    'dream_bridge_job_cancellations_total', 'Jobs cancelled, by reason', ('reason',))
+rss_gauge = metrics.gauge(
+    'dream_bridge_rss_bytes', 'Resident set size of the bridge process')
+purged_datablocks = metrics.counter(
+    'dream_bridge_purged_datablocks_total', 'Leaked images and orphan datablocks removed by memory sweeps', ('kind',))
+queued_jobs_gauge = metrics.gauge(
+    'dream_bridge_queued_jobs', 'Jobs waiting for a worker, by priority class', ('priority',))
+queued_bpy_calls_gauge = metrics.gauge(
+    'dream_bridge_queued_bpy_calls', 'Calls waiting for the Blender main thread')
+
+
+class GenerationError(Exception):
+    """Generation failed in a way that is reported to the client as-is"""
+
+
+class GenerationCancelled(Exception):
+    """
+    The job was cancelled and its generation aborted
+    Not a GenerationError, so per-map error handling lets it through
+    """
+
+
+class ModelWrapper:
+    """
+    Manually set the model since the enum is broken in Blender 4.5.1
+    Exposes the 'id' attribute Dream Textures expects, as a plain Python
+    copy that is safe to read off the main thread
+    """
+
+    def __init__(self, model):
+        self.id = model.model_base  # Use model_base as id
+        self.model = model.model  # Full path
+        self.model_base = model.model_base
+
+
+def expand_prompt(prompt, map_type, suffixes):
+    """Append the map-specific prompt suffix, if any"""
+    suffix = suffixes.get(map_type)
+    return f"{prompt}, {suffix}" if suffix else prompt
+
+
+def find_texture_model():
+    """Get the texture-diffusion model (Model 0 from installed models); main thread only"""
+    addon = bpy.context.preferences.addons.get('dream_textures')
+    if addon and hasattr(addon.preferences, 'installed_models') and len(addon.preferences.installed_models) > 0:
+        texture_model = addon.preferences.installed_models[0]  # dream-textures/texture-diffusion
+        print(f"Using model: {texture_model.model_base}")
+        return ModelWrapper(texture_model)
+
+    raise GenerationError('No models installed. Please install dream-textures/texture-diffusion model.')
+
+
+def find_installed_models():
+    """Every installed model, in the addon's order; main thread only"""
+    addon = bpy.context.preferences.addons.get('dream_textures')
+    installed = getattr(addon.preferences, 'installed_models', []) if addon else []
+    return [ModelWrapper(model) for model in installed if model.model_base]
+
+
+def get_texture_model(name=None):
+    """The named installed model, or the default resolved at startup"""
+    if runtime.model is None:
+        raise GenerationError(runtime.error or 'Bridge is still starting up')
+    if name is None:
+        return runtime.model
+    if name not in runtime.models:
+        raise GenerationError(f"Unknown model '{name}'")
+    return runtime.models[name]
+
+
+def to_pil_image(image):
+    """Accept a PIL image or a float/uint8 NumPy array (as step previews are)"""
+    if hasattr(image, 'save'):
+        return image
+
+    import numpy as np
+    from PIL import Image
+
+    array = np.asarray(image)
+    if array.dtype != np.uint8:
+        array = (np.clip(array, 0.0, 1.0) * 255).astype(np.uint8)
+    return Image.fromarray(array)
+
+
+def encode_preview(image, size):
+    """
+    Downscale an intermediate image and encode it as base64 PNG
+    Timed as its own preview_encode stage, so previews do not skew the
+    encode timings of real outputs
+    """
+    preview = to_pil_image(image).copy()
+    preview.thumbnail((size, size))
+    return base64.b64encode(encode_image(preview, stage='preview_encode')).decode('utf-8')
+
+
+def progress_reporter(job, map_type, map_index=0, map_count=1):
+    """
+    Build an on_step callback that publishes step, ETA and preview events
+    Preview cadence and size come from the job params, falling back to the
+    defaults; previews are only encoded while a client streams the job's events
+    """
+    preview_every = int(job.params.get('preview_every', PREVIEW_EVERY))
+    preview_size = int(job.params.get('preview_size', PREVIEW_SIZE))
+    started = time.monotonic()
+
+    def on_step(result):
+        step = getattr(result, 'progress', 0)
+        total = getattr(result, 'total', 0) or 1
+        elapsed = time.monotonic() - started
+        eta = elapsed / step * (total - step) if step else None
+
+        details = {
+            'map_type': map_type,
+            'step': step,
+            'total': total,
+            'eta': round(eta, 2) if eta is not None else None
+        }
+
+        image = getattr(result, 'image', None)
+        if preview_every > 0 and image is not None and job.watched and (step % preview_every == 0 or step == total):
+            # A failed preview must not hide a cancellation from the step callback
+            try:
+                details['preview'] = encode_preview(image, preview_size)
+            except Exception as e:
+                print(f"✗ Preview encoding failed: {e}")
+
+        job.set_progress((map_index + step / total) / map_count, **details)
+        return not job.cancelled
+
+    return on_step
+
+
+def check_cancelled(job):
+    """Raise GenerationCancelled between generations of a cancelled job"""
+    if job.cancelled:
+        raise GenerationCancelled(f'Job cancelled ({job.cancel_reason})')
+
+
+def set_prompt(gen_args, prompt):
+    """Set the positive prompt (a string, or a list for a batch) on generation args"""
+    if hasattr(gen_args.prompt, 'positive'):
+        gen_args.prompt.positive = prompt
+    else:
+        gen_args.prompt = prompt
+
+
+def supports_batching():
+    """Whether the backend accepts several prompts in one generate call"""
+    return runtime.batching
+
+
+def build_generation_args(prompts, resolution, steps, seed, texture_model):
+    """
+    Build generation arguments for one request; main thread only
+    Starts from the scene's Dream Textures settings but never writes to the
+    scene, so concurrent requests cannot pick up each other's parameters
+    """
+    with stage_seconds.time(stage='args'):
+        scene = bpy.context.scene
+        gen_args = scene.dream_textures_prompt.generate_args(bpy.context)
+
+        set_prompt(gen_args, prompts[0] if len(prompts) == 1 else list(prompts))
+        gen_args.size = (resolution, resolution)
+        gen_args.steps = steps
+        gen_args.seed = seed if seed != -1 else random.randrange(2**31)
+        gen_args.model = texture_model
+
+        if len(prompts) > 1:
+            gen_args.batch_size = len(prompts)
+
+    return gen_args
+
+
+def start_generation(prompts, resolution, steps, seed, texture_model, step_callback, complete_callback):
+    """Build args and hand them to the backend, which calls back from its own thread; main thread only"""
+    gen_args = build_generation_args(prompts, resolution, steps, seed, texture_model)
+    runtime.backend.generate(gen_args, step_callback, complete_callback)
+
+
+def run_generation(prompts, resolution, steps, seed, texture_model, on_step=None):
+    """
+    Run one backend generate call and return its GenerationResults
+
+    Several prompts are submitted as a single batch, so callers must check
+    supports_batching() first. on_step, if given, is called with the latest
+    intermediate result. Only the hand-off to the backend runs on the main
+    thread; waiting happens on the calling thread.
+    """
+    # Resolved by complete_callback on the backend's thread
+    future = Future()
+    started = time.monotonic()
+    # Why the backend should stop at its next step: 'cancelled' (on_step
+    # returned False) or 'deadline'; the first step that sees it aborts
+    stop_reason = None
+    aborted = False
+
+    def step_callback(results):
+        nonlocal stop_reason, aborted
+        if on_step and results:
+            try:
+                if on_step(results[0]) is False and stop_reason is None:
+                    stop_reason = 'cancelled'
+            except Exception as e:
+                print(f"✗ Progress reporting failed: {e}")
+
+        if stop_reason is None:
+            return True  # Continue generation
+
+        if not aborted:
+            aborted = True
+            generation_aborts.inc(reason=stop_reason)
+            step = getattr(results[0], 'progress', 0) if results else 0
+            total = getattr(results[0], 'total', 0) if results else 0
+            if step and total > step:
+                reclaimed_gpu_seconds.inc((time.monotonic() - started) / step * (total - step))
+            print(f"✗ Aborting generation at step {step}/{total} ({stop_reason})")
+        return False
+
+    def complete_callback(result):
+        if future.done():
+            return
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        elif isinstance(result, list) and len(result) >= len(prompts):
+            future.set_result(result[:len(prompts)])
+        else:
+            future.set_exception(GenerationError('Generation failed: backend returned too few images'))
+
+    # A batch gets the time budget of the maps it replaces
+    deadline = started + GENERATION_TIMEOUT * len(prompts)
+    generations_in_flight.inc()
+    try:
+        dispatcher.call(
+            start_generation,
+            prompts, resolution, steps, seed, texture_model,
+            step_callback, complete_callback
+        )
+
+        # Wake as soon as the backend calls back, or give up at the deadline
+        with stage_seconds.time(stage='diffusion'):
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        # Nobody waits for the result any more; free the GPU at the next step
+        stop_reason = stop_reason or 'deadline'
+        generation_timeouts.inc()
+        raise GenerationError('Generation timed out')
+    except GenerationError:
+        raise
+    except Exception as e:
+        if stop_reason == 'cancelled':
+            raise GenerationCancelled('Generation cancelled') from e
+        raise GenerationError(f'Generation failed: {str(e)}')
+    finally:
+        generations_in_flight.dec()
+
+
+def generate_image(prompt, resolution, steps, seed, texture_model, on_step=None, tiling=None):
+    """Run one diffusion pass (or, with tiling, a tiled generation) and return the resulting image"""
+    if tiling is not None:
+        return generate_tiled_image(prompt, resolution, steps, seed, texture_model, tiling, on_step=on_step)
+    return run_generation([prompt], resolution, steps, seed, texture_model, on_step=on_step)[0].image
+
+
+class TileProgress:
+    """Tiles refined so far, shaped like a step result so on_step callbacks take it as progress"""
+
+    image = None
+
+    def __init__(self, progress, total):
+        self.progress = progress
+        self.total = total
+
+
+def generate_tiled_image(prompt, resolution, steps, seed, texture_model, tiling, on_step=None):
+    """
+    Generate at tile size, upscale, then refine overlapping tiles with img2img
+    and feather-blend them back, wrapping around the edges so the result
+    stays seamless
+    """
+    import numpy as np
+    from PIL import Image
+
+    # One time budget covers the base generation and every tile, scaled by
+    # the number of passes the way a batch's budget scales with its prompts
+    passes = 1 + len(tile_grid(resolution, tiling.tile, tiling.overlap))
+    deadline = time.monotonic() + GENERATION_TIMEOUT * passes
+    base = run_generation([prompt], tiling.tile, steps, seed, texture_model, on_step=on_step)[0].image
+    upscaled = to_pil_image(base).convert('RGB').resize((resolution, resolution), Image.LANCZOS)
+    # Every tile refines with the request's seed, so fixed-seed tiled maps are reproducible
+    return refine_tiles(np.asarray(upscaled), prompt, tiling.strength, steps, tiling, seed,
+                        on_step=on_step, deadline=deadline)
+
+
+def refine_tiles(upscaled, prompt, strength, steps, tiling, seed=None, on_step=None, deadline=None):
+    """
+    Refine a square uint8 RGB array tile by tile and feather-blend the tiles back
+    Before each tile on_step gets the tile count as progress and, like the
+    diffusion step callback, stops the run by returning False; the whole run
+    must finish by deadline (default GENERATION_TIMEOUT per tile from now)
+    """
+    import numpy as np
+    from PIL import Image
+
+    resolution = upscaled.shape[0]
+    grid = tile_grid(resolution, tiling.tile, tiling.overlap)
+    if deadline is None:
+        deadline = time.monotonic() + GENERATION_TIMEOUT * len(grid)
+    print(f"Refining {len(grid)} tiles of {tiling.tile}px for {resolution}px output")
+    blender = TileBlender(resolution, tiling.tile, tiling.overlap)
+    for index, (top, left) in enumerate(grid):
+        if on_step is not None and on_step(TileProgress(index, len(grid))) is False:
+            generation_aborts.inc(reason='cancelled')
+            print(f"✗ Aborting tiled refinement at tile {index}/{len(grid)} (cancelled)")
+            raise GenerationCancelled('Generation cancelled')
+        if time.monotonic() > deadline:
+            generation_aborts.inc(reason='deadline')
+            generation_timeouts.inc()
+            print(f"✗ Aborting tiled refinement at tile {index}/{len(grid)} (deadline)")
+            raise GenerationError('Generation timed out')
+        tile = Image.fromarray(extract_tile(upscaled, top, left, tiling.tile))
+        refined = dispatcher.call(refine_in_memory, tile, prompt, strength, steps, tiling.tile, seed)
+        blender.add(top, left, np.asarray(refined.convert('RGB')))
+
+    return Image.fromarray(blender.result())
+
+
+def upscale_and_refine(image, prompt, resolution, steps, seed, strength, tiling=None, on_step=None):
+    """
+    Upscale a draft to resolution and run img2img over it with the draft's seed,
+    through the same in-memory path as /refine-texture; tiled when large, in
+    which case on_step is checked before each tile
+    """
+    import numpy as np
+    from PIL import Image
+
+    upscaled = to_pil_image(image).convert('RGB').resize((resolution, resolution), Image.LANCZOS)
+    with stage_seconds.time(stage='refine'):
+        if tiling is not None:
+            return refine_tiles(np.asarray(upscaled), prompt, strength, steps, tiling, seed, on_step=on_step)
+        return dispatcher.call(refine_in_memory, upscaled, prompt, strength, steps, resolution, seed)
+
+
+def encode_png(image):
+    """Convert PIL image to PNG bytes"""
+    return encode_image(image)
+
+
+def encode_async(image, encoding=None, cache_key=None):
+    """
+    Encode on the encoder pool; returns a Future for the EncodedImage
+    With cache_key the result is cached before the Future resolves; a failed
+    cache write is logged and the encoded image is still returned
+    """
+    def encode():
+        data = encode_image(image, encoding)
+        if cache_key is not None:
+            try:
+                cache.put(cache_key, data)
+            except OSError as e:
+                print(f"✗ Failed to write cache entry {cache_key[:12]}: {e}")
+        return data
+
+    return encoder.submit(encode)
+
+
+def resolved(value):
+    """A Future that already holds value"""
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def map_cache_key(prompt, map_type, resolution, steps, seed, texture_model, encoding, tiling=None):
+    """Result cache key of one fixed-seed map generated on its own"""
+    return ResultCache.make_key(
+        prompt=prompt,
+        map_type=map_type,
+        resolution=resolution,
+        steps=steps,
+        seed=seed,
+        model_base=texture_model.model_base,
+        **encoding.cache_fields(),
+        **(tiling.cache_fields() if tiling else {})
+    )
+
+
+def generate_encoded_map_async(prompt, map_type, resolution, steps, seed, texture_model, encoding=None, on_step=None,
+                               tiling=None):
+    """
+    Generate one map and return a Future for its EncodedImage
+    Returns as soon as diffusion finishes; encoding continues on the encoder
+    pool so the caller can start the next generation. Fixed-seed requests
+    are deterministic, so they are served from the result cache, and
+    identical ones already in flight share a single generation
+    """
+    encoding = encoding or Encoding()
+
+    if seed == -1:
+        image = generate_image(prompt, resolution, steps, seed, texture_model, on_step=on_step, tiling=tiling)
+        return encode_async(image, encoding)
+
+    key = map_cache_key(prompt, map_type, resolution, steps, seed, texture_model, encoding, tiling)
+    cached = cache.get(key)
+    if cached is not None:
+        print(f"✓ Cache hit for {map_type} (seed {seed})")
+        return resolved(EncodedImage(cached, encoding.format))
+
+    def leader_step(result):
+        # Callers attached to this generation still need it, so a cancelled leader only stops it when alone
+        return on_step(result) is not False or flights.attached(key) > 0
+
+    def generate_and_cache():
+        image = generate_image(prompt, resolution, steps, seed, texture_model,
+                               on_step=leader_step if on_step else None, tiling=tiling)
+        return encode_async(image, encoding, cache_key=key)
+
+    future, shared = flights.do(key, generate_and_cache)
+    if shared:
+        print(f"✓ Attached to in-flight {map_type} generation (seed {seed})")
+    return future
+
+
+def generate_encoded_map(prompt, map_type, resolution, steps, seed, texture_model, encoding=None, on_step=None,
+                         tiling=None):
+    """Generate one map as an EncodedImage (PNG unless encoding says otherwise)"""
+    return generate_encoded_map_async(
+        prompt, map_type, resolution, steps, seed, texture_model,
+        encoding=encoding, on_step=on_step, tiling=tiling
+    ).result()
+
+
+def chunked(items, size):
+    """Split items into consecutive lists of at most size"""
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def generate_encoded_maps(items, resolution, steps, seed, texture_model, encodings=None, on_step=None, tiling=None):
+    """
+    Generate several maps that share resolution, steps and model
+
+    items is a list of (map_type, prompt) and encodings maps a map_type to its
+    Encoding (default PNG). Returns {map_type: EncodedImage or
+    GenerationError}. When the backend supports it the maps are submitted in
+    batches of up to MAX_BATCH_SIZE; otherwise (and always when tiled) they
+    run one at a time. on_step, if given, is called as on_step(index, count,
+    label) and must return the per-step callback for that backend call.
+
+    Runs as a pipeline: each map (or batch) is handed to the encoder pool
+    and the next generation starts right away; results are assembled once
+    everything has been generated. PIPELINE_ENCODE=False waits for each
+    encode first, for comparison.
+    """
+    encodings = {map_type: (encodings or {}).get(map_type) or Encoding() for map_type, _ in items}
+    pending = {}
+
+    def hand_off(map_type, future):
+        pending[map_type] = future
+        if not PIPELINE_ENCODE:
+            future.exception()
+
+    if len(items) < 2 or MAX_BATCH_SIZE < 2 or not supports_batching() or tiling is not None:
+        for index, (map_type, prompt) in enumerate(items):
+            print(f"Generating {map_type} map: {prompt}")
+            try:
+                hand_off(map_type, generate_encoded_map_async(
+                    prompt, map_type, resolution, steps, seed, texture_model,
+                    encoding=encodings[map_type],
+                    on_step=on_step(index, len(items), map_type) if on_step else None,
+                    tiling=tiling
+                ))
+                print(f"✓ Generated {map_type}")
+            except GenerationError as e:
+                pending[map_type] = resolved(e)
+                map_failures.inc(map_type=map_type)
+                print(f"✗ Failed to generate {map_type}: {e}")
+        return {map_type: future.result() for map_type, future in pending.items()}
+
+    batches = chunked(items, MAX_BATCH_SIZE)
+    for index, batch in enumerate(batches):
+        map_types = [map_type for map_type, _ in batch]
+        prompts = [prompt for _, prompt in batch]
+        label = ', '.join(map_types)
+
+        # Images in a batch share noise, so the key covers the whole batch
+        keys = None
+        if seed != -1:
+            keys = [
+                ResultCache.make_key(
+                    prompt=prompt,
+                    map_type=map_type,
+                    resolution=resolution,
+                    steps=steps,
+                    seed=seed,
+                    model_base=texture_model.model_base,
+                    batch=prompts,
+                    **encodings[map_type].cache_fields()
+                )
+                for map_type, prompt in batch
+            ]
+            cached = [cache.get(key) for key in keys]
+            if all(data is not None for data in cached):
+                print(f"✓ Cache hit for batch: {label}")
+                for map_type, data in zip(map_types, cached):
+                    pending[map_type] = resolved(EncodedImage(data, encodings[map_type].format))
+                continue
+
+        print(f"Generating batch of {len(batch)}: {label}")
+        try:
+            generated = run_generation(
+                prompts, resolution, steps, seed, texture_model,
+                on_step=on_step(index, len(batches), label) if on_step else None
+            )
+        except GenerationError as e:
+            print(f"✗ Failed to generate batch {label}: {e}")
+            for map_type in map_types:
+                pending[map_type] = resolved(e)
+                map_failures.inc(map_type=map_type)
+            continue
+
+        # The maps of a batch encode in parallel with each other and with the next batch
+        for position, (map_type, result) in enumerate(zip(map_types, generated)):
+            hand_off(map_type, encode_async(
+                result.image, encodings[map_type],
+                cache_key=keys[position] if keys is not None else None
+            ))
+        print(f"✓ Generated batch: {label}")
+
+    return {map_type: future.result() for map_type, future in pending.items()}
+
+
+def image_to_blender(image, name):
+    """Copy a PIL image into a new bpy image with one bulk pixel transfer"""
+    import numpy as np
+
+    rgba = image.convert('RGBA')
+    width, height = rgba.size
+    # Blender stores rows bottom-up as floats in 0-1
+    pixels = np.asarray(rgba, dtype=np.float32)[::-1] / 255.0
+
+    blender_image = bpy.data.images.new(name, width, height, alpha=True)
+    blender_image.pixels.foreach_set(pixels.ravel())
+    return blender_image
+
+
+def blender_to_image(blender_image):
+    """Read a bpy image back into a PIL image with one bulk pixel transfer"""
+    import numpy as np
+    from PIL import Image
+
+    width, height = blender_image.size
+    pixels = np.empty(width * height * 4, dtype=np.float32)
+    blender_image.pixels.foreach_get(pixels)
+    pixels = pixels.reshape(height, width, 4)[::-1]
+    return Image.fromarray((np.clip(pixels, 0.0, 1.0) * 255 + 0.5).astype(np.uint8), 'RGBA')
+
+
+def operator_accepts(operator, name):
+    """True if a bpy operator defines the named property, so it may be passed as a keyword"""
+    return name in operator.get_rna_type().properties.keys()
+
+
+def refine_in_memory(image, prompt, strength, steps, resolution, seed=None):
+    """
+    Run Dream Textures img2img on a PIL image without touching the disk; main thread only
+    Returns the refined PIL image, so encoding happens off the main thread.
+    Both Blender images are removed even when refinement fails
+    """
+    operator = bpy.ops.dream_textures.refine_texture
+    # Operators reject keywords they do not define, and not every Dream Textures release takes a seed here
+    fixed_seed = seed is not None and seed != -1 and operator_accepts(operator, 'seed')
+    seed_args = {'seed': seed} if fixed_seed else {}
+    base_img = None
+    refined_img = None
+    try:
+        # Load image into Blender under a unique name
+        base_img = image_to_blender(image, f"dream_input_{uuid.uuid4().hex}")
+
+        # Call Dream Textures img2img
+        operator(
+            image=base_img,
+            prompt=prompt,
+            strength=strength,
+            steps=steps,
+            width=resolution,
+            height=resolution,
+            **seed_args
+        )
+
+        # Get refined image
+        refined_img = bpy.data.images.get('DreamTextures_Refined')
+        if refined_img is None:
+            raise GenerationError('Refinement failed')
+
+        return blender_to_image(refined_img)
+    finally:
+        # Cleanup; the operator may have written its output before failing
+        if refined_img is None:
+            refined_img = bpy.data.images.get('DreamTextures_Refined')
+        if refined_img is not None:
+            bpy.data.images.remove(refined_img)
+        if base_img is not None:
+            bpy.data.images.remove(base_img)
+
+
+def run_texture_job(job):
+    """Job handler for a single texture map"""
+    if job.params.get('draft'):
+        return run_with_draft(job, texture_result, refine_texture_draft)
+    return texture_result(job, job.params)
+
+
+def texture_settings(data):
+    """Resolve the map type, prompt, encoding, tiling and model of a single texture request"""
+    resolution = data.get('resolution', 1024)
+    map_type = data.get('map_type', 'albedo')
+    return {
+        'map_type': map_type,
+        # Adjust prompt based on map type
+        'prompt': expand_prompt(data['prompt'], map_type, TEXTURE_PROMPT_SUFFIXES),
+        'resolution': resolution,
+        'steps': data.get('steps', 20),
+        'seed': data.get('seed', -1),
+        'encoding': encoding_for(data, map_type),
+        'tiling': tiling_for(data, resolution, TILE_SIZE, TILE_OVERLAP, MAX_DIRECT_RESOLUTION),
+        'texture_model': get_texture_model(data.get('model'))
+    }
+
+
+def texture_response(settings, image):
+    """The result dict of a single texture map"""
+    return {
+        'map_type': settings['map_type'],
+        'image': image,
+        'format': settings['encoding'].format,
+        'resolution': settings['resolution'],
+        'tiled': settings['tiling'] is not None,
+        'prompt_used': settings['prompt']
+    }
+
+
+def cached_texture_result(data):
+    """
+    The result of a fixed-seed texture request when the cache already holds it, else None
+    Checked before queuing, so a cache hit never waits behind running jobs
+    """
+    if data.get('seed', -1) == -1 or data.get('draft'):
+        return None
+
+    settings = texture_settings(data)
+    key = map_cache_key(
+        settings['prompt'], settings['map_type'], settings['resolution'], settings['steps'], settings['seed'],
+        settings['texture_model'], settings['encoding'], settings['tiling']
+    )
+    # The job looks again on a miss and counts it then
+    cached = cache.get(key, count_miss=False)
+    if cached is None:
+        return None
+    print(f"✓ Cache hit for {settings['map_type']} (seed {settings['seed']}); answered without queuing")
+    return texture_response(settings, EncodedImage(cached, settings['encoding'].format))
+
+
+def texture_result(job, data):
+    """Generate the single map described by data"""
+    settings = texture_settings(data)
+    map_type = settings['map_type']
+    try:
+        image = generate_encoded_map(
+            settings['prompt'], map_type, settings['resolution'], settings['steps'], settings['seed'],
+            settings['texture_model'],
+            encoding=settings['encoding'],
+            on_step=progress_reporter(job, map_type),
+            tiling=settings['tiling']
+        )
+    except GenerationError:
+        map_failures.inc(map_type=map_type)
+        raise
+
+    return texture_response(settings, image)
+
+
+def derive_pbr_set(job, base_prompt, maps, resolution, steps, seed, texture_model, encodings, tiling=None):
+    """
+    Diffuse only the albedo and derive the other maps from it
+    Derivation always starts from the lossless PNG albedo; 16-bit normals are
+    derived at full precision. Maps that cannot be derived are reported as
+    None, like failed maps
+    """
+    prompt = expand_prompt(base_prompt, 'albedo', PBR_SET_PROMPT_SUFFIXES)
+    print(f"Generating albedo map for derivation: {prompt}")
+
+    try:
+        albedo_png = generate_encoded_map(
+            prompt, 'albedo', resolution, steps, seed, texture_model,
+            on_step=progress_reporter(job, 'albedo'),
+            tiling=tiling
+        )
+    except GenerationError as e:
+        print(f"✗ Failed to generate albedo: {e}")
+        for map_type in maps:
+            map_failures.inc(map_type=map_type)
+        return {map_type: None for map_type in maps}
+
+    return derive_from_albedo(job, albedo_png, maps, encodings)
+
+
+def derive_from_albedo(job, albedo_png, maps, encodings):
+    """Derive and encode every requested map from an albedo PNG"""
+    from PIL import Image
+
+    albedo = Image.open(io.BytesIO(albedo_png))
+    sixteen_bit = [map_type for map_type in maps if encodings[map_type].format == 'png16']
+    with stage_seconds.time(stage='derive'):
+        derived = derive_maps(albedo, maps, metallic=job.params.get('metallic'), sixteen_bit=sixteen_bit)
+
+    # Encode every map in parallel
+    pending = {}
+    for map_type in maps:
+        if map_type == 'albedo':
+            pending[map_type] = None if encodings['albedo'].is_default else encode_async(albedo, encodings['albedo'])
+        elif map_type in derived:
+            pending[map_type] = encode_async(derived[map_type], encodings[map_type])
+            print(f"✓ Derived {map_type}")
+        else:
+            map_failures.inc(map_type=map_type)
+            print(f"✗ Cannot derive {map_type} (derivable: {', '.join(DERIVABLE_MAPS)})")
+
+    results = {}
+    for map_type in maps:
+        if map_type == 'albedo':
+            results[map_type] = albedo_png if pending[map_type] is None else pending[map_type].result()
+        else:
+            results[map_type] = pending[map_type].result() if map_type in pending else None
+
+    return results
+
+
+def run_pbr_set_job(job):
+    """Job handler for a PBR texture set; a failed map is reported as None"""
+    params = job.params
+    packing = params.get('pack')
+    lods = params.get('lods')
+    if packing or lods:
+        # Post-process from lossless default PNGs, then encode as requested
+        params = {key: value for key, value in params.items() if key not in ENCODING_FIELDS}
+
+    if params.get('draft'):
+        result = run_with_draft(job, pbr_set_result, refine_pbr_set_draft, params)
+    else:
+        result = pbr_set_result(job, params)
+
+    if packing or lods:
+        return pack_pbr_set(result, job.params, packing, lods)
+    return result
+
+
+def pack_pbr_set(result, params, packing, lods):
+    """
+    Add a channel-packed texture and LOD levels to a PBR set result holding PNG maps
+    Maps consumed by the packing are dropped from the full-size set; every
+    output is encoded in parallel in the format requested for its map type.
+    LOD sizes at or above the result's resolution (e.g. of an unrefined
+    draft) are dropped rather than upsampled
+    """
+    import numpy as np
+
+    resolution = result['resolution']
+    lods = [size for size in lods or () if size < resolution]
+    arrays = {
+        map_type: np.asarray(open_png(data).convert('RGB'))
+        for map_type, data in result['maps'].items() if data is not None
+    }
+
+    outputs = dict(arrays)
+    filled = []
+    if packing:
+        with stage_seconds.time(stage='pack'):
+            outputs[packing], filled = pack_channels(packing, arrays, resolution)
+        for map_type in PACKINGS[packing]:
+            outputs.pop(map_type, None)
+
+    levels = {}
+    if lods:
+        with stage_seconds.time(stage='lods'):
+            for name, array in outputs.items():
+                for size, level in lod_levels(array, lods, normal=name == 'normal').items():
+                    levels.setdefault(size, {})[name] = level
+
+    failed = [
+        map_type for map_type, data in result['maps'].items()
+        if data is None and map_type not in PACKINGS.get(packing, ())
+    ]
+    encodings = {name: encoding_for(params, name) for name in [*outputs, *failed]}
+
+    def encoded(name, array, original=None):
+        if original is not None and encodings[name].is_default:
+            return resolved(original)
+        return encode_async(array, encodings[name])
+
+    maps = {
+        name: encoded(name, array, result['maps'].get(name))
+        for name, array in outputs.items()
+    }
+    maps.update({map_type: None for map_type in failed})
+    lod_maps = {
+        str(size): {name: encoded(name, array) for name, array in level.items()}
+        for size, level in sorted(levels.items(), reverse=True)
+    }
+
+    packed = {
+        **result,
+        'formats': {name: encoding.format for name, encoding in encodings.items()},
+        'maps': {name: None if future is None else future.result() for name, future in maps.items()}
+    }
+    if packing:
+        packed['packed'] = packing
+        packed['packed_defaults'] = filled
+    if lods:
+        packed['lods'] = {
+            size: {name: future.result() for name, future in level.items()}
+            for size, level in lod_maps.items()
+        }
+    return packed
+
+
+def pbr_set_result(job, data):
+    """Generate the PBR set described by data"""
+    base_prompt = data['prompt']
+    resolution = data.get('resolution', 1024)
+    seed = data.get('seed', -1)
+    steps = data.get('steps', 20)
+    maps = data.get('maps', ['albedo', 'normal', 'roughness', 'metallic'])
+    mode = data.get('mode', 'diffuse')
+    encodings = {map_type: encoding_for(data, map_type) for map_type in maps}
+    formats = {map_type: encoding.format for map_type, encoding in encodings.items()}
+    tiling = tiling_for(data, resolution, TILE_SIZE, TILE_OVERLAP, MAX_DIRECT_RESOLUTION)
+
+    texture_model = get_texture_model(data.get('model'))
+
+    if mode == 'derive':
+        return {
+            'prompt': base_prompt,
+            'resolution': resolution,
+            'mode': mode,
+            'tiled': tiling is not None,
+            'formats': formats,
+            'maps': derive_pbr_set(job, base_prompt, maps, resolution, steps, seed, texture_model, encodings, tiling)
+        }
+
+    # Create specialized prompt for each map
+    items = [(map_type, expand_prompt(base_prompt, map_type, PBR_SET_PROMPT_SUFFIXES)) for map_type in maps]
+    generated = generate_encoded_maps(
+        items, resolution, steps, seed, texture_model,
+        encodings=encodings,
+        on_step=lambda index, count, label: progress_reporter(job, label, index, count),
+        tiling=tiling
+    )
+
+    results = {}
+    for map_type in maps:
+        data = generated[map_type]
+        results[map_type] = None if isinstance(data, GenerationError) else data
+
+    return {
+        'prompt': base_prompt,
+        'resolution': resolution,
+        'mode': mode,
+        'tiled': tiling is not None,
+        'formats': formats,
+        'maps': results
+    }
+
+
+def draft_params(params, seed):
+    """Parameters of the draft pass: small, few steps, a fixed seed and default PNG so it is cached"""
+    draft = {key: value for key, value in params.items() if key not in ENCODING_FIELDS}
+    draft.update(
+        resolution=min(DRAFT_RESOLUTION, params.get('resolution', 1024)),
+        steps=min(DRAFT_STEPS, params.get('steps', 20)),
+        seed=seed,
+        tiling='off',
+        draft=False
+    )
+    return draft
+
+
+def run_with_draft(job, build, refine, params=None):
+    """
+    Generate a quick draft with build, publish it as the job's "draft" partial,
+    then, unless refine is false, upscale and refine it into the final result
+    A random seed is fixed up front so the refine pass reuses the draft's
+    """
+    params = job.params if params is None else params
+    seed = params.get('seed', -1)
+    if seed == -1:
+        seed = random.randrange(2 ** 31)
+    refining = params.get('refine', True)
+
+    job.progress_phase(0.0, DRAFT_PROGRESS if refining else 1.0)
+    draft_settings = draft_params(params, seed)
+    draft = {**build(job, draft_settings), 'quality': 'draft', 'seed': seed, 'steps': draft_settings['steps']}
+    job.set_partial('draft', draft, json_safe(draft))
+    print(f"✓ Draft ready at {draft['resolution']}px, {draft['steps']} steps (seed {seed})")
+    if not refining:
+        return draft
+
+    check_cancelled(job)
+    job.progress_phase(DRAFT_PROGRESS, 1.0)
+    final = refine(job, draft, params, seed)
+    return {
+        **final,
+        'quality': 'final',
+        'seed': seed,
+        'steps': params.get('steps', 20),
+        'draft': {'resolution': draft['resolution'], 'steps': draft['steps']}
+    }
+
+
+def open_png(data):
+    from PIL import Image
+
+    return Image.open(io.BytesIO(data))
+
+
+def refine_texture_draft(job, draft, params, seed):
+    """Final pass of a draft texture: upscale and refine at the requested resolution"""
+    resolution = params.get('resolution', 1024)
+    map_type = draft['map_type']
+    encoding = encoding_for(params, map_type)
+    tiling = tiling_for(params, resolution, TILE_SIZE, TILE_OVERLAP, MAX_DIRECT_RESOLUTION)
+
+    job.set_progress(0.0, map_type=map_type, stage='refine')
+    try:
+        refined = upscale_and_refine(
+            open_png(draft['image']), draft['prompt_used'], resolution, params.get('steps', 20), seed,
+            params.get('refine_strength', DRAFT_REFINE_STRENGTH), tiling,
+            on_step=progress_reporter(job, map_type)
+        )
+    except GenerationError:
+        map_failures.inc(map_type=map_type)
+        raise
+    job.set_progress(1.0, map_type=map_type, stage='refine')
+
+    return {
+        **draft,
+        'image': encode_async(refined, encoding).result(),
+        'format': encoding.format,
+        'resolution': resolution,
+        'tiled': tiling is not None
+    }
 
-app = Flask(__name__)
-CORS(app)
 
-# Enable Dream Textures addon
-try:
-    bpy.ops.preferences.addon_enable(module='dream_textures')
-    print("✓ Dream Textures addon enabled")
-except Exception as e:
-    print(f"✗ Failed to enable Dream Textures: {e}")
-    print("Make sure Dream Textures is installed in Blender")
+def refine_pbr_set_draft(job, draft, params, seed):
+    """
+    Final pass of a draft PBR set
+    Diffuse sets refine every map that drafted; derived sets refine the
+    albedo and derive the rest from it again
+    """
+    resolution = params.get('resolution', 1024)
+    steps = params.get('steps', 20)
+    strength = params.get('refine_strength', DRAFT_REFINE_STRENGTH)
+    maps = list(draft['maps'])
+    encodings = {map_type: encoding_for(params, map_type) for map_type in maps}
+    tiling = tiling_for(params, resolution, TILE_SIZE, TILE_OVERLAP, MAX_DIRECT_RESOLUTION)
+    final = {
+        **draft,
+        'resolution': resolution,
+        'tiled': tiling is not None,
+        'formats': {map_type: encoding.format for map_type, encoding in encodings.items()}
+    }
+
+    if draft['mode'] == 'derive':
+        # The draft albedo is cached under the draft settings even when it was not requested
+        settings = draft_params(params, seed)
+        prompt = expand_prompt(draft['prompt'], 'albedo', PBR_SET_PROMPT_SUFFIXES)
+        job.set_progress(0.0, map_type='albedo', stage='refine')
+        try:
+            albedo = generate_encoded_map(prompt, 'albedo', settings['resolution'], settings['steps'], seed,
+                                          get_texture_model(params.get('model')))
+            check_cancelled(job)
+            refined = upscale_and_refine(open_png(albedo), prompt, resolution, steps, seed, strength, tiling,
+                                         on_step=progress_reporter(job, 'albedo', 0, 2))
+        except GenerationError as e:
+            print(f"✗ Failed to refine albedo: {e}")
+            for map_type in maps:
+                map_failures.inc(map_type=map_type)
+            return {**final, 'maps': {map_type: None for map_type in maps}}
+        job.set_progress(0.5, map_type='albedo', stage='refine')
+        return {**final, 'maps': derive_from_albedo(job, encode_png(refined), maps, encodings)}
+
+    # Encode each refined map while the next one refines
+    pending = {}
+    for index, map_type in enumerate(maps):
+        check_cancelled(job)
+        job.set_progress(index / len(maps), map_type=map_type, stage='refine')
+        if draft['maps'][map_type] is None:
+            continue
+        prompt = expand_prompt(draft['prompt'], map_type, PBR_SET_PROMPT_SUFFIXES)
+        try:
+            refined = upscale_and_refine(open_png(draft['maps'][map_type]), prompt, resolution, steps, seed,
+                                         strength, tiling, on_step=progress_reporter(job, map_type, index, len(maps)))
+        except GenerationError as e:
+            map_failures.inc(map_type=map_type)
+            print(f"✗ Failed to refine {map_type}: {e}")
+            continue
+        pending[map_type] = encode_async(refined, encodings[map_type])
+
+    return {**final, 'maps': {map_type: pending[map_type].result() if map_type in pending else None
+                              for map_type in maps}}
+
+
+def run_variations_job(job):
+    """Job handler for N seeds of one prompt, batched where the backend allows"""
+    data = job.params
+    resolution = data.get('resolution', 1024)
+    seed = data.get('seed', -1)
+    steps = data.get('steps', 20)
+    map_type = data.get('map_type', 'albedo')
+    count = data.get('count', 4)
+
+    prompt = expand_prompt(data['prompt'], map_type, TEXTURE_PROMPT_SUFFIXES)
+    encoding = encoding_for(data, map_type)
+    texture_model = get_texture_model(data.get('model'))
+
+    if MAX_BATCH_SIZE > 1 and supports_batching():
+        batches = chunked(list(range(count)), MAX_BATCH_SIZE)
+    else:
+        batches = [[index] for index in range(count)]
+
+    # Encoding runs on the encoder pool while the next batch generates
+    pending = []
+    for index, batch in enumerate(batches):
+        # Consecutive seeds per batch keep fixed-seed variations reproducible
+        batch_seed = seed if seed == -1 else seed + batch[0]
+        try:
+            generated = run_generation(
+                [prompt] * len(batch), resolution, steps, batch_seed, texture_model,
+                on_step=progress_reporter(job, map_type, index, len(batches))
+            )
+        except GenerationError:
+            map_failures.inc(map_type=map_type)
+            raise
+        for result in generated:
+            pending.append((getattr(result, 'seed', batch_seed), encode_async(result.image, encoding)))
+
+    return {
+        'map_type': map_type,
+        'format': encoding.format,
+        'resolution': resolution,
+        'prompt_used': prompt,
+        'variations': [{'seed': variation_seed, 'image': future.result()} for variation_seed, future in pending]
+    }
+
+
+def run_refine_job(job):
+    """Job handler for img2img over an uploaded texture (base64 in params, so the job store can keep it)"""
+    from PIL import Image
+
+    data = job.params
+    encoding = encoding_for(data, 'refined')
+    check_cancelled(job)
+    try:
+        with Image.open(io.BytesIO(base64.b64decode(data['base_texture']))) as image:
+            # The refine operator always writes DreamTextures_Refined; the
+            # dispatcher runs one refinement at a time so they cannot collide
+            with stage_seconds.time(stage='refine'):
+                refined = dispatcher.call(
+                    refine_in_memory, image, data['prompt'], data.get('strength', 0.5),
+                    data.get('steps', 20), data.get('resolution', 1024)
+                )
+    except GenerationError:
+        raise
+    except Exception as e:
+        raise GenerationError(str(e)) from e
+
+    return {
+        'image': encode_async(refined, encoding).result(),
+        'format': encoding.format
+    }
+
+
+def api_key_client(api_key):
+    """Client id for an API key; the key itself never shows up in job listings"""
+    return 'key:' + hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+
+
+def parse_client_weights(spec):
+    """
+    Parse "name=weight,..." into {client_id: weight}
+    Each name is accepted both as an X-Client-Id and as an API key
+    """
+    weights = {}
+    for entry in filter(None, (item.strip() for item in spec.split(','))):
+        name, _, weight = entry.partition('=')
+        weight = max(1, int(weight or 1))
+        weights[name.strip()] = weight
+        weights[api_key_client(name.strip())] = weight
+    return weights
+
+
+jobs = JobManager(
+    {
+        'texture': run_texture_job,
+        'pbr-set': run_pbr_set_job,
+        'variations': run_variations_job,
+        'refine': run_refine_job
+    },
+    workers=JOB_WORKERS,
+    retention=JOB_RETENTION,
+    expected_errors=(GenerationError, GenerationCancelled),
+    max_queued=MAX_QUEUED,
+    per_client=MAX_QUEUED_PER_CLIENT,
+    weights=parse_client_weights(CLIENT_WEIGHTS),
+    store=store
+)
+
+queued_jobs_gauge.set_function(lambda: {(priority,): depth for priority, depth in jobs.queue_depth_by_priority().items()})
+queued_bpy_calls_gauge.set_function(dispatcher.queue_depth)
+rss_gauge.set_function(lambda: rss_bytes() or 0)
+
+
+def client_id():
+    """
+    Who is asking, for fair-share scheduling: the X-API-Key or X-Client-Id
+    header, else the address the request came from (via the pool if proxied)
+    """
+    api_key = request.headers.get('X-API-Key')
+    if api_key:
+        return api_key_client(api_key)
+    explicit = request.headers.get('X-Client-Id')
+    if explicit:
+        return explicit.strip()
+    forwarded = request.headers.get('X-Forwarded-For')
+    if forwarded:
+        return forwarded.split(',')[0].strip()
+    return request.remote_addr or 'anonymous'
+
+
+def job_priority(kind, data):
+    """The requested priority class, or the default for the job kind"""
+    priority = str(data.get('priority') or JOB_PRIORITIES.get(kind, BULK)).strip().lower()
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"Unknown priority '{priority}' (expected one of: {', '.join(PRIORITY_CLASSES)})")
+    return priority
+
+
+def normalize_params(data):
+    """
+    Coerce generation parameters to canonical types so equivalent requests
+    ("1024" vs 1024, extra whitespace in the prompt) share cache keys
+    """
+    params = dict(data)
+    params['prompt'] = ' '.join(str(data['prompt']).split())
+    for field in ('resolution', 'seed', 'steps', 'count'):
+        if field in params:
+            params[field] = int(params[field])
+    if params.get('steps', 1) < 1:
+        raise ValueError('steps must be at least 1')
+    if 'map_type' in params:
+        params['map_type'] = str(params['map_type']).strip().lower()
+    if 'maps' in params:
+        params['maps'] = [str(map_type).strip().lower() for map_type in params['maps']]
+    if 'mode' in params and params['mode'] not in PBR_SET_MODES:
+        raise ValueError(f"Unknown mode '{params['mode']}' (expected one of: {', '.join(PBR_SET_MODES)})")
+    for field in ('preview_every', 'preview_size'):
+        if field in params:
+            params[field] = int(params[field])
+    if params.get('preview_every', 0) < 0:
+        raise ValueError('preview_every must be 0 (no previews) or more')
+    if 'preview_size' in params and not 1 <= params['preview_size'] <= MAX_PREVIEW_SIZE:
+        raise ValueError(f"preview_size must be between 1 and {MAX_PREVIEW_SIZE}")
+    if 'count' in params and not 1 <= params['count'] <= MAX_VARIATIONS:
+        raise ValueError(f"count must be between 1 and {MAX_VARIATIONS}")
+    if params.get('metallic') is not None:
+        params['metallic'] = float(params['metallic'])
+        if not 0.0 <= params['metallic'] <= 1.0:
+            raise ValueError('metallic must be between 0 and 1')
+    if 'format' in params:
+        params['format'] = normalize_format(params['format'])
+    # A string quality is the generation quality; a number is the older
+    # spelling of jpeg_quality, which wins when both are given
+    quality = params.pop('quality', None)
+    if isinstance(quality, str) and not quality.strip().isdigit():
+        mode = quality.strip().lower()
+        if mode not in QUALITY_MODES:
+            raise ValueError(f"Unknown quality '{quality}' (expected one of: {', '.join(QUALITY_MODES)} or 1-95)")
+        params['draft'] = mode == 'draft'
+    elif quality is not None:
+        params.setdefault('jpeg_quality', quality)
+    if 'refine' in params:
+        params['refine'] = bool(params['refine'])
+    if 'strength' in params:
+        params['strength'] = float(params['strength'])
+        if not 0.0 < params['strength'] <= 1.0:
+            raise ValueError('strength must be above 0 and at most 1')
+    if 'refine_strength' in params:
+        params['refine_strength'] = float(params['refine_strength'])
+        if not 0.0 < params['refine_strength'] <= 1.0:
+            raise ValueError('refine_strength must be above 0 and at most 1')
+    for field in ('compression', 'jpeg_quality'):
+        if field in params:
+            params[field] = int(params[field])
+    # Range-check compression and JPEG quality up front, for every format asked for
+    formats = params.get('format')
+    for map_type in [None, *formats] if isinstance(formats, dict) else [None]:
+        encoding_for(params, map_type)
+    if params.get('pack') is not None:
+        params['pack'] = str(params['pack']).strip().lower()
+        if params['pack'] not in PACKINGS:
+            raise ValueError(f"Unknown pack '{params['pack']}' (expected one of: {', '.join(PACKINGS)})")
+        params.setdefault('maps', ['albedo', 'normal', *PACKINGS[params['pack']]])
+    if params.get('lods') is not None:
+        params['lods'] = sorted({int(size) for size in params['lods']}, reverse=True)
+        params.setdefault('resolution', params['lods'][0])
+        if not 1 <= len(params['lods']) <= MAX_LODS:
+            raise ValueError(f"lods must list between 1 and {MAX_LODS} sizes")
+        if not all(1 <= size <= params['resolution'] for size in params['lods']):
+            raise ValueError('lods sizes must be between 1 and resolution')
+        # The full-size maps are the top level already
+        params['lods'] = [size for size in params['lods'] if size < params['resolution']]
+    if params.get('model') is not None:
+        params['model'] = str(params['model']).strip()
+        if params['model'] not in runtime.models:
+            raise ValueError(f"Unknown model '{params['model']}' (installed: {', '.join(runtime.models)})")
+    if 'resolution' in params and not 1 <= params['resolution'] <= MAX_RESOLUTION:
+        raise ValueError(f"resolution must be between 1 and {MAX_RESOLUTION}")
+    if 'tiling' in params:
+        params['tiling'] = normalize_tiling(params['tiling'])
+    tiling_for(params, params.get('resolution', 1024), TILE_SIZE, TILE_OVERLAP, MAX_DIRECT_RESOLUTION)
+    return params
+
+
+def enable_addon():
+    """Enable Dream Textures unless it already is; main thread only"""
+    if 'dream_textures' not in bpy.context.preferences.addons:
+        try:
+            bpy.ops.preferences.addon_enable(module='dream_textures')
+            print("✓ Dream Textures addon enabled")
+        except Exception as e:
+            print(f"✗ Failed to enable Dream Textures: {e}")
+            print("Make sure Dream Textures is installed in Blender")
+    runtime.addon_enabled = 'dream_textures' in bpy.context.preferences.addons
+
+
+def resolve_runtime():
+    """Look up the backend, model and batch support once; main thread only"""
+    # Generate using the existing backend configuration
+    runtime.backend = bpy.context.scene.dream_textures_engine_prompt.get_backend()
+    runtime.model = find_texture_model()
+    runtime.models = {model.model_base: model for model in find_installed_models()}
+    runtime.batching = hasattr(bpy.context.scene.dream_textures_prompt.generate_args(bpy.context), 'batch_size')
+
+
+def initialize(warmup=WARMUP):
+    """
+    Enable the addon, resolve the backend and model, optionally run a tiny
+    warm-up generation, then mark the bridge ready. Runs off the main thread
+    while HTTP is already up; each stage is a startup phase.
+    """
+    try:
+        startup.enter('addon')
+        dispatcher.call(enable_addon)
+
+        startup.enter('resolve')
+        started = time.monotonic()
+        dispatcher.call(resolve_runtime)
+        runtime.resolve_seconds = round(time.monotonic() - started, 3)
+        print(f"✓ Resolved backend and model {runtime.model.model_base} in {runtime.resolve_seconds}s"
+              f" (batching {'supported' if runtime.batching else 'not supported'})")
+
+        if warmup:
+            startup.enter('warmup')
+            started = time.monotonic()
+            run_generation(['warm-up texture'], WARMUP_RESOLUTION, WARMUP_STEPS, 0, runtime.model)
+            runtime.warmup_seconds = round(time.monotonic() - started, 3)
+            print(f"✓ Warm-up generation finished in {runtime.warmup_seconds}s")
+
+        runtime.error = None
+        runtime.ready_seconds = startup.finish()
+        runtime.ready.set()
+        print(f"✓ Bridge ready after {runtime.ready_seconds}s")
+
+        restored = jobs.restore()
+        if restored:
+            print(f"✓ Re-queued {restored} job(s) left pending by the previous run")
+    except Exception as e:
+        runtime.error = str(e)
+        print(f"✗ Bridge startup failed in phase '{startup.current}': {e}")
+        startup.finish()
+
+
+def purge_orphans():
+    """
+    Remove bridge images left in bpy.data and datablocks nothing uses; main thread only
+    Refinements create and remove their images within one dispatcher call, so
+    none of these can still be in use here
+    """
+    leaked = [
+        image for image in list(bpy.data.images.values())
+        if image.name.startswith('dream_input_') or image.name == 'DreamTextures_Refined'
+    ]
+    for image in leaked:
+        bpy.data.images.remove(image)
+
+    orphans = None
+    if hasattr(bpy.data, 'orphans_purge'):
+        orphans = bpy.data.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
+    return {
+        'images_removed': len(leaked),
+        'orphans_purged': orphans if isinstance(orphans, int) else None,
+        'blender_images': len(bpy.data.images)
+    }
+
+
+def sweep_memory():
+    """
+    One memory sweep, for the monitor thread: purge Blender data on the main
+    thread and forget expired jobs
+    """
+    report = dispatcher.call(purge_orphans)
+    report['jobs_pruned'] = jobs.prune()
+    if report['images_removed']:
+        purged_datablocks.inc(report['images_removed'], kind='image')
+        print(f"✓ Removed {report['images_removed']} leaked Blender image(s)")
+    if report['orphans_purged']:
+        purged_datablocks.inc(report['orphans_purged'], kind='orphan')
+    return report
+
+
+def start_recycle(rss):
+    """Past the soft limit: stop taking work, then drain and exit on a background thread"""
+    if runtime.draining.is_set():
+        return
+    runtime.draining.set()
+    print(f"✗ RSS {rss // (1024 * 1024)} MB is over the {MEMORY_SOFT_LIMIT_MB} MB soft limit;"
+          f" draining before recycling")
+    threading.Thread(target=drain_and_exit, name='bridge-recycle', daemon=True).start()
+
+
+def drain_and_exit(timeout=None):
+    """Wait for queued and running jobs (at most DRAIN_TIMEOUT), let responses flush, then exit"""
+    timeout = DRAIN_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    while jobs.active() and time.monotonic() < deadline:
+        time.sleep(1)
+    if jobs.active():
+        print(f"✗ {jobs.active()} job(s) still pending after {timeout}s; recycling anyway")
+    time.sleep(DRAIN_GRACE)
+    if store is not None:
+        store.close()
+    print(f"✓ Drained; exiting with code {RECYCLE_EXIT_CODE} to be restarted")
+    exit_process(RECYCLE_EXIT_CODE)
+
+
+def exit_process(code):
+    """Exit at once; the main thread is busy serving the dispatcher"""
+    sys.stdout.flush()
+    os._exit(code)
+
+
+memory_monitor = MemoryMonitor(
+    MEMORY_SWEEP_INTERVAL,
+    MEMORY_SOFT_LIMIT_MB * 1024 * 1024,
+    sweep=sweep_memory,
+    on_limit=start_recycle
+)
+
+
+def not_ready_response():
+    """503 for generation requests that arrive before the bridge is ready, or while it drains"""
+    if runtime.draining.is_set():
+        error = 'Bridge is recycling; retry shortly'
+    else:
+        error = runtime.error or 'Bridge is still starting up'
+    response = jsonify({
+        'success': False,
+        'error': error
+    })
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+
+def check_base_texture(data):
+    """Raise ValueError unless data carries a non-empty base64 base_texture"""
+    try:
+        valid = bool(base64.b64decode(data.get('base_texture') or '', validate=True))
+    except (TypeError, ValueError):
+        valid = False
+    if not valid:
+        raise ValueError("Missing or invalid 'base_texture'")
+
+
+def submit_job(kind, data):
+    """Validate a request body and queue it; returns (job, error_response)"""
+    if not runtime.accepting:
+        return None, not_ready_response()
+
+    if not isinstance(data, dict) or not data.get('prompt'):
+        return None, (jsonify({
+            'success': False,
+            'error': "Missing required field 'prompt'"
+        }), 400)
+
+    try:
+        if kind == 'refine':
+            check_base_texture(data)
+        params = normalize_params(data)
+        priority = job_priority(kind, data)
+        # A cached fixed-seed map is answered at once instead of waiting for a worker
+        cached = cached_texture_result(params) if kind == 'texture' else None
+        if cached is not None:
+            job = jobs.complete(kind, params, cached, client_id(), priority)
+        else:
+            job = jobs.submit(kind, params, client_id(), priority)
+        g.job_id = job.id
+        return job, None
+    except QueueFull as e:
+        response = jsonify({
+            'success': False,
+            'error': str(e)
+        })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return None, (response, 429)
+    except (TypeError, ValueError) as e:
+        return None, (jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400)
+
+
+def job_result_response(job):
+    """
+    Render a finished job the same way the synchronous endpoints do
+    Images are base64 in JSON unless the client accepts image/png or multipart/mixed
+    """
+    if job.state == SUCCEEDED:
+        return render_result(job.result)
+
+    if job.state == CANCELLED:
+        return jsonify({
+            'success': False,
+            'error': job.error,
+            **job.to_dict()
+        }), 410
+
+    body = {
+        'success': False,
+        'error': job.error
+    }
+    if job.traceback:
+        body['traceback'] = job.traceback
+    return jsonify(body), 500
+
+def wait_or_cancel(job, wait):
+    """
+    Call wait(DISCONNECT_POLL) until it returns True; if the client hangs up
+    first, cancel the job so its generation stops. Returns False on disconnect
+    """
+    while not wait(DISCONNECT_POLL):
+        if client_disconnected():
+            print(f"✗ Client disconnected; cancelling job {job.id}")
+            jobs.cancel(job.id, 'disconnected')
+            job_cancellations.inc(reason='disconnected')
+            return False
+    return True
+
+
+def disconnected_response(job):
+    # Nobody reads this; 499 is the conventional "client closed request" status
+    return jsonify({
+        'success': False,
+        'error': 'Client disconnected',
+        'job_id': job.id
+    }), 499
+
+
+def sync_job_response(job):
+    """
+    Wait for a job and render its result the synchronous endpoints' way
+    Draft jobs answer as soon as the draft exists; the refined result follows
+    at /jobs/<job_id>/result. A client that disconnects cancels the job
+    """
+    if job.params.get('draft'):
+        if not wait_or_cancel(job, lambda timeout: job.wait_partial('draft', timeout) is not None or job.finished):
+            return disconnected_response(job)
+        draft = job.partials.get('draft')
+        if draft is not None:
+            return render_result({**draft, 'job_id': job.id, 'refining': job.params.get('refine', True)})
+
+    if not wait_or_cancel(job, job.wait):
+        return disconnected_response(job)
+    return job_result_response(job)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """
+    Count and time every request under its route pattern, so job ids do not
+    explode the label space, and name the job a request created in X-Dream-Job-Id
+    """
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_count.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+    if 'request_started' in g:
+        request_seconds.observe(time.perf_counter() - g.request_started, endpoint=endpoint, method=request.method)
+    # Streamed bodies (SSE) have no length up front
+    if not response.is_streamed:
+        response_bytes.inc(response.calculate_content_length() or 0, endpoint=endpoint)
+    # Whatever the body's format, the pool learns which worker owns the job
+    if 'job_id' in g:
+        response.headers['X-Dream-Job-Id'] = g.job_id
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def export_metrics():
+    """Counters, gauges and histograms in the Prometheus text exposition format"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """The HTTP server is up; says nothing about the model"""
+    return jsonify({
+        'live': True
+    })
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """200 once the backend and model are resolved and warm, 503 before and while draining"""
+    return jsonify(runtime.to_dict()), 200 if runtime.accepting else 503
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Check if Blender and Dream Textures are ready"""
     try:
-        # Check if Dream Textures is available
-        addon_enabled = 'dream_textures' in bpy.context.preferences.addons
-
         return jsonify({
-            'status': 'healthy',
-            'blender_version': bpy.app.version_string,
-            'dream_textures_enabled': addon_enabled,
-            'python_version': sys.version
+            'status': 'draining' if runtime.draining.is_set() else 'healthy' if runtime.ready.is_set() else 'starting',
+            'live': True,
+            **runtime.to_dict(),
+            'blender_version': blender_version,
+            'dream_textures_enabled': runtime.addon_enabled,
+            'python_version': sys.version,
+            'queued_jobs': jobs.queue_depth(),
+            'queued_by_priority': jobs.queue_depth_by_priority(),
+            'queued_bpy_calls': dispatcher.queue_depth(),
+            'store': store.stats() if store else None
         })
     except Exception as e:
         return jsonify({
@@ -42,145 +1810,261 @@ def health_check():
             'message': str(e)
         }), 500
 
-@app.route('/generate-texture', methods=['POST'])
-def generate_texture():
+@app.route('/jobs', methods=['POST'])
+def create_job():
     """
-    Generate single texture map using Dream Textures direct API
+    Queue a generation job and return immediately
 
     Request body:
     {
-        "prompt": "brushed steel texture",
-        "resolution": 1024,
-        "seed": -1,
-        "steps": 20,
-        "map_type": "albedo" | "normal" | "roughness" | "metallic"
+        "kind": "texture" | "pbr-set" | "variations" | "refine",
+        "priority": "interactive" | "bulk" (default: bulk for pbr-set, interactive otherwise),
+        ...same fields as /generate-texture, /generate-pbr-set, /generate-variations or /refine-texture
     }
     """
-    try:
-        data = request.json
-        prompt = data['prompt']
-        resolution = data.get('resolution', 1024)
-        seed = data.get('seed', -1)
-        steps = data.get('steps', 20)
-        map_type = data.get('map_type', 'albedo')
+    data = request.get_json(silent=True) or {}
+    job, error = submit_job(data.get('kind', 'texture'), data)
+    if error:
+        return error
 
-        # Adjust prompt based on map type
-        if map_type == 'normal':
-            prompt = f"{prompt}, normal map, blue purple surface detail, bump map"
-        elif map_type == 'roughness':
-            prompt = f"{prompt}, roughness map, grayscale surface variation, smooth to rough"
-        elif map_type == 'metallic':
-            prompt = f"{prompt}, metallic map, grayscale metal mask, black non-metal white metal"
-        elif map_type == 'ao':
-            prompt = f"{prompt}, ambient occlusion map, grayscale cavity shadows"
-
-        # Use scene's existing Dream Textures configuration
-        scene = bpy.context.scene
+    return jsonify({
+        'success': True,
+        **job.to_dict()
+    }), 202
 
-        # Get the texture-diffusion model (Model 0 from installed models)
-        addon = bpy.context.preferences.addons.get('dream_textures')
-        if addon and hasattr(addon.preferences, 'installed_models') and len(addon.preferences.installed_models) > 0:
-            texture_model = addon.preferences.installed_models[0]  # dream-textures/texture-diffusion
-            print(f"Using model: {texture_model.model_base}")
-        else:
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report state and progress of a job"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown job: {job_id}'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        **job.to_dict()
+    })
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """
+    Cancel a job
+    Queued jobs never run; a running job's generation is aborted at its
+    next step, freeing the GPU, and the job ends in state "cancelled"
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown job: {job_id}'
+        }), 404
+
+    if job.finished:
+        return jsonify({
+            'success': False,
+            'error': f'Job has already {job.state}',
+            **job.to_dict()
+        }), 409
+
+    if not job.cancelled:
+        jobs.cancel(job_id, 'deleted')
+        job_cancellations.inc(reason='deleted')
+    return jsonify({
+        'success': True,
+        **job.to_dict()
+    }), 202 if not job.finished else 200
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """
+    Return the maps of a finished job
+    ?stage=draft returns the draft of a "quality": "draft" job as soon as it exists
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown job: {job_id}'
+        }), 404
+
+    stage = request.args.get('stage')
+    if stage:
+        partial = job.partials.get(stage)
+        if partial is not None:
+            return render_result(partial)
+        if job.finished:
             return jsonify({
                 'success': False,
-                'error': 'No models installed. Please install dream-textures/texture-diffusion model.'
-            }), 500
+                'error': f"Job has no '{stage}' result",
+                **job.to_dict()
+            }), 404
+        return jsonify({
+            'success': False,
+            'error': f"Job has no '{stage}' result yet",
+            **job.to_dict()
+        }), 409
+
+    if not job.finished:
+        return jsonify({
+            'success': False,
+            'error': 'Job has not finished yet',
+            **job.to_dict()
+        }), 409
 
-        # Update prompt in scene properties
-        scene.dream_textures_prompt.prompt_structure = "custom"
-        scene.dream_textures_prompt.prompt_structure_token_subject = prompt
+    return job_result_response(job)
 
-        # Set resolution and steps
-        scene.dream_textures_prompt.width = resolution
-        scene.dream_textures_prompt.height = resolution
-        scene.dream_textures_prompt.steps = steps
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """
+    Stream job events as Server-Sent Events
 
-        if seed != -1:
-            scene.dream_textures_prompt.random_seed = False
-            scene.dream_textures_prompt.seed = seed
-        else:
-            scene.dream_textures_prompt.random_seed = True
+    Events:
+        state     job state changes (same fields as GET /jobs/<id>)
+        progress  step, total, eta and, every preview_every steps, a base64 PNG preview
+                  (previews are only encoded while at least one client streams)
+        draft     the full draft result of a "quality": "draft" job, images in base64
 
-        # Generate using the existing backend configuration
-        backend = scene.dream_textures_engine_prompt.get_backend()
+    The stream ends after the final state event. Reconnecting clients may
+    send Last-Event-ID to resume.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown job: {job_id}'
+        }), 404
 
-        # Build generation arguments from scene settings
-        gen_args = scene.dream_textures_prompt.generate_args(bpy.context)
+    try:
+        last_seq = int(request.headers.get('Last-Event-ID', request.args.get('since', 0)))
+    except ValueError:
+        last_seq = 0
 
-        # Manually set the model since the enum is broken in Blender 4.5.1
-        # Create a model wrapper with the expected 'id' attribute
-        class ModelWrapper:
-            def __init__(self, model):
-                self.id = model.model_base  # Use model_base as id
-                self.model = model.model  # Full path
-                self.model_base = model.model_base
+    def stream():
+        seq = last_seq
+        # Previews are only encoded while someone is watching
+        with job.watching():
+            while True:
+                events = job.events_after(seq, timeout=EVENTS_KEEPALIVE)
+                if not events:
+                    if job.finished:
+                        return
+                    yield ': keep-alive\n\n'
+                    continue
 
-        gen_args.model = ModelWrapper(texture_model)
+                for seq, name, data in events:
+                    yield f"id: {seq}\nevent: {name}\ndata: {json.dumps(data)}\n\n"
+                    if name == 'state' and data['state'] in FINISHED_STATES:
+                        return
 
-        # Generate texture
-        generated_result = None
-        generation_error = None
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
-        def step_callback(results):
-            return True  # Continue generation
+@app.route('/debug/memory', methods=['GET'])
+def debug_memory():
+    """
+    Where the memory goes: RSS against the soft limit, Blender image count,
+    the last sweep, cache size, and tracemalloc's top allocators (?limit=N,
+    when DREAM_BRIDGE_TRACEMALLOC is set)
+    """
+    limit = request.args.get('limit', 10, type=int)
+    return jsonify({
+        'success': True,
+        **memory_monitor.stats(),
+        'draining': runtime.draining.is_set(),
+        'blender_images': dispatcher.call(lambda: len(bpy.data.images)),
+        'gc_counts': gc.get_count(),
+        'cache_memory_bytes': cache.stats()['memory_bytes'],
+        'tracemalloc': tracemalloc_stats(limit)
+    })
 
-        def complete_callback(result):
-            nonlocal generated_result, generation_error
-            if isinstance(result, Exception):
-                generation_error = result
-            elif isinstance(result, list) and len(result) > 0:
-                generated_result = result[0]
+@app.route('/debug/memory/sweep', methods=['POST'])
+def sweep_memory_now():
+    """Run a memory sweep now instead of waiting for the next interval"""
+    report = memory_monitor.check()
+    return jsonify({
+        'success': True,
+        **report,
+        'rss_bytes': memory_monitor.rss
+    })
 
-        backend.generate(gen_args, step_callback, complete_callback)
+@app.route('/models', methods=['GET'])
+def list_models():
+    """Installed models a request may name in "model", and the default one"""
+    if not runtime.ready.is_set():
+        return not_ready_response()
 
-        # Wait for generation to complete
-        import time
-        timeout = 120  # 2 minutes max
-        elapsed = 0
-        while generated_result is None and generation_error is None and elapsed < timeout:
-            time.sleep(0.5)
-            elapsed += 0.5
+    return jsonify({
+        'success': True,
+        'default': runtime.model.model_base,
+        'models': [
+            {
+                'id': name,
+                'path': model.model,
+                'default': name == runtime.model.model_base
+            }
+            for name, model in runtime.models.items()
+        ]
+    })
 
-        if generation_error:
-            return jsonify({
-                'success': False,
-                'error': f'Generation failed: {str(generation_error)}'
-            }), 500
+@app.route('/cache', methods=['GET'])
+def cache_stats():
+    """Report result cache hit/miss counters and sizes"""
+    return jsonify({
+        'success': True,
+        **cache.stats(),
+        'coalesced': flights.coalesced,
+        'in_flight': flights.in_flight()
+    })
 
-        if generated_result is None:
-            return jsonify({
-                'success': False,
-                'error': 'Generation timed out'
-            }), 500
+@app.route('/cache', methods=['DELETE'])
+def purge_cache():
+    """Remove every cached result from memory and disk"""
+    removed = cache.purge()
+    return jsonify({
+        'success': True,
+        'removed': removed
+    })
 
-        # Convert PIL image to base64
-        from io import BytesIO
-        buffer = BytesIO()
-        generated_result.image.save(buffer, format='PNG')
-        img_data = base64.b64encode(buffer.getvalue()).decode('utf-8')
+@app.route('/generate-texture', methods=['POST'])
+def generate_texture():
+    """
+    Generate single texture map using Dream Textures direct API
+    Thin synchronous wrapper over a 'texture' job
 
-        return jsonify({
-            'success': True,
-            'map_type': map_type,
-            'image': img_data,
-            'resolution': resolution,
-            'prompt_used': prompt
-        })
+    Request body:
+    {
+        "prompt": "brushed steel texture",
+        "resolution": 1024,
+        "seed": -1,
+        "steps": 20,
+        "model": "dream-textures/texture-diffusion" (default: the first installed; see GET /models),
+        "map_type": "albedo" | "normal" | "roughness" | "metallic",
+        "format": "png" | "png16" | "webp" | "jpeg" | "rgba" (default: png),
+        "compression": 0-9 (png, png16, webp),
+        "jpeg_quality": 1-95 (jpeg; a numeric "quality" is accepted too),
+        "quality": "draft" | "final",
+        "refine": true (draft only; false stops after the draft),
+        "refine_strength": 0.55 (draft only)
+    }
 
-    except Exception as e:
-        import traceback
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'traceback': traceback.format_exc()
-        }), 500
+    With "quality": "draft" the response is the draft, plus the job_id
+    whose result is the refined texture.
+    """
+    job, error = submit_job('texture', request.get_json(silent=True))
+    if error:
+        return error
+
+    return sync_job_response(job)
 
 @app.route('/generate-pbr-set', methods=['POST'])
 def generate_pbr_set():
     """
     Generate complete PBR texture set using Dream Textures direct API
+    Thin synchronous wrapper over a 'pbr-set' job
 
     Request body:
     {
@@ -188,136 +2072,62 @@ def generate_pbr_set():
         "resolution": 1024,
         "seed": -1,
         "steps": 20,
-        "maps": ["albedo", "normal", "roughness", "metallic", "ao"]
+        "model": "dream-textures/texture-diffusion" (default: the first installed; see GET /models),
+        "maps": ["albedo", "normal", "roughness", "metallic", "ao"],
+        "mode": "diffuse" | "derive",
+        "metallic": 0.0-1.0 (derive mode only; omit to estimate from albedo),
+        "format": "png" or {"albedo": "jpeg", "normal": "png16", "default": "webp"},
+        "compression": 0-9,
+        "jpeg_quality": 1-95,
+        "quality": "draft" | "final",
+        "refine": true,
+        "refine_strength": 0.55,
+        "pack": "orm" (AO, roughness, metallic in R, G, B, replacing those maps),
+        "lods": [2048, 1024, 512, 256] (resolution defaults to the largest)
     }
-    """
-    try:
-        data = request.json
-        base_prompt = data['prompt']
-        resolution = data.get('resolution', 1024)
-        seed = data.get('seed', -1)
-        steps = data.get('steps', 20)
-        maps = data.get('maps', ['albedo', 'normal', 'roughness', 'metallic'])
-
-        results = {}
 
-        # Import needed modules
-        from io import BytesIO
-        import time
-
-        # Get scene configuration
-        scene = bpy.context.scene
-        backend = scene.dream_textures_engine_prompt.get_backend()
-
-        # Get the texture-diffusion model
-        addon = bpy.context.preferences.addons.get('dream_textures')
-        if addon and hasattr(addon.preferences, 'installed_models') and len(addon.preferences.installed_models) > 0:
-            texture_model = addon.preferences.installed_models[0]
-            print(f"Using model: {texture_model.model_base}")
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'No models installed. Please install dream-textures/texture-diffusion model.'
-            }), 500
-
-        # Generate each map type
-        for map_type in maps:
-            # Create specialized prompt for each map
-            if map_type == 'albedo':
-                prompt = f"{base_prompt}, color map, diffuse texture, photorealistic material"
-            elif map_type == 'normal':
-                prompt = f"{base_prompt}, normal map, blue purple tangent space, surface detail"
-            elif map_type == 'roughness':
-                prompt = f"{base_prompt}, roughness map, grayscale, smooth black rough white"
-            elif map_type == 'metallic':
-                prompt = f"{base_prompt}, metallic map, grayscale, metal white non-metal black"
-            elif map_type == 'ao':
-                prompt = f"{base_prompt}, ambient occlusion, grayscale, cavity shadows"
-            else:
-                prompt = base_prompt
+    With "quality": "draft" the response is the draft set, plus the job_id
+    whose result is the refined set.
+    """
+    job, error = submit_job('pbr-set', request.get_json(silent=True))
+    if error:
+        return error
 
-            print(f"Generating {map_type} map: {prompt}")
+    return sync_job_response(job)
 
-            # Update scene prompt settings
-            scene.dream_textures_prompt.prompt_structure = "custom"
-            scene.dream_textures_prompt.prompt_structure_token_subject = prompt
-            scene.dream_textures_prompt.width = resolution
-            scene.dream_textures_prompt.height = resolution
-            scene.dream_textures_prompt.steps = steps
-
-            if seed != -1:
-                scene.dream_textures_prompt.random_seed = False
-                scene.dream_textures_prompt.seed = seed
-            else:
-                scene.dream_textures_prompt.random_seed = True
-
-            # Generate arguments from scene
-            gen_args = scene.dream_textures_prompt.generate_args(bpy.context)
-
-            # Manually set the model with wrapper
-            class ModelWrapper:
-                def __init__(self, model):
-                    self.id = model.model_base
-                    self.model = model.model
-                    self.model_base = model.model_base
-
-            gen_args.model = ModelWrapper(texture_model)
-
-            # Generate texture
-            generated_result = None
-            generation_error = None
-
-            def step_callback(results):
-                return True
-
-            def complete_callback(result):
-                nonlocal generated_result, generation_error
-                if isinstance(result, Exception):
-                    generation_error = result
-                elif isinstance(result, list) and len(result) > 0:
-                    generated_result = result[0]
-
-            backend.generate(gen_args, step_callback, complete_callback)
-
-            # Wait for generation
-            timeout = 120
-            elapsed = 0
-            while generated_result is None and generation_error is None and elapsed < timeout:
-                time.sleep(0.5)
-                elapsed += 0.5
-
-            if generation_error:
-                print(f"✗ Failed to generate {map_type}: {str(generation_error)}")
-                results[map_type] = None
-            elif generated_result:
-                # Convert to base64
-                buffer = BytesIO()
-                generated_result.image.save(buffer, format='PNG')
-                results[map_type] = base64.b64encode(buffer.getvalue()).decode('utf-8')
-                print(f"✓ Generated {map_type}")
-            else:
-                results[map_type] = None
-                print(f"✗ Failed to generate {map_type} (timeout)")
+@app.route('/generate-variations', methods=['POST'])
+def generate_variations():
+    """
+    Generate several seeds of one prompt, batched into as few backend calls as possible
+    Thin synchronous wrapper over a 'variations' job
 
-        return jsonify({
-            'success': True,
-            'prompt': base_prompt,
-            'resolution': resolution,
-            'maps': results
-        })
+    Request body:
+    {
+        "prompt": "brushed steel texture",
+        "count": 4,
+        "resolution": 1024,
+        "seed": -1,
+        "steps": 20,
+        "model": "dream-textures/texture-diffusion" (default: the first installed; see GET /models),
+        "map_type": "albedo" | "normal" | "roughness" | "metallic",
+        "format": "png" | "png16" | "webp" | "jpeg" | "rgba" (default: png),
+        "compression": 0-9 (png, png16, webp),
+        "jpeg_quality": 1-95 (jpeg)
+    }
+    """
+    job, error = submit_job('variations', request.get_json(silent=True))
+    if error:
+        return error
 
-    except Exception as e:
-        import traceback
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'traceback': traceback.format_exc()
-        }), 500
+    if not wait_or_cancel(job, job.wait):
+        return disconnected_response(job)
+    return job_result_response(job)
 
 @app.route('/refine-texture', methods=['POST'])
 def refine_texture():
     """
     Refine existing texture using img2img
+    Thin synchronous wrapper over a 'refine' job
 
     Request body:
     {
@@ -325,70 +2135,32 @@ def refine_texture():
         "prompt": "add scratches and wear",
         "strength": 0.5,
         "resolution": 1024,
-        "steps": 20
+        "steps": 20,
+        "format": "png" | "png16" | "webp" | "jpeg" | "rgba" (default: png)
     }
-    """
-    try:
-        data = request.json
-        base_texture_b64 = data['base_texture']
-        prompt = data['prompt']
-        strength = data.get('strength', 0.5)
-        resolution = data.get('resolution', 1024)
-        steps = data.get('steps', 20)
-
-        # Decode base texture
-        img_data = base64.b64decode(base_texture_b64)
-        temp_input = '/tmp/dream_input.png'
 
-        with open(temp_input, 'wb') as f:
-            f.write(img_data)
-
-        # Load image into Blender
-        base_img = bpy.data.images.load(temp_input)
-
-        # Call Dream Textures img2img
-        bpy.ops.dream_textures.refine_texture(
-            image=base_img,
-            prompt=prompt,
-            strength=strength,
-            steps=steps,
-            width=resolution,
-            height=resolution
-        )
-
-        # Get refined image
-        refined_img = bpy.data.images.get('DreamTextures_Refined')
-
-        if refined_img:
-            temp_output = '/tmp/dream_refined.png'
-            refined_img.filepath_raw = temp_output
-            refined_img.file_format = 'PNG'
-            refined_img.save()
-
-            with open(temp_output, 'rb') as f:
-                refined_data = base64.b64encode(f.read()).decode('utf-8')
-
-            # Cleanup
-            os.remove(temp_input)
-            os.remove(temp_output)
-            bpy.data.images.remove(base_img)
-            bpy.data.images.remove(refined_img)
+    The texture may also be sent as a raw image/png body with the other
+    fields in the query string, or as a multipart/form-data file field
+    named base_texture.
+    """
+    # Binary uploads are carried as base64 like JSON ones; submit_job validates it
+    if request.mimetype.startswith('image/'):
+        data = request.args.to_dict()
+        data['base_texture'] = base64.b64encode(request.get_data()).decode('ascii')
+    elif request.mimetype == 'multipart/form-data':
+        data = request.form.to_dict()
+        upload = request.files.get('base_texture')
+        data['base_texture'] = base64.b64encode(upload.read()).decode('ascii') if upload else None
+    else:
+        data = request.get_json(silent=True) or {}
 
-            return jsonify({
-                'success': True,
-                'image': refined_data
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'Refinement failed'
-            }), 500
+    job, error = submit_job('refine', data)
+    if error:
+        return error
 
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    if not wait_or_cancel(job, job.wait):
+        return disconnected_response(job)
+    return job_result_response(job)
 
 if __name__ == '__main__':
     print("=" * 60)
@@ -396,12 +2168,22 @@ if __name__ == '__main__':
     print("=" * 60)
     print(f"Blender version: {bpy.app.version_string}")
     print(f"Python version: {sys.version}")
-    print("Starting Flask API server on http://127.0.0.1:5555")
+    print(f"Serving Flask API on http://{args.host}:{args.port}")
     print("=" * 60)
 
-    app.run(
-        host='127.0.0.1',
-        port=5555,
-        debug=False,
-        threaded=True
-    )
+    # Hand the bound socket to Flask; connections arriving in between wait in the backlog
+    startup.enter('serve')
+    early_server.stop()
+    server = make_server(args.host, args.port, app, threaded=True, fd=listener.fileno())
+
+    # HTTP threads only queue work; Blender's main thread runs every bpy call
+    threading.Thread(target=server.serve_forever, name='flask-server', daemon=True).start()
+
+    # Enable the addon, resolve the backend and warm up while /health already answers
+    threading.Thread(target=initialize, name='bridge-init', daemon=True).start()
+    memory_monitor.start()
+
+    try:
+        dispatcher.run_forever()
+    except KeyboardInterrupt:
+        print("Shutting down")
@@ -0,0 +1,431 @@
+"""
+Load generator and benchmark for the Dream Textures bridge
+Drives the bridge endpoints at a fixed concurrency over a mix of resolutions
+and map counts, then reports throughput and p50/p95/p99 latency as JSON.
+
+Without --url it starts its own bridge against the stub bpy module in stubs/,
+whose fake backend sleeps for --delay seconds per generate call, so the numbers
+measure the serving path rather than the GPU.
+
+Usage:
+    python bridge_bench.py --concurrency 4 --requests 200 --output bench.json
+    python bridge_bench.py --scenarios texture,pbr-set --resolutions 512,1024 --map-counts 1,4
+    python bridge_bench.py --url http://127.0.0.1:5555 --duration 60   # an already running bridge or pool
+
+    # A/B: encode/generate pipelining on (candidate) vs off (baseline)
+    python bridge_bench.py --scenarios pbr-set --map-counts 5 --resolutions 1024 --concurrency 1 --requests 10 --env DREAM_BRIDGE_MAX_BATCH=1 --baseline-env DREAM_BRIDGE_PIPELINE=0
+"""
+
+import argparse
+import base64
+import http.client
+import io
+import itertools
+import json
+import math
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import Counter
+
+from bridge_pool import stub_command, stub_environment
+
+# Scenario -> endpoint it posts to; 'job' submits a texture job and follows it to its result
+SCENARIO_PATHS = {
+    'texture': '/generate-texture',
+    'pbr-set': '/generate-pbr-set',
+    'variations': '/generate-variations',
+    'job': '/jobs',
+    'refine': '/refine-texture'
+}
+
+SCENARIOS = tuple(SCENARIO_PATHS)
+
+PBR_MAPS = ('albedo', 'normal', 'roughness', 'metallic', 'ao')
+
+ACCEPT_TYPES = {
+    'json': 'application/json',
+    'png': 'image/png',
+    'multipart': 'multipart/mixed'
+}
+
+
+class Sample:
+    """Outcome of one request (or, for job scenarios, one submit-to-result round trip)"""
+
+    __slots__ = ('scenario', 'status', 'seconds', 'bytes', 'error')
+
+    def __init__(self, scenario, status, seconds, size=0, error=None):
+        self.scenario = scenario
+        self.status = status
+        self.seconds = seconds
+        self.bytes = size
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None and 200 <= self.status < 300
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of values (fraction in 0-1); None when empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples, elapsed):
+    """Throughput and latency statistics for a list of samples"""
+    latencies = [sample.seconds * 1000 for sample in samples if sample.ok]
+
+    def rounded(value):
+        return None if value is None else round(value, 2)
+
+    return {
+        'requests': len(samples),
+        'succeeded': len(latencies),
+        'errors': len(samples) - len(latencies),
+        'status_counts': dict(Counter(str(sample.status) for sample in samples)),
+        'throughput_rps': round(len(latencies) / elapsed, 3) if elapsed > 0 else None,
+        'bytes_received': sum(sample.bytes for sample in samples),
+        'latency_ms': {
+            'p50': rounded(percentile(latencies, 0.50)),
+            'p95': rounded(percentile(latencies, 0.95)),
+            'p99': rounded(percentile(latencies, 0.99)),
+            'mean': rounded(sum(latencies) / len(latencies)) if latencies else None,
+            'max': rounded(max(latencies)) if latencies else None
+        }
+    }
+
+
+def noise_png_base64(resolution):
+    """A random RGB PNG to use as the /refine-texture input"""
+    import numpy as np
+    from PIL import Image
+
+    pixels = np.random.default_rng(resolution).integers(0, 256, (resolution, resolution, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels, 'RGB').save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+def build_plan(scenarios, resolutions, map_counts):
+    """Every (scenario, resolution, map_count) combination; map_count only matters for pbr-set and variations"""
+    plan = []
+    for scenario in scenarios:
+        counts = map_counts if scenario in ('pbr-set', 'variations') else [1]
+        for resolution in resolutions:
+            for count in counts:
+                plan.append((scenario, resolution, count))
+    return plan
+
+
+def scenario_label(scenario, resolution, count):
+    if scenario in ('pbr-set', 'variations'):
+        return f'{scenario}@{resolution}x{count}'
+    return f'{scenario}@{resolution}'
+
+
+class LoadGenerator:
+    """
+    Sends requests from `concurrency` threads, each with its own connection
+    and X-Client-Id, cycling through the plan until the request budget or the
+    duration is used up
+    """
+
+    def __init__(self, url, plan, concurrency=4, steps=4, seed=-1, accept='json', timeout=600):
+        parsed = urllib.parse.urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.plan = plan
+        self.concurrency = concurrency
+        self.steps = steps
+        self.seed = seed
+        self.accept = ACCEPT_TYPES[accept]
+        self.timeout = timeout
+        self._refine_inputs = {}
+        self._lock = threading.Lock()
+        self._cycle = None
+        self._remaining = 0
+        self._deadline = None
+
+    def body_for(self, scenario, resolution, count):
+        body = {'prompt': 'weathered oak planks', 'resolution': resolution, 'steps': self.steps, 'seed': self.seed}
+        if scenario == 'pbr-set':
+            body['maps'] = list(itertools.islice(itertools.cycle(PBR_MAPS), count))
+        elif scenario == 'variations':
+            body['count'] = count
+        elif scenario == 'job':
+            body['kind'] = 'texture'
+        elif scenario == 'refine':
+            if resolution not in self._refine_inputs:
+                self._refine_inputs[resolution] = noise_png_base64(resolution)
+            body = {
+                'base_texture': self._refine_inputs[resolution],
+                'prompt': 'add scratches',
+                'strength': 0.5,
+                'resolution': resolution,
+                'steps': self.steps
+            }
+        return body
+
+    def _next(self):
+        with self._lock:
+            if self._deadline is not None and time.monotonic() >= self._deadline:
+                return None
+            if self._deadline is None:
+                if self._remaining <= 0:
+                    return None
+                self._remaining -= 1
+            return next(self._cycle)
+
+    def _request(self, connection, method, path, body=None, headers=None):
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = dict(headers or {})
+        if payload is not None:
+            headers['Content-Type'] = 'application/json'
+        connection.request(method, path, body=payload, headers=headers)
+        response = connection.getresponse()
+        data = response.read()
+        return response.status, data
+
+    def _run_one(self, connection, client, scenario, resolution, count):
+        # Multi-image results cannot be a single PNG
+        accept = self.accept
+        if accept == ACCEPT_TYPES['png'] and scenario in ('pbr-set', 'variations'):
+            accept = ACCEPT_TYPES['multipart']
+        headers = {'X-Client-Id': client, 'Accept': accept}
+        body = self.body_for(scenario, resolution, count)
+
+        started = time.perf_counter()
+        status, data = self._request(connection, 'POST', SCENARIO_PATHS[scenario], body, headers)
+        size = len(data)
+
+        if scenario == 'job' and status == 202:
+            # Follow the job through its event stream, then fetch the result
+            job_id = json.loads(data)['job_id']
+            status, events = self._request(connection, 'GET', f'/jobs/{job_id}/events', headers=headers)
+            size += len(events)
+            if status == 200:
+                status, data = self._request(connection, 'GET', f'/jobs/{job_id}/result', headers=headers)
+                size += len(data)
+
+        return status, time.perf_counter() - started, size
+
+    def _worker(self, index, samples):
+        client = f'bench-{index}'
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            while True:
+                item = self._next()
+                if item is None:
+                    return
+                label = scenario_label(*item)
+                try:
+                    status, seconds, size = self._run_one(connection, client, *item)
+                    samples.append(Sample(label, status, seconds, size))
+                except (OSError, ValueError, http.client.HTTPException) as e:
+                    connection.close()
+                    samples.append(Sample(label, 0, 0.0, error=str(e)))
+        finally:
+            connection.close()
+
+    def run(self, requests=None, duration=None):
+        """Run the load; returns (samples, elapsed seconds)"""
+        self._cycle = itertools.cycle(self.plan)
+        self._remaining = requests or 0
+        self._deadline = time.monotonic() + duration if duration else None
+
+        samples = []
+        threads = [
+            threading.Thread(target=self._worker, args=(index, samples), name=f'bench-{index}', daemon=True)
+            for index in range(self.concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, time.perf_counter() - started
+
+
+def report(samples, elapsed, config):
+    """The JSON document written by the benchmark"""
+    by_scenario = {}
+    for sample in samples:
+        by_scenario.setdefault(sample.scenario, []).append(sample)
+
+    errors = Counter(sample.error for sample in samples if sample.error)
+    return {
+        'config': config,
+        'elapsed_seconds': round(elapsed, 3),
+        'overall': summarize(samples, elapsed),
+        'scenarios': {label: summarize(items, elapsed) for label, items in sorted(by_scenario.items())},
+        'transport_errors': dict(errors)
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url, timeout=60, process=None):
+    parsed = urllib.parse.urlparse(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'Bridge exited with code {process.returncode}')
+        try:
+            connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=2)
+            connection.request('GET', '/health/ready')
+            if connection.getresponse().status == 200:
+                return
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'Bridge at {url} was not ready after {timeout}s')
+
+
+def start_stub_bridge(delay, pattern='noise', env=None):
+    """Start blender_bridge.py against the stub backend; returns (process, url)"""
+    port = free_port()
+    environment = stub_environment()
+    environment.update({
+        'FAKE_DREAM_DELAY': str(delay),
+        'FAKE_DREAM_PATTERN': pattern,
+        'DREAM_BRIDGE_CACHE_DIR': tempfile.mkdtemp(prefix='dream-bench-cache-'),
+        'DREAM_BRIDGE_STORE_DIR': tempfile.mkdtemp(prefix='dream-bench-store-')
+    })
+    environment.update(env or {})
+    process = subprocess.Popen(stub_command()(port), env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_ready(url, process=process)
+    except Exception:
+        process.kill()
+        raise
+    return process, url
+
+
+def int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def env_pair(value):
+    key, separator, setting = value.partition('=')
+    if not separator:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got '{value}'")
+    return key, setting
+
+
+def run_benchmark(args, scenarios, env=None):
+    """Start a stub bridge with env (unless --url was given), drive it and return (samples, elapsed)"""
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_stub_bridge(args.delay, args.pattern, {
+            'DREAM_BRIDGE_JOB_WORKERS': str(args.job_workers),
+            'DREAM_BRIDGE_MAX_QUEUED': '0',
+            **(env or {})
+        })
+
+    try:
+        plan = build_plan(scenarios, args.resolutions, args.map_counts)
+        generator = LoadGenerator(url, plan, args.concurrency, args.steps, args.seed, args.accept)
+        if args.warmup:
+            generator.run(requests=args.warmup)
+        return generator.run(requests=args.requests, duration=args.duration)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+def compare(baseline, candidate):
+    """How much faster candidate is than baseline"""
+    def reduction(before, after):
+        if not before or after is None:
+            return None
+        return round((before - after) / before * 100, 1)
+
+    return {
+        'wall_clock_reduction_percent': reduction(baseline['elapsed_seconds'], candidate['elapsed_seconds']),
+        'p50_reduction_percent': reduction(baseline['overall']['latency_ms']['p50'], candidate['overall']['latency_ms']['p50']),
+        'p95_reduction_percent': reduction(baseline['overall']['latency_ms']['p95'], candidate['overall']['latency_ms']['p95']),
+        'throughput_ratio': (
+            round(candidate['overall']['throughput_rps'] / baseline['overall']['throughput_rps'], 3)
+            if baseline['overall']['throughput_rps'] else None
+        )
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Dream Textures bridge serving path')
+    parser.add_argument('--url', help='benchmark a running bridge or pool instead of starting a stub bridge')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument('--resolutions', type=int_list, default=[512])
+    parser.add_argument('--map-counts', type=int_list, default=[4], help='maps per pbr-set / count per variations request')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=100, help='total requests (ignored with --duration)')
+    parser.add_argument('--duration', type=float, help='run for this many seconds instead of a request count')
+    parser.add_argument('--warmup', type=int, default=0, help='requests sent and discarded before measuring')
+    parser.add_argument('--steps', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=-1, help='-1 bypasses the result cache')
+    parser.add_argument('--accept', choices=sorted(ACCEPT_TYPES), default='json')
+    parser.add_argument('--delay', type=float, default=0.05, help='stub backend seconds per generate call')
+    parser.add_argument('--pattern', choices=('noise', 'solid'), default='noise', help='stub image content')
+    parser.add_argument('--job-workers', type=int, default=1, help='DREAM_BRIDGE_JOB_WORKERS for the stub bridge')
+    parser.add_argument('--env', type=env_pair, action='append', default=[], metavar='KEY=VALUE',
+                        help='extra environment for the stub bridge (repeatable)')
+    parser.add_argument('--baseline-env', type=env_pair, action='append', default=[], metavar='KEY=VALUE',
+                        help='also run a baseline stub bridge with these overrides and report the difference (repeatable)')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    scenarios = [scenario.strip() for scenario in args.scenarios.split(',') if scenario.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if args.url and (args.env or args.baseline_env):
+        parser.error('--env and --baseline-env need the stub bridge; drop --url')
+
+    config = {key: value for key, value in vars(args).items() if key not in ('output', 'env', 'baseline_env')}
+    config['scenarios'] = scenarios
+    config['url'] = args.url or 'stub'
+    config['env'] = dict(args.env)
+
+    result = report(*run_benchmark(args, scenarios, dict(args.env)), config)
+    if args.baseline_env:
+        baseline_env = {**dict(args.env), **dict(args.baseline_env)}
+        baseline = report(*run_benchmark(args, scenarios, baseline_env), {**config, 'env': baseline_env})
+        result = {'baseline': baseline, 'candidate': result, 'comparison': compare(baseline, result)}
+        summary = result['candidate']
+    else:
+        summary = result
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        overall = summary['overall']
+        print(f"✓ {overall['succeeded']}/{overall['requests']} requests, "
+              f"{overall['throughput_rps']} req/s, p95 {overall['latency_ms']['p95']} ms -> {args.output}")
+        if 'comparison' in result:
+            print(f"  vs baseline: {result['comparison']['wall_clock_reduction_percent']}% less wall-clock time")
+    else:
+        print(text)
+
+    failed = summary['overall']['errors'] or ('baseline' in result and result['baseline']['overall']['errors'])
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
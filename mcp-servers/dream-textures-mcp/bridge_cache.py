@@ -0,0 +1,267 @@
+"""
+Result cache for the Dream Textures bridge
+In-memory LRU in front of a content-addressed on-disk store, both size-bounded,
+plus single-flight coalescing of identical in-flight generations
+"""
+
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import Future
+
+
+class ResultCache:
+    """
+    Two-tier cache of encoded images keyed by generation parameters
+
+    The memory tier is an LRU bounded by memory_bytes. The disk tier keeps one
+    file per key under directory and evicts the least recently used files once
+    disk_bytes is exceeded. A disk_bytes of 0 disables the disk tier.
+    """
+
+    def __init__(self, directory, memory_bytes, disk_bytes):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = collections.OrderedDict()
+        self._memory_size = 0
+        self._disk = collections.OrderedDict()
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+
+        if self.disk_bytes > 0:
+            os.makedirs(self.directory, exist_ok=True)
+            self._load_disk_index()
+
+    @staticmethod
+    def make_key(**fields):
+        """Stable content key for a set of generation parameters"""
+        payload = json.dumps(fields, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key, count_miss=True):
+        """
+        The cached bytes for key, or None
+        A caller that looks again on a miss (e.g. before queuing, then in the
+        job) passes count_miss=False the first time, so one miss counts once
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return data
+
+            on_disk = key in self._disk
+
+        data = self._read_file(key) if on_disk else None
+
+        with self._lock:
+            if data is None:
+                if count_miss:
+                    self.misses += 1
+                return None
+
+            self.hits += 1
+            self.disk_hits += 1
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self._remember(key, data)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._remember(key, data)
+            if self.disk_bytes <= 0 or key in self._disk:
+                return
+
+        self._write_file(key, data)
+
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = len(data)
+                self._disk_size += len(data)
+            evicted = self._evict_disk()
+
+        for old_key in evicted:
+            self._remove_file(old_key)
+
+    def purge(self):
+        """Drop every entry from both tiers; returns the number of entries removed"""
+        with self._lock:
+            keys = set(self._memory) | set(self._disk)
+            disk_keys = list(self._disk)
+            self._memory.clear()
+            self._memory_size = 0
+            self._disk.clear()
+            self._disk_size = 0
+
+        for key in disk_keys:
+            self._remove_file(key)
+        return len(keys)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_size,
+                'memory_limit_bytes': self.memory_bytes,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_size,
+                'disk_limit_bytes': self.disk_bytes
+            }
+
+    def _remember(self, key, data):
+        """Insert into the memory LRU; caller holds the lock"""
+        if len(data) > self.memory_bytes:
+            return
+
+        if key in self._memory:
+            self._memory_size -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_size += len(data)
+
+        while self._memory_size > self.memory_bytes:
+            _, old = self._memory.popitem(last=False)
+            self._memory_size -= len(old)
+
+    def _evict_disk(self):
+        """Pop least recently used disk entries over the limit; caller holds the lock"""
+        evicted = []
+        while self._disk_size > self.disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            evicted.append(key)
+        return evicted
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _read_file(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            with self._lock:
+                size = self._disk.pop(key, None)
+                if size is not None:
+                    self._disk_size -= size
+            return None
+
+    def _write_file(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A unique temp name, so writers in other threads or processes never share one
+        fd, temp_path = tempfile.mkstemp(prefix=f'{key}.', suffix='.tmp', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            self._remove_file_path(temp_path)
+            raise
+
+    def _remove_file(self, key):
+        self._remove_file_path(self._path(key))
+
+    def _load_disk_index(self):
+        """Rebuild the disk LRU from file modification times"""
+        entries = []
+        for shard in os.listdir(self.directory):
+            shard_path = os.path.join(self.directory, shard)
+            if not os.path.isdir(shard_path):
+                continue
+            for name in os.listdir(shard_path):
+                path = os.path.join(shard_path, name)
+                if name.endswith('.tmp'):
+                    self._remove_file_path(path)
+                    continue
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+
+        for key in self._evict_disk():
+            self._remove_file(key)
+
+    @staticmethod
+    def _remove_file_path(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key onto one execution
+
+    The first caller for a key runs fn; callers arriving while it is still
+    running block on the same pending result instead of running it again.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._attached = collections.Counter()
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Return (result, shared) where shared is True for attached callers"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self.coalesced += 1
+                self._attached[key] += 1
+
+        if not leader:
+            try:
+                return future.result(), True
+            finally:
+                with self._lock:
+                    self._attached[key] -= 1
+                    if not self._attached[key]:
+                        del self._attached[key]
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def attached(self, key):
+        """Callers currently waiting on the leader of key"""
+        with self._lock:
+            return self._attached[key]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
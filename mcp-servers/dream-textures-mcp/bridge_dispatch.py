@@ -0,0 +1,71 @@
+"""
+Main-thread dispatcher for the Dream Textures bridge
+bpy is not thread-safe, so every bpy access is queued here and executed by
+Blender's main thread while Flask serves HTTP from its own threads.
+"""
+
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class MainThreadDispatcher:
+    """Runs queued callables on the thread that called run_forever"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._owner = None
+
+    @property
+    def running(self):
+        return self._owner is not None
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn on the dispatcher thread and return its result (or raise its exception)"""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue fn for the dispatcher thread and return a Future for its result
+        Calls queued before run_forever starts are served once it does
+        """
+        future = Future()
+
+        # Calls made from the dispatcher thread itself would deadlock if queued
+        if threading.get_ident() == self._owner:
+            self._run(future, fn, args, kwargs)
+            return future
+
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def run_forever(self):
+        """Serve queued calls on the current thread until stop() is called"""
+        self._owner = threading.get_ident()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                self._run(*item)
+        finally:
+            self._owner = None
+
+    def stop(self):
+        self._queue.put(None)
+
+    @staticmethod
+    def _run(future, fn, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        except BaseException as e:
+            # KeyboardInterrupt / SystemExit still stop Blender
+            future.set_exception(e)
+            raise
@@ -0,0 +1,187 @@
+"""
+Output encodings for generated maps
+
+    png    8-bit PNG; compression 0-9 trades size for speed (default 6)
+    png16  16-bit PNG, for normal maps; 8-bit sources are widened, derived
+           maps keep their full precision
+    webp   lossless WebP; compression 0-6 is the encoder effort
+    jpeg   lossy JPEG at quality 1-95, for albedo previews
+    rgba   raw 8-bit RGBA rows, top to bottom, with no header
+
+Encoded bytes carry their format so responses get the right content type.
+"""
+
+import io
+import struct
+import zlib
+
+import numpy as np
+
+from bridge_metrics import stage_seconds
+
+# format -> (mimetype, file extension)
+FORMATS = {
+    'png': ('image/png', 'png'),
+    'png16': ('image/png', 'png'),
+    'webp': ('image/webp', 'webp'),
+    'jpeg': ('image/jpeg', 'jpg'),
+    'rgba': ('application/octet-stream', 'rgba')
+}
+
+DEFAULT_FORMAT = 'png'
+DEFAULT_COMPRESSION = 6
+DEFAULT_QUALITY = 90
+
+MAX_WEBP_METHOD = 6
+MAX_JPEG_QUALITY = 95
+
+
+class EncodedImage(bytes):
+    """Image bytes tagged with their format"""
+
+    def __new__(cls, data, format=DEFAULT_FORMAT):
+        encoded = super().__new__(cls, data)
+        encoded.format = format
+        return encoded
+
+    @property
+    def mimetype(self):
+        return FORMATS[self.format][0]
+
+    @property
+    def extension(self):
+        return FORMATS[self.format][1]
+
+
+class Encoding:
+    """How one map is encoded; raises ValueError for unknown formats or out-of-range settings"""
+
+    __slots__ = ('format', 'compression', 'quality')
+
+    def __init__(self, format=DEFAULT_FORMAT, compression=DEFAULT_COMPRESSION, quality=DEFAULT_QUALITY):
+        self.format = str(format).strip().lower()
+        self.compression = int(compression)
+        self.quality = int(quality)
+
+        if self.format not in FORMATS:
+            raise ValueError(f"Unknown format '{format}' (expected one of: {', '.join(FORMATS)})")
+        if not 0 <= self.compression <= 9:
+            raise ValueError('compression must be between 0 and 9')
+        if self.format == 'webp' and self.compression > MAX_WEBP_METHOD:
+            raise ValueError(f'compression must be between 0 and {MAX_WEBP_METHOD} for webp')
+        if not 1 <= self.quality <= MAX_JPEG_QUALITY:
+            raise ValueError(f'JPEG quality must be between 1 and {MAX_JPEG_QUALITY}')
+
+    @property
+    def settings(self):
+        """The knobs that affect this format's output"""
+        if self.format in ('png', 'png16', 'webp'):
+            return {'compression': self.compression}
+        if self.format == 'jpeg':
+            return {'quality': self.quality}
+        return {}
+
+    @property
+    def is_default(self):
+        return self.format == DEFAULT_FORMAT and self.compression == DEFAULT_COMPRESSION
+
+    def cache_fields(self):
+        """Extra cache key fields; none for default PNG so existing entries stay valid"""
+        if self.is_default:
+            return {}
+        return {'encoding': [self.format, self.settings]}
+
+
+def encoding_for(params, map_type):
+    """
+    The Encoding a request asks for for map_type
+    format is a format name, or {map_type: format} with an optional "default";
+    JPEG quality is jpeg_quality, or a numeric quality for older clients
+    """
+    format = params.get('format') or DEFAULT_FORMAT
+    if isinstance(format, dict):
+        format = format.get(map_type) or format.get('default') or DEFAULT_FORMAT
+    return Encoding(
+        format,
+        params.get('compression', DEFAULT_COMPRESSION),
+        params.get('jpeg_quality', params.get('quality', DEFAULT_QUALITY))
+    )
+
+
+def normalize_format(value):
+    """Canonical form of a request's format field; raises ValueError if any format is unknown"""
+    if isinstance(value, dict):
+        return {str(key).strip().lower(): Encoding(format).format for key, format in value.items()}
+    return Encoding(value).format
+
+
+def to_array(image):
+    """PIL image or array -> uint8/uint16 array of HxW, HxWx3 or HxWx4"""
+    if hasattr(image, 'mode'):
+        if image.mode not in ('L', 'RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    return np.asarray(image)
+
+
+def to_uint8(array):
+    return (array >> 8).astype(np.uint8) if array.dtype == np.uint16 else array.astype(np.uint8)
+
+
+def png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+
+def encode_png16(array, compression=DEFAULT_COMPRESSION):
+    """
+    Write a 16-bit grey, RGB or RGBA PNG (Pillow only writes 16-bit greyscale)
+    Every row uses the Up filter, which suits smooth maps like normals
+    """
+    if array.dtype != np.uint16:
+        array = array.astype(np.uint16) * 257
+
+    height, width = array.shape[:2]
+    channels = 1 if array.ndim == 2 else array.shape[2]
+    colour_type = {1: 0, 3: 2, 4: 6}[channels]
+
+    rows = array.astype('>u2').reshape(height, width * channels).view(np.uint8)
+    filtered = rows.copy()
+    filtered[1:] -= rows[:-1]
+    raw = np.concatenate([np.full((height, 1), 2, dtype=np.uint8), filtered], axis=1)
+
+    header = struct.pack('>IIBBBBB', width, height, 16, colour_type, 0, 0, 0)
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        png_chunk(b'IHDR', header),
+        png_chunk(b'IDAT', zlib.compress(raw.tobytes(), compression)),
+        png_chunk(b'IEND', b'')
+    ])
+
+
+def encode_image(image, encoding=None, stage=None):
+    """Encode a PIL image or uint8/uint16 array; returns EncodedImage, timed under stage (default "<format>_encode")"""
+    from PIL import Image
+
+    encoding = encoding or Encoding()
+    settings = encoding.settings
+
+    with stage_seconds.time(stage=stage or f'{encoding.format}_encode'):
+        if encoding.format == 'png16':
+            return EncodedImage(encode_png16(to_array(image), settings['compression']), 'png16')
+
+        if encoding.format == 'rgba':
+            array = to_uint8(to_array(image))
+            return EncodedImage(np.asarray(Image.fromarray(array).convert('RGBA')).tobytes(), 'rgba')
+
+        if not hasattr(image, 'save'):
+            image = Image.fromarray(to_uint8(to_array(image)))
+
+        buffer = io.BytesIO()
+        if encoding.format == 'png':
+            image.save(buffer, format='PNG', compress_level=settings['compression'])
+        elif encoding.format == 'webp':
+            image.save(buffer, format='WEBP', lossless=True, method=settings['compression'])
+        else:
+            if image.mode not in ('L', 'RGB'):
+                image = image.convert('RGB')
+            image.save(buffer, format='JPEG', quality=settings['quality'])
+        return EncodedImage(buffer.getvalue(), encoding.format)
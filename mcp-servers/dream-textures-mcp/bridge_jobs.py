@@ -0,0 +1,401 @@
+"""
+Job subsystem for the Dream Textures bridge
+Runs generation work on background workers so HTTP threads only submit and poll
+"""
+
+import collections
+import contextlib
+import math
+import threading
+import time
+import traceback
+import uuid
+
+from bridge_scheduler import BULK, FairQueue
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+# Events kept per job for /jobs/<id>/events; older ones are dropped
+MAX_EVENTS = 256
+
+# Assumed job duration for Retry-After until one has finished
+DEFAULT_JOB_SECONDS = 5.0
+
+# Seconds a finished job that the store holds stays in memory as well, so
+# sync responses, the draft partial and late event streams still see it
+PERSISTED_RETENTION = 60
+
+# A restored job that was already started this many times is failed instead
+# of re-queued, in case it is what keeps crashing the bridge
+MAX_ATTEMPTS = 3
+
+
+class Job:
+    """A single unit of generation work and its outcome"""
+
+    def __init__(self, kind, params, client='anonymous', priority=BULK, job_id=None, created_at=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.client = client
+        self.priority = priority
+        self.state = QUEUED
+        self.progress = 0.0
+        self.result = None
+        self.partials = {}
+        self.error = None
+        self.traceback = None
+        self.cancel_reason = None
+        self.attempts = 0
+        self.created_at = created_at or time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+        self._events = collections.deque(maxlen=MAX_EVENTS)
+        self._event_seq = 0
+        self._events_changed = threading.Condition()
+        self._progress_span = (0.0, 1.0)
+        self._watchers = 0
+        self._persisted = False
+        self.publish('state', self.to_dict())
+
+    @classmethod
+    def from_record(cls, record):
+        """Rebuild a job from its JobStore record"""
+        job = cls(record['kind'], record['params'], record['client'], record['priority'],
+                  job_id=record['id'], created_at=record['created_at'])
+        job.attempts = record['attempts']
+        if record['finished_at'] is not None:
+            job.state = record['state']
+            job.result = record['result']
+            job.error = record['error']
+            job.cancel_reason = record['cancel_reason']
+            job.progress = 1.0 if job.state == SUCCEEDED else 0.0
+            job.started_at = record['started_at']
+            job.finished_at = record['finished_at']
+            job.publish('state', job.to_dict())
+            job._done.set()
+        return job
+
+    @property
+    def finished(self):
+        return self.state in FINISHED_STATES
+
+    @property
+    def cancelled(self):
+        """True once cancellation was requested; running handlers stop at their next step"""
+        return self.cancel_reason is not None
+
+    def set_progress(self, value, **details):
+        """Update progress (0-1 within the current phase) and publish it with any extra details"""
+        start, end = self._progress_span
+        value = max(0.0, min(1.0, float(value)))
+        self.progress = start + value * (end - start)
+        self.publish('progress', {'progress': round(self.progress, 4), **details})
+
+    def progress_phase(self, start, end):
+        """Map later set_progress values onto start..end of overall progress"""
+        self._progress_span = (start, end)
+
+    def set_partial(self, name, result, data=None):
+        """
+        Store an intermediate result (e.g. a draft) ahead of the final one
+        and publish it as a `name` event carrying data
+        """
+        self.partials[name] = result
+        self.publish(name, data if data is not None else {})
+
+    def wait_partial(self, name, timeout=None):
+        """Block until the named partial result exists or the job has finished; returns it or None"""
+        with self._events_changed:
+            self._events_changed.wait_for(lambda: name in self.partials or self.finished, timeout)
+        return self.partials.get(name)
+
+    @property
+    def watched(self):
+        """True while at least one client streams this job's events"""
+        return self._watchers > 0
+
+    @contextlib.contextmanager
+    def watching(self):
+        """Count a streaming client for the duration of the block"""
+        with self._events_changed:
+            self._watchers += 1
+        try:
+            yield self
+        finally:
+            with self._events_changed:
+                self._watchers -= 1
+
+    def publish(self, name, data):
+        """Append an event for streaming clients"""
+        with self._events_changed:
+            self._event_seq += 1
+            self._events.append((self._event_seq, name, data))
+            self._events_changed.notify_all()
+
+    def compact_events(self):
+        """Drop step previews from the kept events; only a running job's watchers need them"""
+        with self._events_changed:
+            self._events = collections.deque(
+                (
+                    (seq, name, {key: value for key, value in data.items() if key != 'preview'})
+                    if name == 'progress' and 'preview' in data else (seq, name, data)
+                    for seq, name, data in self._events
+                ),
+                maxlen=MAX_EVENTS
+            )
+
+    def events_after(self, seq, timeout=None):
+        """
+        Return (seq, name, data) events newer than seq
+        Waits up to timeout for one to arrive if there are none yet
+        """
+        with self._events_changed:
+            if self._event_seq <= seq and not self.finished:
+                self._events_changed.wait(timeout)
+            return [event for event in self._events if event[0] > seq]
+
+    def wait(self, timeout=None):
+        """Block until the job has finished; returns False on timeout"""
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'priority': self.priority,
+            'state': self.state,
+            'progress': round(self.progress, 4),
+            'partials': sorted(self.partials),
+            'error': self.error,
+            'cancel_reason': self.cancel_reason,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobManager:
+    """
+    Queues jobs and runs them on a fixed pool of worker threads
+
+    handlers maps a job kind to a callable taking the Job and returning the
+    result dict. Exceptions raised by a handler mark the job as failed;
+    exceptions of an "expected" type carry no traceback.
+
+    Jobs wait in a FairQueue: max_queued and per_client bound it (submit
+    raises QueueFull past either) and weights sets each client's share.
+
+    With a JobStore every state change is persisted: restore() re-queues
+    jobs a previous process left pending, and get() falls back to the store
+    for jobs no longer in memory. A finished job the store holds is only
+    kept in memory for persisted_retention seconds, other finished jobs for
+    retention seconds; prune() forgets them sooner than the next submit.
+    """
+
+    def __init__(self, handlers, workers=1, retention=3600, expected_errors=(),
+                 max_queued=0, per_client=0, weights=None, store=None,
+                 persisted_retention=PERSISTED_RETENTION):
+        self._handlers = handlers
+        self._store = store
+        self._workers = workers
+        self._retention = retention
+        self._persisted_retention = persisted_retention
+        self._expected_errors = tuple(expected_errors)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._queue = FairQueue(max_queued, per_client, weights)
+        self._job_seconds = None
+
+        for index in range(workers):
+            thread = threading.Thread(
+                target=self._worker,
+                name=f'dream-job-worker-{index}',
+                daemon=True
+            )
+            thread.start()
+
+    @property
+    def kinds(self):
+        return sorted(self._handlers)
+
+    def submit(self, kind, params, client='anonymous', priority=BULK):
+        """Queue a job; raises ValueError for an unknown kind or priority, QueueFull when over a limit"""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind '{kind}' (expected one of: {', '.join(self.kinds)})")
+
+        job = Job(kind, params, client, priority)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        # Recorded before a worker can pick it up, so later states always win
+        self._persist(job)
+        try:
+            self._queue.put(job, client, priority, self.retry_after())
+        except Exception:
+            with self._lock:
+                del self._jobs[job.id]
+            if self._store is not None:
+                self._store.delete(job.id)
+            raise
+        return job
+
+    def complete(self, kind, params, result, client='anonymous', priority=BULK):
+        """
+        Record a job whose result is already known (e.g. from the result
+        cache) as succeeded, without queuing it; returns the Job
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind '{kind}' (expected one of: {', '.join(self.kinds)})")
+
+        job = Job(kind, params, client, priority)
+        job.started_at = time.time()
+        job.result = result
+        job.progress = 1.0
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._finish(job, SUCCEEDED)
+        return job
+
+    def restore(self):
+        """
+        Re-queue the jobs a previous process left queued or running, in
+        submission order and regardless of queue limits; returns how many
+        """
+        if self._store is None:
+            return 0
+
+        restored = 0
+        for record in self._store.pending():
+            if record['id'] in self._jobs:
+                continue
+            job = Job.from_record(record)
+            with self._lock:
+                self._jobs[job.id] = job
+            if job.attempts >= MAX_ATTEMPTS:
+                self._finish(job, FAILED, f'Job was interrupted {job.attempts} times; not retried')
+                continue
+            self._queue.put(job, job.client, job.priority, limit=False)
+            restored += 1
+        return restored
+
+    def cancel(self, job_id, reason='deleted'):
+        """
+        Cancel a job; returns it, or None if unknown
+        A queued job is cancelled right away. A running job is flagged and its
+        handler is expected to abort at the next generation step.
+        """
+        job = self.get(job_id)
+        if job is None or job.finished or job.cancelled:
+            return job
+
+        job.cancel_reason = reason
+        if self._queue.remove(job):
+            job.started_at = time.time()
+            self._finish(job, CANCELLED, f'Job cancelled ({reason})')
+        else:
+            job.publish('state', job.to_dict())
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self._store is not None:
+            record = self._store.load(job_id)
+            if record is not None and record['finished_at'] is not None:
+                job = Job.from_record(record)
+        return job
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def active(self):
+        """Jobs queued or running"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def queue_depth_by_priority(self):
+        return self._queue.depth_by_class()
+
+    def retry_after(self):
+        """Whole seconds until the workers are likely to have drained the current queue"""
+        job_seconds = self._job_seconds or DEFAULT_JOB_SECONDS
+        return max(1, math.ceil(job_seconds * (self.queue_depth() + 1) / self._workers))
+
+    def prune(self):
+        """Forget the finished jobs that are past their retention; returns how many"""
+        with self._lock:
+            return self._prune()
+
+    def _prune(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at < now - (
+                min(self._retention, self._persisted_retention) if job._persisted else self._retention
+            )
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        return len(expired)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            job.started_at = time.time()
+            if job.cancelled:
+                self._finish(job, CANCELLED, f'Job cancelled ({job.cancel_reason})')
+                continue
+
+            job.state = RUNNING
+            job.attempts += 1
+            job.publish('state', job.to_dict())
+            self._persist(job)
+            try:
+                job.result = self._handlers[job.kind](job)
+                job.progress = 1.0
+                state, error = SUCCEEDED, None
+            except Exception as e:
+                if job.cancelled:
+                    state, error = CANCELLED, f'Job cancelled ({job.cancel_reason})'
+                else:
+                    state, error = FAILED, str(e)
+                    if not isinstance(e, self._expected_errors):
+                        job.traceback = traceback.format_exc()
+            self._record_duration(time.time() - job.started_at)
+            self._finish(job, state, error)
+
+    def _finish(self, job, state, error=None):
+        job.state = state
+        job.error = error
+        job.finished_at = time.time()
+        job._persisted = self._persist(job)
+        job.publish('state', job.to_dict())
+        job.compact_events()
+        job._done.set()
+
+    def _persist(self, job):
+        """Record a job's state; returns whether it was stored. A store failure is logged, never fatal to the job"""
+        if self._store is None:
+            return False
+        try:
+            self._store.save(job)
+        except Exception as e:
+            print(f"✗ Could not persist job {job.id}: {e}")
+            return False
+        return True
+
+    def _record_duration(self, seconds):
+        """Exponential moving average of job run time, for Retry-After"""
+        if self._job_seconds is None:
+            self._job_seconds = seconds
+        else:
+            self._job_seconds = 0.8 * self._job_seconds + 0.2 * seconds
@@ -0,0 +1,203 @@
+"""
+Derive PBR maps from a single albedo image with vectorized NumPy kernels
+Python counterpart of lib/services/imageProcessing.ts; every map lines up
+pixel-for-pixel with the albedo. Neighbourhoods wrap around the edges so
+seamless textures stay seamless.
+
+Also packs grayscale maps into channels (ORM: AO, roughness, metallic in
+R, G, B) and builds downscaled LOD levels of finished maps.
+"""
+
+import numpy as np
+
+DERIVABLE_MAPS = ('normal', 'roughness', 'ao', 'metallic')
+
+
+def to_rgb_array(image):
+    """PIL image or array -> float32 HxWx3 array in 0-255"""
+    array = np.asarray(image.convert('RGB') if hasattr(image, 'convert') else image)
+    return array[..., :3].astype(np.float32)
+
+
+def luminance(rgb):
+    """Rec. 601 luminance, as used by the web app"""
+    return rgb[..., 0] * 0.299 + rgb[..., 1] * 0.587 + rgb[..., 2] * 0.114
+
+
+def normal_map(rgb, strength=2.0, dtype=np.uint8):
+    """Tangent-space normal map from a Sobel filter over luminance, as uint8 or uint16"""
+    gray = luminance(rgb)
+
+    def shifted(dy, dx):
+        return np.roll(gray, shift=(-dy, -dx), axis=(0, 1))
+
+    tl, t, tr = shifted(-1, -1), shifted(-1, 0), shifted(-1, 1)
+    l, r = shifted(0, -1), shifted(0, 1)
+    bl, b, br = shifted(1, -1), shifted(1, 0), shifted(1, 1)
+
+    dx = (tr + 2 * r + br) - (tl + 2 * l + bl)
+    dy = (bl + 2 * b + br) - (tl + 2 * t + tr)
+    dz = np.full_like(gray, 255.0 / strength)
+
+    length = np.sqrt(dx * dx + dy * dy + dz * dz)
+    normal = np.stack([dx, dy, dz], axis=-1) / length[..., None]
+    return ((normal * 0.5 + 0.5) * np.iinfo(dtype).max).astype(dtype)
+
+
+def roughness_map(rgb, invert=True, contrast=1.2):
+    """Grayscale roughness from luminance with a contrast curve"""
+    value = luminance(rgb)
+    if invert:
+        value = 255 - value
+    value = (value - 128) * contrast + 128
+    return np.clip(value, 0, 255).astype(np.uint8)
+
+
+def box_blur(values, radius):
+    """Separable wrap-around box blur using cumulative sums"""
+    size = 2 * radius + 1
+    for axis in (0, 1):
+        padded = np.concatenate([
+            np.take(values, range(-radius - 1, 0), axis=axis, mode='wrap'),
+            values,
+            np.take(values, range(radius), axis=axis, mode='wrap')
+        ], axis=axis)
+        summed = np.cumsum(padded, axis=axis, dtype=np.float64)
+        upper = np.take(summed, range(size, summed.shape[axis]), axis=axis)
+        lower = np.take(summed, range(0, summed.shape[axis] - size), axis=axis)
+        values = ((upper - lower) / size).astype(np.float32)
+    return values
+
+
+def ao_map(rgb, radius=None, strength=4.0):
+    """
+    Ambient occlusion from cavities: pixels lower than their blurred
+    surroundings (treating luminance as height) are darkened
+    """
+    height = luminance(rgb) / 255.0
+    if radius is None:
+        radius = max(1, min(height.shape) // 64)
+    cavity = box_blur(height, radius) - height
+    ao = 1.0 - np.clip(cavity * strength, 0.0, 1.0)
+    return (ao * 255).astype(np.uint8)
+
+
+def metallic_map(rgb, value=None):
+    """
+    Metallic mask; bright, unsaturated areas read as metal
+    A fixed value in 0-1 produces a uniform map instead
+    """
+    if value is not None:
+        return np.full(rgb.shape[:2], np.uint8(round(float(value) * 255)))
+
+    high = rgb.max(axis=-1)
+    low = rgb.min(axis=-1)
+    saturation = np.where(high > 0, (high - low) / np.maximum(high, 1e-6), 0.0)
+    metal = np.clip((high / 255.0 - 0.35) * 2.0, 0.0, 1.0) * (1.0 - saturation)
+    return (metal * 255).astype(np.uint8)
+
+
+def derive_maps(albedo, maps, metallic=None, sixteen_bit=()):
+    """
+    Return {map_type: array} for every derivable map in maps
+    Arrays are uint8, except uint16 for normal maps named in sixteen_bit
+    """
+    rgb = to_rgb_array(albedo)
+    kernels = {
+        'normal': lambda: normal_map(rgb, dtype=np.uint16 if 'normal' in sixteen_bit else np.uint8),
+        'roughness': lambda: roughness_map(rgb),
+        'ao': lambda: ao_map(rgb),
+        'metallic': lambda: metallic_map(rgb, metallic)
+    }
+    return {map_type: kernels[map_type]() for map_type in maps if map_type in kernels}
+
+
+# Channel layouts for packed textures, R to B
+PACKINGS = {
+    'orm': ('ao', 'roughness', 'metallic')
+}
+
+# Value of a packed channel whose map is missing: unoccluded, fully rough, dielectric
+NEUTRAL_CHANNELS = {
+    'ao': 255,
+    'roughness': 255,
+    'metallic': 0
+}
+
+
+def to_gray(array):
+    """uint8 HxW array from a grayscale or RGB(A) map"""
+    array = np.asarray(array)
+    if array.ndim == 3:
+        array = luminance(array[..., :3].astype(np.float32)) + 0.5
+    return array.astype(np.uint8)
+
+
+def pack_channels(packing, maps, size):
+    """
+    Stack the grayscale maps named by packing into one uint8 RGB array
+    Missing maps become their neutral value; returns (array, filled map names)
+    """
+    channels = []
+    filled = []
+    for map_type in PACKINGS[packing]:
+        source = maps.get(map_type)
+        if source is None:
+            channels.append(np.full((size, size), NEUTRAL_CHANNELS[map_type], dtype=np.uint8))
+            filled.append(map_type)
+        else:
+            channels.append(to_gray(source))
+    return np.stack(channels, axis=-1), filled
+
+
+def box_resize(array, size):
+    """float32 box-filtered resize through Pillow, one channel at a time"""
+    from PIL import Image
+
+    if array.ndim == 3:
+        return np.stack([box_resize(array[..., channel], size) for channel in range(array.shape[2])], axis=-1)
+    return np.asarray(Image.fromarray(array.astype(np.float32), 'F').resize((size, size), Image.BOX))
+
+
+def downsample(array, size):
+    """
+    Area-average a square map down to size x size, keeping its dtype
+    Integer ratios (every level of a power-of-two mip chain) average exact
+    blocks; other sizes fall back to Pillow's box filter
+    """
+    array = np.asarray(array)
+    height = array.shape[0]
+    if height == size:
+        return array
+    if height % size:
+        averaged = box_resize(array, size)
+    else:
+        factor = height // size
+        blocks = array.reshape(size, factor, size, factor, *array.shape[2:])
+        averaged = blocks.mean(axis=(1, 3), dtype=np.float32)
+    if np.issubdtype(array.dtype, np.integer):
+        return (averaged + 0.5).astype(array.dtype)
+    return averaged
+
+
+def downsample_normals(array, size):
+    """Downsample a normal map by averaging the decoded vectors and renormalizing them"""
+    array = np.asarray(array)
+    scale = float(np.iinfo(array.dtype).max)
+    vectors = downsample(array[..., :3].astype(np.float32) / scale * 2.0 - 1.0, size)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-6)
+    return ((vectors * 0.5 + 0.5) * scale + 0.5).astype(array.dtype)
+
+
+def lod_levels(array, sizes, normal=False):
+    """
+    {size: array} for each size, largest first; each level is averaged from
+    the previous one when it divides evenly, like a mip chain
+    """
+    shrink = downsample_normals if normal else downsample
+    levels = {}
+    current = np.asarray(array)
+    for size in sorted(sizes, reverse=True):
+        source = current if current.shape[0] % size == 0 else array
+        current = levels[size] = shrink(source, size)
+    return levels
@@ -0,0 +1,153 @@
+"""
+Memory hygiene for the long-running bridge
+
+Reads the process's resident set size and tracemalloc's top allocators, and
+runs a monitor thread that periodically sweeps leaked data and reports the
+first time RSS crosses a soft limit, so the bridge can drain and exit for its
+supervisor to restart it. Stdlib only, so it runs inside Blender's bundled
+Python.
+"""
+
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# Exit status of a bridge that recycled itself (EX_TEMPFAIL); supervisors restart on it
+RECYCLE_EXIT_CODE = 75
+
+
+def rss_bytes():
+    """Current resident set size, or None where it cannot be read"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    # Without /proc (macOS) the peak is the best the stdlib offers
+    return peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    """Highest resident set size so far, or None where it cannot be read"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def top_allocations(limit=10):
+    """tracemalloc's largest allocation sites, or None when it is not tracing"""
+    if not tracemalloc.is_tracing():
+        return None
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<unknown>')
+    ))
+    return [
+        {
+            'location': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+            'size_bytes': stat.size,
+            'count': stat.count
+        }
+        for stat in snapshot.statistics('lineno')[:limit]
+    ]
+
+
+def tracemalloc_stats(limit=10):
+    """Traced totals and top allocators for /debug/memory"""
+    if not tracemalloc.is_tracing():
+        return {'tracing': False}
+
+    traced, peak = tracemalloc.get_traced_memory()
+    return {
+        'tracing': True,
+        'frames': tracemalloc.get_traceback_limit(),
+        'traced_bytes': traced,
+        'peak_bytes': peak,
+        'top': top_allocations(limit)
+    }
+
+
+class MemoryMonitor:
+    """
+    Sweeps and samples memory every interval seconds
+
+    sweep() frees what the bridge knows can leak and returns a dict of what it
+    removed; a full gc pass follows. on_limit(rss) is called once, the first
+    time RSS exceeds soft_limit_bytes (0 disables the limit).
+    """
+
+    def __init__(self, interval, soft_limit_bytes=0, sweep=None, on_limit=None):
+        self.interval = interval
+        self.soft_limit_bytes = soft_limit_bytes
+        self._sweep = sweep
+        self._on_limit = on_limit
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.sweeps = 0
+        self.last_sweep = None
+        self.baseline_rss = None
+        self.rss = None
+        self.limit_exceeded = False
+
+    def start(self):
+        self.baseline_rss = rss_bytes()
+        if self.interval <= 0:
+            return
+        thread = threading.Thread(target=self._loop, name='dream-memory', daemon=True)
+        thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def check(self):
+        """Sweep now, sample RSS and apply the soft limit; returns the sweep's report"""
+        with self._lock:
+            report = {}
+            if self._sweep is not None:
+                try:
+                    report = dict(self._sweep() or {})
+                except Exception as e:
+                    print(f"✗ Memory sweep failed: {e}")
+                    report = {'error': str(e)}
+            report['gc_collected'] = gc.collect()
+            report['at'] = time.time()
+
+            self.sweeps += 1
+            self.last_sweep = report
+            self.rss = rss_bytes()
+
+            exceeded = (self.soft_limit_bytes and self.rss is not None and self.rss > self.soft_limit_bytes
+                        and not self.limit_exceeded)
+            if exceeded:
+                self.limit_exceeded = True
+
+        if exceeded and self._on_limit is not None:
+            self._on_limit(self.rss)
+        return report
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rss_bytes': rss_bytes(),
+                'peak_rss_bytes': peak_rss_bytes(),
+                'baseline_rss_bytes': self.baseline_rss,
+                'soft_limit_bytes': self.soft_limit_bytes,
+                'limit_exceeded': self.limit_exceeded,
+                'sweep_interval': self.interval,
+                'sweeps': self.sweeps,
+                'last_sweep': self.last_sweep
+            }
+
+    def _loop(self):
+        while not self._stopping.wait(self.interval):
+            self.check()
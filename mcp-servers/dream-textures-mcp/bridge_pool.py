@@ -0,0 +1,532 @@
+"""
+Multi-instance pool for the Dream Textures bridge
+Launches N bridge processes on separate ports, health-checks them through
+/health, restarts dead ones and serves a single front endpoint that routes
+each request to the least-loaded ready worker (fixed-seed requests to the
+worker their parameters hash to, whose cache may already hold them).
+
+Usage:
+    python bridge_pool.py --workers 2 --blender /path/to/blender
+    python bridge_pool.py --workers 2 --stub    # fake backend from stubs/, no Blender
+"""
+
+import argparse
+import http.client
+import json
+import os
+import re
+import select
+import socket
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bridge_memory import RECYCLE_EXIT_CODE
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BRIDGE_SCRIPT = os.path.join(HERE, 'blender_bridge.py')
+STUBS_DIR = os.path.join(HERE, 'stubs')
+
+# Requests for an existing job must go to the worker that owns it
+JOB_PATH = re.compile(r'^/jobs/([0-9a-f]+)')
+
+# Same defaults as the bridge; each worker gets its own subdirectory of both,
+# so a restarted worker re-queues only its own jobs and each worker's cache
+# stays within its own disk limit (/cache requests go to every worker)
+DEFAULT_STORE_DIR = os.path.expanduser('~/.local/share/dream-textures-bridge')
+DEFAULT_CACHE_DIR = os.path.expanduser('~/.cache/dream-textures-bridge')
+
+# Same defaults as the bridge's DREAM_BRIDGE_JOB_RETENTION and DREAM_BRIDGE_STORE_TTL
+DEFAULT_JOB_RETENTION = 3600
+DEFAULT_STORE_TTL = 86400
+
+# Headers that describe a single connection and must not be forwarded
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade', 'host', 'content-length'
+}
+
+
+def job_owner_ttl(env):
+    """
+    Seconds a worker keeps answering for a job it was last asked about: the
+    store's TTL when it persists jobs, else its in-memory retention
+    """
+    retention = int(env.get('DREAM_BRIDGE_JOB_RETENTION', DEFAULT_JOB_RETENTION))
+    if env.get('DREAM_BRIDGE_STORE_DIR', DEFAULT_STORE_DIR):
+        return max(retention, int(env.get('DREAM_BRIDGE_STORE_TTL', DEFAULT_STORE_TTL)))
+    return retention
+
+
+def affinity_key(body):
+    """
+    Routing key of a fixed-seed generation request, or None
+    Built from the fields every map's cache key shares, so repeats and sets
+    overlapping in their maps reach the worker whose cache holds them
+    """
+    try:
+        data = json.loads(body)
+        fixed_seed = isinstance(data, dict) and int(data.get('seed', -1)) != -1
+    except (TypeError, ValueError):
+        return None
+    if not fixed_seed:
+        return None
+    fields = {field: data.get(field) for field in ('resolution', 'steps', 'seed', 'model', 'quality')}
+    fields['prompt'] = ' '.join(str(data.get('prompt', '')).split())
+    return json.dumps(fields, sort_keys=True, default=str)
+
+
+def blender_command(blender_path):
+    """Command template for a real headless Blender worker"""
+    return lambda port: [blender_path, '--background', '--python', BRIDGE_SCRIPT, '--', '--port', str(port)]
+
+
+def stub_command():
+    """Command template for a worker running against the stub bpy module"""
+    return lambda port: [sys.executable, BRIDGE_SCRIPT, '--port', str(port)]
+
+
+def stub_environment():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [STUBS_DIR, env.get('PYTHONPATH')]))
+    return env
+
+
+class Worker:
+    """One bridge process and what the pool knows about its health and load"""
+
+    def __init__(self, index, host, port, command, env):
+        self.index = index
+        self.host = host
+        self.port = port
+        self.command = command
+        self.env = dict(env)
+        store_dir = self.env.get('DREAM_BRIDGE_STORE_DIR', DEFAULT_STORE_DIR)
+        self.env['DREAM_BRIDGE_STORE_DIR'] = os.path.join(store_dir, f'worker-{index}') if store_dir else ''
+        cache_dir = self.env.get('DREAM_BRIDGE_CACHE_DIR') or DEFAULT_CACHE_DIR
+        self.env['DREAM_BRIDGE_CACHE_DIR'] = os.path.join(cache_dir, f'worker-{index}')
+        self.process = None
+        self.ready = False
+        self.in_flight = 0
+        self.queued = 0
+        self.failures = 0
+        self.restarts = 0
+        self.started_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def persistent(self):
+        """True when the worker's jobs survive its restart"""
+        return bool(self.env['DREAM_BRIDGE_STORE_DIR'])
+
+    @property
+    def load(self):
+        return self.in_flight + self.queued
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        self.process = subprocess.Popen(self.command(self.port), env=self.env)
+        self.started_at = time.monotonic()
+        self.ready = False
+        self.failures = 0
+        print(f"✓ Started worker {self.index} on port {self.port} (pid {self.process.pid})")
+
+    def stop(self, timeout=10):
+        if not self.alive():
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def acquire(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def to_dict(self):
+        return {
+            'index': self.index,
+            'port': self.port,
+            'pid': self.process.pid if self.process else None,
+            'alive': self.alive(),
+            'ready': self.ready,
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'restarts': self.restarts
+        }
+
+
+class BridgePool:
+    """
+    Supervises a fixed set of workers
+
+    A worker is restarted when its process exits, or when its health check
+    fails or reports it not ready max_failures times in a row once
+    startup_grace has passed (Blender and the model take a while to come
+    up), or sooner if it reports that startup failed.
+
+    The owner of each job is remembered for job_ttl seconds after it was last
+    used (default: as long as the workers keep jobs, see job_owner_ttl).
+    """
+
+    def __init__(self, workers, base_port, command, env=None, host='127.0.0.1',
+                 health_interval=2.0, max_failures=3, startup_grace=300.0, job_ttl=None):
+        env = env or dict(os.environ)
+        self.host = host
+        self.health_interval = health_interval
+        self.max_failures = max_failures
+        self.startup_grace = startup_grace
+        self.workers = [
+            Worker(index, host, base_port + index, command, env)
+            for index in range(workers)
+        ]
+        self.job_ttl = job_owner_ttl(env) if job_ttl is None else job_ttl
+        # job_id -> (worker, monotonic time of last use)
+        self._job_owners = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        threading.Thread(target=self._health_loop, name='pool-health', daemon=True).start()
+
+    def stop(self):
+        self._stopping.set()
+        for worker in self.workers:
+            worker.stop()
+
+    def pick(self, key=None):
+        """
+        The ready worker with the least outstanding work, or None
+        With an affinity key, the worker the key hashes to as long as it is
+        ready, so every worker's own cache and single-flight still see repeats
+        """
+        if key is not None:
+            worker = self.workers[zlib.crc32(key.encode('utf-8')) % len(self.workers)]
+            if worker.ready:
+                return worker
+        ready = [worker for worker in self.workers if worker.ready]
+        if not ready:
+            return None
+        return min(ready, key=lambda worker: (worker.load, worker.index))
+
+    def remember_job(self, job_id, worker):
+        with self._lock:
+            self._prune_jobs()
+            self._job_owners[job_id] = (worker, time.monotonic())
+
+    def job_owner(self, job_id):
+        """The worker that owns job_id, or None; each lookup keeps the entry alive"""
+        with self._lock:
+            entry = self._job_owners.get(job_id)
+            if entry is None:
+                return None
+            worker, last_used = entry
+            if time.monotonic() - last_used > self.job_ttl:
+                del self._job_owners[job_id]
+                return None
+            self._job_owners[job_id] = (worker, time.monotonic())
+            return worker
+
+    def forget_worker_jobs(self, worker):
+        """Jobs die with a worker that has no job store"""
+        with self._lock:
+            for job_id in [job_id for job_id, (owner, _) in self._job_owners.items() if owner is worker]:
+                del self._job_owners[job_id]
+
+    def _prune_jobs(self):
+        """Drop owners of jobs the workers have expired too; caller holds the lock"""
+        cutoff = time.monotonic() - self.job_ttl
+        for job_id in [job_id for job_id, (_, last_used) in self._job_owners.items() if last_used < cutoff]:
+            del self._job_owners[job_id]
+
+    def check_health(self, worker):
+        if not worker.alive():
+            code = worker.process.returncode if worker.process else None
+            if code == RECYCLE_EXIT_CODE:
+                print(f"✓ Worker {worker.index} recycled itself to release memory; restarting")
+            else:
+                print(f"✗ Worker {worker.index} exited with code {code}; restarting")
+            self.restart(worker)
+            return
+
+        try:
+            connection = http.client.HTTPConnection(self.host, worker.port, timeout=5)
+            connection.request('GET', '/health')
+            response = connection.getresponse()
+            health = json.loads(response.read())
+            connection.close()
+            worker.ready = response.status == 200 and bool(health.get('ready'))
+            worker.queued = int(health.get('queued_jobs', 0))
+        except (OSError, ValueError, http.client.HTTPException):
+            worker.ready = False
+            health = {}
+
+        # A draining worker exits by itself once its jobs are done, and one
+        # whose startup failed stays up but never becomes ready
+        if worker.ready or health.get('draining'):
+            worker.failures = 0
+            return
+        if not health.get('error') and time.monotonic() - worker.started_at < self.startup_grace:
+            return
+        worker.failures += 1
+        if worker.failures >= self.max_failures:
+            print(f"✗ Worker {worker.index} failed {worker.failures} health checks; restarting")
+            self.restart(worker)
+
+    def restart(self, worker):
+        worker.stop()
+        if not worker.persistent:
+            self.forget_worker_jobs(worker)
+        worker.restarts += 1
+        worker.start()
+
+    def cache_request(self, method):
+        """
+        Send a /cache request to every ready worker; returns (status, body)
+        with integer counters summed across workers and each worker's own
+        body under "workers"
+        """
+        ready = [worker for worker in self.workers if worker.ready]
+        if not ready:
+            return 503, {'success': False, 'error': 'No bridge worker is ready'}
+
+        totals = {}
+        bodies = []
+        for worker in ready:
+            try:
+                connection = http.client.HTTPConnection(self.host, worker.port, timeout=30)
+                connection.request(method, '/cache')
+                body = json.loads(connection.getresponse().read())
+                connection.close()
+            except (OSError, ValueError, http.client.HTTPException) as e:
+                body = {'success': False, 'error': f'Worker {worker.index} unavailable: {e}'}
+            bodies.append({'worker': worker.index, **body})
+            for key, value in body.items():
+                if isinstance(value, int) and not isinstance(value, bool) and not key.endswith('limit_bytes'):
+                    totals[key] = totals.get(key, 0) + value
+
+        success = all(body.get('success') for body in bodies)
+        return 200 if success else 502, {'success': success, **totals, 'workers': bodies}
+
+    def status(self):
+        return {
+            'workers': [worker.to_dict() for worker in self.workers],
+            'ready_workers': sum(1 for worker in self.workers if worker.ready),
+            'tracked_jobs': len(self._job_owners)
+        }
+
+    def _health_loop(self):
+        while not self._stopping.is_set():
+            for worker in self.workers:
+                if self._stopping.is_set():
+                    return
+                self.check_health(worker)
+            self._stopping.wait(self.health_interval)
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    """Front endpoint: forwards each request to a worker chosen by the pool"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def do_DELETE(self):
+        self._handle()
+
+    def do_OPTIONS(self):
+        self._handle()
+
+    def log_message(self, format, *args):
+        sys.stderr.write(f"[pool] {self.address_string()} {format % args}\n")
+
+    def _handle(self):
+        pool = self.server.pool
+
+        if self.path == '/pool':
+            self._send_json(200, pool.status())
+            return
+
+        if self.path in ('/health', '/health/live', '/health/ready'):
+            ready = pool.pick() is not None
+            status = 200 if ready or self.path != '/health/ready' else 503
+            self._send_json(status, {
+                'status': 'healthy' if ready else 'starting',
+                'live': True,
+                'ready': ready,
+                **pool.status()
+            })
+            return
+
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0) or 0))
+
+        # Every worker has its own cache, so stats and purges cover all of them
+        if self.path.split('?')[0] == '/cache' and self.command in ('GET', 'DELETE'):
+            self._send_json(*pool.cache_request(self.command))
+            return
+
+        match = JOB_PATH.match(self.path)
+        if match:
+            worker = pool.job_owner(match.group(1))
+            if worker is None:
+                self._send_json(404, {'success': False, 'error': f'Unknown job: {match.group(1)}'})
+                return
+        else:
+            worker = pool.pick(affinity_key(body))
+            if worker is None:
+                self._send_json(503, {'success': False, 'error': 'No bridge worker is ready'}, {'Retry-After': '5'})
+                return
+
+        worker.acquire()
+        try:
+            self._forward(pool, worker, body)
+        finally:
+            worker.release()
+
+    def _forward(self, pool, worker, body):
+        headers = {key: value for key, value in self.headers.items() if key.lower() not in HOP_BY_HOP_HEADERS}
+        headers['X-Forwarded-For'] = self.client_address[0]
+        if body:
+            headers['Content-Length'] = str(len(body))
+
+        try:
+            connection = http.client.HTTPConnection(pool.host, worker.port)
+            connection.request(self.command, self.path, body=body or None, headers=headers)
+            if not self._wait_for_upstream(connection):
+                # Closing our side is what lets the worker notice and cancel the job
+                connection.close()
+                self.close_connection = True
+                return
+            response = connection.getresponse()
+        except OSError as e:
+            worker.ready = False
+            self._send_json(502, {'success': False, 'error': f'Worker {worker.index} unavailable: {e}'})
+            return
+
+        # Every response that created a job names it, whatever its body format
+        # (e.g. a draft answered synchronously whose refined result comes later)
+        job_id = response.getheader('X-Dream-Job-Id')
+        if job_id:
+            pool.remember_job(job_id, worker)
+
+        try:
+            self._send_upstream(response)
+        finally:
+            connection.close()
+
+    def _wait_for_upstream(self, connection):
+        """Block until the worker starts answering; returns False if the client hung up first"""
+        watched = [connection.sock, self.connection]
+        while True:
+            readable, _, _ = select.select(watched, [], [])
+            if connection.sock in readable:
+                return True
+            try:
+                # Readable with nothing to read means the client closed; pipelined data means it is still there
+                if self.connection.recv(1, socket.MSG_PEEK) == b'':
+                    return False
+            except OSError:
+                return False
+            watched = [connection.sock]
+
+    def _send_upstream(self, response):
+        """Relay status, headers and body; bodies without a length (SSE) are streamed"""
+        self.send_response(response.status)
+        for key, value in response.getheaders():
+            if key.lower() not in HOP_BY_HOP_HEADERS:
+                self.send_header(key, value)
+
+        if response.getheader('Content-Length') is None:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+            self.end_headers()
+            while True:
+                chunk = response.read1(65536)
+                if not chunk:
+                    return
+                self.wfile.write(chunk)
+                self.wfile.flush()
+
+        payload = response.read()
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def serve(pool, host, port):
+    """Create the front proxy server for pool (call serve_forever on the result)"""
+    server = ThreadingHTTPServer((host, port), ProxyHandler)
+    server.daemon_threads = True
+    server.pool = pool
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a pool of Dream Textures bridge workers behind one endpoint')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555, help='front endpoint port')
+    parser.add_argument('--base-port', type=int, default=5601, help='first worker port')
+    parser.add_argument('--blender', default=os.environ.get('BLENDER_PATH', 'blender'))
+    parser.add_argument('--stub', action='store_true', help='run workers against stubs/bpy.py instead of Blender')
+    parser.add_argument('--health-interval', type=float, default=2.0)
+    parser.add_argument('--startup-grace', type=float, default=300.0)
+    args = parser.parse_args()
+
+    if args.stub:
+        command, env = stub_command(), stub_environment()
+    else:
+        command, env = blender_command(args.blender), dict(os.environ)
+
+    pool = BridgePool(
+        args.workers, args.base_port, command, env,
+        host=args.host,
+        health_interval=args.health_interval,
+        startup_grace=args.startup_grace
+    )
+    pool.start()
+    server = serve(pool, args.host, args.port)
+
+    print("=" * 60)
+    print(f"Dream Textures bridge pool: {args.workers} {'stub ' if args.stub else ''}workers")
+    print(f"Front endpoint on http://{args.host}:{args.port}")
+    print("=" * 60)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down")
+    finally:
+        server.server_close()
+        pool.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Admission control and fair scheduling for the Dream Textures bridge job queue
+
+Jobs are grouped by priority class and, within a class, by client. Workers
+take from the highest class that has work, going round-robin across its
+clients with each client getting `weight` consecutive turns. A bounded
+total depth and a per-client cap turn overload into QueueFull (HTTP 429).
+"""
+
+import collections
+import threading
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+# Highest priority first
+PRIORITY_CLASSES = (INTERACTIVE, BULK)
+
+
+class QueueFull(Exception):
+    """The queue (or the client's share of it) is full"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class FairQueue:
+    """
+    Bounded multi-client priority queue
+
+    maxsize bounds the total number of queued items and per_client bounds how
+    many one client may have queued (0 disables either limit). weights maps
+    client ids to their round-robin weight (default 1). After
+    max_priority_burst consecutive higher-class picks while a lower class is
+    waiting, one lower-class item is served so bulk work is never starved.
+    """
+
+    def __init__(self, maxsize=0, per_client=0, weights=None, max_priority_burst=4):
+        self.maxsize = maxsize
+        self.per_client = per_client
+        self.weights = dict(weights or {})
+        self.max_priority_burst = max_priority_burst
+        self._classes = {priority: collections.OrderedDict() for priority in PRIORITY_CLASSES}
+        self._credits = {}
+        self._per_client_counts = collections.Counter()
+        self._size = 0
+        self._burst = 0
+        self._not_empty = threading.Condition()
+
+    def qsize(self):
+        with self._not_empty:
+            return self._size
+
+    def depth_by_class(self):
+        with self._not_empty:
+            return {
+                priority: sum(len(items) for items in clients.values())
+                for priority, clients in self._classes.items()
+            }
+
+    def put(self, item, client, priority, retry_after=1, limit=True):
+        """Queue item; limit=False admits it past maxsize and per_client (for work that was already accepted)"""
+        if priority not in self._classes:
+            raise ValueError(f"Unknown priority '{priority}' (expected one of: {', '.join(PRIORITY_CLASSES)})")
+
+        with self._not_empty:
+            if limit and self.maxsize and self._size >= self.maxsize:
+                raise QueueFull(f'Queue is full ({self._size} jobs waiting)', retry_after)
+            if limit and self.per_client and self._per_client_counts[client] >= self.per_client:
+                raise QueueFull(f'Client has {self._per_client_counts[client]} jobs waiting (limit {self.per_client})', retry_after)
+
+            clients = self._classes[priority]
+            if client not in clients:
+                clients[client] = collections.deque()
+                self._credits[(priority, client)] = self.weights.get(client, 1)
+            clients[client].append(item)
+            self._per_client_counts[client] += 1
+            self._size += 1
+            self._not_empty.notify()
+
+    def get(self):
+        with self._not_empty:
+            while self._size == 0:
+                self._not_empty.wait()
+
+            waiting = [priority for priority in PRIORITY_CLASSES if self._classes[priority]]
+            priority = waiting[0]
+            if len(waiting) > 1 and self._burst >= self.max_priority_burst:
+                priority = waiting[1]
+                self._burst = 0
+            elif len(waiting) > 1:
+                self._burst += 1
+            else:
+                self._burst = 0
+
+            return self._pop(priority)
+
+    def remove(self, item):
+        """Take a waiting item out of the queue; returns False if it is not queued"""
+        with self._not_empty:
+            for priority, clients in self._classes.items():
+                for client, items in clients.items():
+                    if item in items:
+                        items.remove(item)
+                        self._per_client_counts[client] -= 1
+                        self._size -= 1
+                        if not items:
+                            del clients[client]
+                            del self._credits[(priority, client)]
+                        return True
+            return False
+
+    def _pop(self, priority):
+        """Serve the client at the head of the rotation; caller holds the lock"""
+        clients = self._classes[priority]
+        client, items = next(iter(clients.items()))
+        item = items.popleft()
+        self._per_client_counts[client] -= 1
+        self._size -= 1
+
+        key = (priority, client)
+        self._credits[key] -= 1
+        if not items:
+            del clients[client]
+            del self._credits[key]
+        elif self._credits[key] <= 0:
+            # Turn used up: go to the back of the rotation with fresh credit
+            clients.move_to_end(client)
+            self._credits[key] = self.weights.get(client, 1)
+
+        return item
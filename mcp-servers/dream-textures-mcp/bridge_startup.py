@@ -0,0 +1,158 @@
+"""
+Staged startup for the Dream Textures bridge
+
+The bridge binds its port before importing Flask, NumPy and the bridge
+modules and before enabling the addon. Until Flask takes the socket over, a
+stdlib responder answers liveness at once and everything else with 503 and
+Retry-After, so orchestrators never see connection refused while Blender
+and the addon come up. Each startup phase is timed and logged as it ends.
+Stdlib only and cheap to import: it runs before anything else.
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds clients are told to wait before retrying while the bridge starts
+RETRY_AFTER = 5
+
+
+def parse_args():
+    """Options after '--' when run by Blender, or all arguments under plain Python"""
+    import argparse
+
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:]
+    parser = argparse.ArgumentParser(prog='blender_bridge.py')
+    parser.add_argument('--host', default=os.environ.get('DREAM_BRIDGE_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('DREAM_BRIDGE_PORT', '5555')))
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+
+def bind_listener(host, port, backlog=128):
+    """A listening TCP socket; connections queue in the backlog until someone accepts them"""
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    return socket.create_server((host, port), family=family, backlog=backlog)
+
+
+class StartupPhases:
+    """
+    Sequential startup phases with their durations in seconds
+    enter() ends the current phase, logging how long it took, and starts the next
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.phases = {}
+        self.current = None
+        self._phase_started = None
+        self._lock = threading.Lock()
+
+    def enter(self, name):
+        with self._lock:
+            self._end()
+            self.current = name
+            self._phase_started = time.monotonic()
+
+    def finish(self):
+        """End the last phase; returns seconds since startup began"""
+        with self._lock:
+            self._end()
+            self.current = None
+            return self.elapsed()
+
+    def elapsed(self):
+        return round(time.monotonic() - self.started_at, 3)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'phase': self.current,
+                'phases': dict(self.phases),
+                'elapsed_seconds': self.elapsed()
+            }
+
+    def _end(self):
+        """Record the current phase; caller holds the lock"""
+        if self.current is None:
+            return
+        seconds = round(time.monotonic() - self._phase_started, 3)
+        self.phases[self.current] = seconds
+        print(f"✓ Startup phase '{self.current}' took {seconds}s ({self.elapsed()}s since start)")
+
+
+class EarlyServer:
+    """
+    Answers on the bound socket until the real server takes it over
+
+    /health/live is 200 and /health is 200 with "ready": false, as the bridge
+    reports them while starting; /health/ready and every other path get 503
+    with Retry-After. stop() leaves the socket open for the next server.
+    """
+
+    def __init__(self, listener, phases):
+        handler = type('EarlyHandler', (EarlyHandler,), {'phases': phases})
+        self._server = ThreadingHTTPServer(listener.getsockname()[:2], handler, bind_and_activate=False)
+        self._server.socket.close()
+        self._server.socket = listener
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='early-http', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop accepting; requests being answered finish on their own threads"""
+        self._server.shutdown()
+        self._thread.join()
+
+
+class EarlyHandler(BaseHTTPRequestHandler):
+    phases = None
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        self._respond()
+
+    def do_DELETE(self):
+        self._respond()
+
+    def do_OPTIONS(self):
+        self._respond()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self):
+        # Read the body so the client is not reset mid-upload
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+
+        startup = self.phases.to_dict()
+        path = self.path.split('?', 1)[0]
+        if path == '/health/live':
+            self._send(200, {'live': True, 'startup': startup})
+        elif path in ('/health', '/health/ready'):
+            body = {'status': 'starting', 'live': True, 'ready': False, 'startup': startup}
+            self._send(200 if path == '/health' else 503, body)
+        else:
+            self._send(503, {'success': False, 'error': 'Bridge is still starting up'})
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        if status == 503:
+            self.send_header('Retry-After', str(RETRY_AFTER))
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(payload)
@@ -0,0 +1,273 @@
+"""
+Persistent job store for the Dream Textures bridge
+
+Jobs are recorded in SQLite as they are submitted, start and finish, so a
+crashed or restarted bridge can re-queue pending work and still serve
+finished results. Result images are written once per content hash under a
+sharded directory and referenced from the job rows; results are JSON with
+each image replaced by {"$file": digest, "format": format}.
+
+Finished jobs expire after ttl seconds, and the oldest go first while the
+image files exceed max_bytes. Stdlib only, so it runs inside Blender's
+bundled Python.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Seconds between expiry sweeps triggered by finished jobs
+EXPIRE_INTERVAL = 60
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    client TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    state TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    cancel_reason TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at);
+CREATE TABLE IF NOT EXISTS files (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (job_id, digest)
+);
+CREATE INDEX IF NOT EXISTS job_files_digest ON job_files (digest);
+'''
+
+
+class JobStore:
+    """
+    SQLite rows for jobs plus content-addressed result files
+
+    directory holds jobs.sqlite3 and the files/ tree. A ttl or max_bytes of 0
+    disables that limit.
+    """
+
+    def __init__(self, directory, ttl=86400, max_bytes=0):
+        self.directory = directory
+        self.files_directory = os.path.join(directory, 'files')
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # Held across file writes and the row updates that reference them, so
+        # expiry never removes a file a job is about to point at
+        self._lock = threading.RLock()
+        self._last_expiry = 0.0
+
+        os.makedirs(self.files_directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, 'jobs.sqlite3'), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute('PRAGMA foreign_keys=ON')
+            self._db.executescript(SCHEMA)
+        self._remove_stray_files()
+
+    def save(self, job):
+        """Insert or update a job's row; a finished job's result images are written first"""
+        with self._lock:
+            result = None
+            files = []
+            if job.result is not None:
+                result, files = self._externalize(job.result)
+
+            with self._db:
+                self._db.execute(
+                    '''
+                    INSERT INTO jobs (id, kind, params, client, priority, state, result, error, cancel_reason,
+                                      attempts, created_at, started_at, finished_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (id) DO UPDATE SET
+                        state = excluded.state, result = excluded.result, error = excluded.error,
+                        cancel_reason = excluded.cancel_reason, attempts = excluded.attempts,
+                        started_at = excluded.started_at, finished_at = excluded.finished_at
+                    ''',
+                    (
+                        job.id, job.kind, json.dumps(job.params), job.client, job.priority, job.state,
+                        json.dumps(result) if result is not None else None, job.error, job.cancel_reason,
+                        job.attempts, job.created_at, job.started_at, job.finished_at
+                    )
+                )
+                self._db.executemany('INSERT OR IGNORE INTO files (digest, size) VALUES (?, ?)', files)
+                self._db.executemany(
+                    'INSERT OR IGNORE INTO job_files (job_id, digest) VALUES (?, ?)',
+                    [(job.id, digest) for digest, _ in files]
+                )
+
+            if job.finished_at is not None and time.monotonic() - self._last_expiry >= EXPIRE_INTERVAL:
+                self.expire()
+
+    def delete(self, job_id):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+    def pending(self):
+        """Records of jobs that were queued or running, oldest first"""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT * FROM jobs WHERE finished_at IS NULL ORDER BY created_at'
+            ).fetchall()
+        return [self._record(row) for row in rows]
+
+    def load(self, job_id):
+        """The record of a job with its result images read back, or None"""
+        with self._lock:
+            row = self._db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return None
+
+            record = self._record(row)
+            if record['result'] is not None:
+                try:
+                    record['result'] = self._internalize(record['result'])
+                except OSError:
+                    # A file went missing outside the store; treat the job as expired
+                    return None
+            return record
+
+    @staticmethod
+    def _record(row):
+        """A row as a dict with params and result decoded"""
+        record = dict(row)
+        record['params'] = json.loads(record['params'])
+        if record['result'] is not None:
+            record['result'] = json.loads(record['result'])
+        return record
+
+    def expire(self, now=None):
+        """Delete jobs past the TTL, then the oldest finished ones while files exceed max_bytes"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._last_expiry = time.monotonic()
+            with self._db:
+                self._expire_rows(now)
+                orphans = [
+                    row['digest'] for row in self._db.execute(
+                        'SELECT digest FROM files WHERE digest NOT IN (SELECT digest FROM job_files)'
+                    )
+                ]
+                self._db.executemany('DELETE FROM files WHERE digest = ?', [(digest,) for digest in orphans])
+
+            for digest in orphans:
+                self._remove_file(self._path(digest))
+        return len(orphans)
+
+    def _expire_rows(self, now):
+        """Delete expired job rows; their job_files go with them"""
+        if self.ttl:
+            self._db.execute('DELETE FROM jobs WHERE finished_at < ?', (now - self.ttl,))
+
+        if self.max_bytes:
+            total = self._db.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM files WHERE digest IN (SELECT digest FROM job_files)'
+            ).fetchone()[0]
+            oldest = self._db.execute(
+                'SELECT id FROM jobs WHERE finished_at IS NOT NULL ORDER BY finished_at'
+            ).fetchall()
+            for row in oldest:
+                if total <= self.max_bytes:
+                    break
+                freed = self._db.execute(
+                    '''
+                    SELECT COALESCE(SUM(size), 0) FROM files WHERE digest IN (
+                        SELECT digest FROM job_files WHERE job_id = ?
+                        EXCEPT SELECT digest FROM job_files WHERE job_id != ?
+                    )
+                    ''',
+                    (row['id'], row['id'])
+                ).fetchone()[0]
+                self._db.execute('DELETE FROM jobs WHERE id = ?', (row['id'],))
+                total -= freed
+
+    def stats(self):
+        with self._lock:
+            jobs = self._db.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+            files, size = self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files').fetchone()
+        return {
+            'jobs': jobs,
+            'files': files,
+            'bytes': size,
+            'limit_bytes': self.max_bytes,
+            'ttl': self.ttl
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _externalize(self, value):
+        """Write every bytes value in value to a file; returns (JSON-safe value, [(digest, size)])"""
+        if isinstance(value, bytes):
+            digest = hashlib.sha256(value).hexdigest()
+            self._write_file(digest, value)
+            return {'$file': digest, 'format': getattr(value, 'format', None)}, [(digest, len(value))]
+        if isinstance(value, dict):
+            items = [(key, self._externalize(item)) for key, item in value.items()]
+            return {key: item for key, (item, _) in items}, [file for _, (_, files) in items for file in files]
+        if isinstance(value, list):
+            items = [self._externalize(item) for item in value]
+            return [item for item, _ in items], [file for _, files in items for file in files]
+        return value, []
+
+    def _internalize(self, value):
+        """Inverse of _externalize; images come back as EncodedImage"""
+        if isinstance(value, dict) and '$file' in value:
+            from bridge_encode import EncodedImage
+
+            with open(self._path(value['$file']), 'rb') as f:
+                return EncodedImage(f.read(), value['format'] or 'png')
+        if isinstance(value, dict):
+            return {key: self._internalize(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._internalize(item) for item in value]
+        return value
+
+    def _path(self, digest):
+        return os.path.join(self.files_directory, digest[:2], digest)
+
+    def _write_file(self, digest, data):
+        """Write a file once per content hash, atomically"""
+        path = self._path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _remove_stray_files(self):
+        """Delete temp files and files no row knows about, left by a crash mid-write"""
+        with self._lock:
+            known = {row[0] for row in self._db.execute('SELECT digest FROM files')}
+        for shard in os.listdir(self.files_directory):
+            shard_path = os.path.join(self.files_directory, shard)
+            if not os.path.isdir(shard_path):
+                continue
+            for name in os.listdir(shard_path):
+                if name not in known:
+                    self._remove_file(os.path.join(shard_path, name))
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,151 @@
+"""
+Response encodings for the Dream Textures bridge
+
+Results hold images as raw bytes (EncodedImage, tagged with their format).
+They are rendered as JSON with base64 strings by default, or, when the client
+asks for it in the Accept header, as the raw image (single image) or
+multipart/mixed (several images).
+"""
+
+import base64
+import json
+import select
+import socket
+import uuid
+from urllib.parse import quote
+
+from flask import Response, jsonify, request
+
+from bridge_encode import FORMATS
+from bridge_metrics import stage_seconds
+
+IMAGE_MIMETYPE = 'image/png'
+MULTIPART_MIMETYPE = 'multipart/mixed'
+
+# Any of these in Accept asks for the bare image; its format was chosen by the request
+BINARY_MIMETYPES = sorted({mimetype for mimetype, _ in FORMATS.values()})
+
+
+def accepts(mimetype):
+    """True when the client explicitly asked for mimetype over JSON"""
+    if mimetype not in [value for value, _ in request.accept_mimetypes]:
+        return False
+    return request.accept_mimetypes.best_match(['application/json', mimetype]) == mimetype
+
+
+def accepts_binary():
+    """True when the client explicitly asked for a bare image of any supported type"""
+    return any(accepts(mimetype) for mimetype in BINARY_MIMETYPES)
+
+
+def client_disconnected():
+    """
+    True when the client of the current request has closed its connection
+    Only the Werkzeug server exposes the socket; elsewhere this is always False
+    """
+    connection = request.environ.get('werkzeug.socket')
+    if connection is None:
+        return False
+    try:
+        readable, _, _ = select.select([connection], [], [], 0)
+        # Readable with nothing to read means the peer closed; pipelined data means it is still there
+        return bool(readable) and connection.recv(1, socket.MSG_PEEK) == b''
+    except (OSError, ValueError):
+        return True
+
+
+def part_type(data):
+    """(mimetype, extension) of an image part; untagged bytes are PNG"""
+    return getattr(data, 'mimetype', IMAGE_MIMETYPE), getattr(data, 'extension', 'png')
+
+
+def json_safe(value):
+    """Replace bytes anywhere in value with base64 strings"""
+    if isinstance(value, bytes):
+        with stage_seconds.time(stage='base64_encode'):
+            return base64.b64encode(value).decode('utf-8')
+    if isinstance(value, dict):
+        return {key: json_safe(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [json_safe(item) for item in value]
+    return value
+
+
+def split_parts(value, path=()):
+    """
+    Separate bytes from the rest of value
+    Returns (metadata, parts) where each bytes value is replaced in metadata by
+    the name of its part, built from its path (e.g. "maps.albedo")
+    """
+    if isinstance(value, bytes):
+        name = '.'.join(str(key) for key in path)
+        return name, [(name, value)]
+
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = enumerate(value)
+    else:
+        return value, []
+
+    metadata = {} if isinstance(value, dict) else []
+    parts = []
+    for key, item in items:
+        item_metadata, item_parts = split_parts(item, path + (key,))
+        if isinstance(metadata, dict):
+            metadata[key] = item_metadata
+        else:
+            metadata.append(item_metadata)
+        parts.extend(item_parts)
+    return metadata, parts
+
+
+def encode_multipart(metadata, parts):
+    """Build a multipart/mixed body: a JSON metadata part, then one part per image"""
+    boundary = uuid.uuid4().hex
+    chunks = [
+        f'--{boundary}\r\n'
+        'Content-Type: application/json\r\n'
+        'Content-Disposition: inline; name="metadata"\r\n\r\n'.encode('utf-8'),
+        json.dumps(metadata).encode('utf-8'),
+        b'\r\n'
+    ]
+    for name, data in parts:
+        mimetype, extension = part_type(data)
+        chunks.append(
+            f'--{boundary}\r\n'
+            f'Content-Type: {mimetype}\r\n'
+            f'Content-Disposition: attachment; name="{name}"; filename="{name}.{extension}"\r\n'
+            f'Content-Length: {len(data)}\r\n\r\n'.encode('utf-8')
+        )
+        chunks.append(data)
+        chunks.append(b'\r\n')
+    chunks.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b''.join(chunks), boundary
+
+
+def render_result(result):
+    """Render a successful result in the representation the client accepts"""
+    metadata, parts = split_parts(result)
+
+    if accepts_binary():
+        if len(parts) != 1:
+            return jsonify({
+                'success': False,
+                'error': f'Result has {len(parts)} images; request {MULTIPART_MIMETYPE} instead'
+            }), 406
+
+        response = Response(parts[0][1], mimetype=part_type(parts[0][1])[0])
+        for key, value in metadata.items():
+            if value != parts[0][0] and not isinstance(value, (dict, list)) and value is not None:
+                response.headers[f"X-Dream-{key.replace('_', '-')}"] = quote(str(value))
+        return response
+
+    if accepts(MULTIPART_MIMETYPE):
+        body, boundary = encode_multipart({'success': True, **metadata}, parts)
+        return Response(body, content_type=f'{MULTIPART_MIMETYPE}; boundary={boundary}')
+
+    return jsonify({
+        'success': True,
+        **json_safe(result)
+    })
@@ -19,5 +19,13 @@ echo "Press Ctrl+C to stop"
 echo "=================================="
 echo ""
 
-# Start Blender in background mode
-"$BLENDER_PATH" --background --python "$BRIDGE_SCRIPT"
+# Start Blender in background mode; exit code 75 means the bridge drained
+# itself at its memory soft limit and wants a fresh process
+while true; do
+    "$BLENDER_PATH" --background --python "$BRIDGE_SCRIPT"
+    status=$?
+    if [ "$status" -ne 75 ]; then
+        exit "$status"
+    fi
+    echo "Bridge recycled; restarting"
+done
@@ -0,0 +1,202 @@
+"""
+Stub of the parts of bpy the bridge uses, with a fake Dream Textures backend
+Put the stubs directory on PYTHONPATH to run blender_bridge.py without Blender
+
+The fake backend sleeps for FAKE_DREAM_DELAY seconds per generate call (spread
+over the requested steps, and shared by every image in a batch) and returns
+synthetic PIL images: solid colours by default, or seeded noise with
+FAKE_DREAM_PATTERN=noise so encoding costs what it would for a real texture.
+"""
+
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+
+class GenerationResult:
+    def __init__(self, image, seed, progress, total):
+        self.image = image
+        self.seed = seed
+        self.progress = progress
+        self.total = total
+
+
+class FakeBackend:
+    """Generates solid-colour images on a background thread, like the real backend"""
+
+    def __init__(self, delay=None, pattern=None):
+        self.delay = float(os.environ.get('FAKE_DREAM_DELAY', '0.05')) if delay is None else delay
+        self.pattern = os.environ.get('FAKE_DREAM_PATTERN', 'solid') if pattern is None else pattern
+        self.error = None
+        self.calls = []
+
+    def make_image(self, size, seed):
+        if self.pattern == 'noise':
+            width, height = size
+            pixels = np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+            return Image.fromarray(pixels, 'RGB')
+        return Image.new('RGB', size, (seed * 37 % 256, seed * 67 % 256, seed * 97 % 256))
+
+    def generate(self, arguments, step_callback, callback):
+        self.calls.append(arguments)
+        thread = threading.Thread(
+            target=self._run,
+            args=(arguments, step_callback, callback),
+            daemon=True
+        )
+        thread.start()
+
+    def _run(self, arguments, step_callback, callback):
+        steps = max(1, int(getattr(arguments, 'steps', 1) or 1))
+        seed = getattr(arguments, 'seed', 0)
+        size = tuple(getattr(arguments, 'size', None) or (64, 64))
+        batch_size = max(1, int(getattr(arguments, 'batch_size', 1) or 1))
+
+        for step in range(steps):
+            time.sleep(self.delay / steps)
+            preview = Image.new('RGB', size, (seed * 37 % 256, seed * 67 % 256, seed * 97 % 256))
+            if step_callback([GenerationResult(preview, seed, step + 1, steps)]) is False:
+                callback(InterruptedError('Generation cancelled'))
+                return
+
+        if self.error is not None:
+            callback(self.error)
+            return
+
+        callback([
+            GenerationResult(self.make_image(size, seed + index), seed + index, steps, steps)
+            for index in range(batch_size)
+        ])
+
+
+class DreamPrompt(SimpleNamespace):
+    """Scene-level prompt settings; generate_args snapshots them like the addon does"""
+
+    def __init__(self):
+        super().__init__(
+            prompt_structure='custom',
+            prompt_structure_token_subject='',
+            width=512,
+            height=512,
+            steps=20,
+            seed=0,
+            random_seed=True
+        )
+
+    def generate_args(self, context):
+        seed = int(time.time_ns() % 2**31) if self.random_seed else self.seed
+        return SimpleNamespace(
+            prompt=self.prompt_structure_token_subject,
+            size=(self.width, self.height),
+            steps=self.steps,
+            seed=seed,
+            batch_size=1,
+            model=None
+        )
+
+
+class Pixels:
+    """Flat float RGBA buffer with the bulk accessors of bpy_prop_array"""
+
+    def __init__(self, count):
+        self._values = np.zeros(count, dtype=np.float32)
+
+    def __len__(self):
+        return len(self._values)
+
+    def foreach_set(self, values):
+        self._values[:] = np.asarray(values, dtype=np.float32)
+
+    def foreach_get(self, buffer):
+        buffer[:] = self._values
+
+
+class BlenderImage:
+    def __init__(self, name, width, height):
+        self.name = name
+        self.size = (width, height)
+        self.pixels = Pixels(width * height * 4)
+
+
+class Images(dict):
+    """bpy.data.images: new/get/remove keyed by name"""
+
+    def new(self, name, width, height, alpha=False, float_buffer=False):
+        image = BlenderImage(name, width, height)
+        self[name] = image
+        return image
+
+    def remove(self, image):
+        del self[image.name]
+
+
+class Operator:
+    """
+    Stands in for a bpy.ops operator: keyword arguments only, and like the real
+    thing it raises TypeError for a keyword that is not one of its properties
+    Tests wrap `function` to observe calls without losing that check
+    """
+
+    def __init__(self, function, *properties):
+        self.function = function
+        self.properties = properties
+
+    def __call__(self, **kwargs):
+        unknown = sorted(set(kwargs) - set(self.properties))
+        if unknown:
+            raise TypeError(f"Converting py args to operator properties: keyword \"{unknown[0]}\" unrecognized")
+        return self.function(**kwargs)
+
+    def get_rna_type(self):
+        return SimpleNamespace(properties={name: SimpleNamespace(identifier=name) for name in self.properties})
+
+
+def refine_texture(image, prompt, strength, steps, width, height):
+    """Fake img2img: writes the inverted input to DreamTextures_Refined"""
+    if 'fail' in prompt:
+        raise RuntimeError('Refinement failed')
+
+    refined = data.images.new('DreamTextures_Refined', *image.size)
+    pixels = np.empty(len(image.pixels), dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    pixels = pixels.reshape(-1, 4)
+    pixels[:, :3] = 1.0 - pixels[:, :3]
+    refined.pixels.foreach_set(pixels.ravel())
+    return {'FINISHED'}
+
+
+backend = FakeBackend()
+
+installed_models = [
+    SimpleNamespace(model='/models/texture-diffusion', model_base='dream-textures/texture-diffusion'),
+    SimpleNamespace(model='/models/stable-diffusion-2-1-base', model_base='stabilityai/stable-diffusion-2-1-base')
+]
+
+context = SimpleNamespace(
+    scene=SimpleNamespace(
+        dream_textures_prompt=DreamPrompt(),
+        dream_textures_engine_prompt=SimpleNamespace(get_backend=lambda: backend)
+    ),
+    preferences=SimpleNamespace(
+        addons={
+            'dream_textures': SimpleNamespace(
+                preferences=SimpleNamespace(installed_models=installed_models)
+            )
+        }
+    )
+)
+
+ops = SimpleNamespace(
+    preferences=SimpleNamespace(addon_enable=lambda module: {'FINISHED'}),
+    dream_textures=SimpleNamespace(
+        refine_texture=Operator(refine_texture, 'image', 'prompt', 'strength', 'steps', 'width', 'height')
+    )
+)
+
+app = SimpleNamespace(version_string='stub')
+
+data = SimpleNamespace(images=Images())
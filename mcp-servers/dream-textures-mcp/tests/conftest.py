@@ -0,0 +1,54 @@
+"""
+Run the bridge against the stub bpy module in ../stubs
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'stubs'))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('DREAM_BRIDGE_CACHE_DIR', tempfile.mkdtemp(prefix='dream-cache-'))
+os.environ.setdefault('DREAM_BRIDGE_STORE_DIR', tempfile.mkdtemp(prefix='dream-store-'))
+
+
+@pytest.fixture
+def bridge():
+    import blender_bridge
+
+    # Stand-in for Blender's main thread, which runs the dispatcher in __main__
+    if not blender_bridge.dispatcher.running:
+        thread = threading.Thread(target=blender_bridge.dispatcher.run_forever, name='blender-main', daemon=True)
+        thread.start()
+        while not blender_bridge.dispatcher.running:
+            pass
+
+    if not blender_bridge.runtime.ready.is_set():
+        blender_bridge.initialize(warmup=False)
+    return blender_bridge
+
+
+@pytest.fixture
+def backend():
+    import bpy
+    saved = (bpy.backend.delay, bpy.backend.error)
+    bpy.backend.calls.clear()
+    yield bpy.backend
+    bpy.backend.delay, bpy.backend.error = saved
+
+
+@pytest.fixture
+def cache(bridge):
+    bridge.cache.purge()
+    yield bridge.cache
+    bridge.cache.purge()
+
+
+@pytest.fixture
+def client(bridge):
+    return bridge.app.test_client()
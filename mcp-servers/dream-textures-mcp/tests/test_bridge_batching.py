@@ -0,0 +1,35 @@
+"""
+Batched backend submission for PBR sets and variations
+"""
+
+
+def test_pbr_set_is_one_batched_call(client, backend, bridge, monkeypatch):
+    monkeypatch.setattr(bridge, 'MAX_BATCH_SIZE', 4)
+    maps = ['albedo', 'normal', 'roughness', 'metallic', 'ao']
+
+    response = client.post('/generate-pbr-set', json={'prompt': 'marble', 'maps': maps, 'steps': 2, 'resolution': 64})
+
+    assert all(response.json['maps'][map_type] for map_type in maps)
+    assert [call.batch_size for call in backend.calls] == [4, 1]
+
+
+def test_sequential_fallback_without_batch_support(client, backend, bridge, monkeypatch):
+    monkeypatch.setattr(bridge.runtime, 'batching', False)
+
+    response = client.post('/generate-pbr-set', json={'prompt': 'marble', 'maps': ['albedo', 'ao'], 'steps': 1, 'resolution': 64})
+
+    assert all(response.json['maps'].values())
+    assert len(backend.calls) == 2
+
+
+def test_variations_return_distinct_seeds_from_one_batch(client, backend):
+    response = client.post('/generate-variations', json={'prompt': 'terrazzo', 'count': 3, 'seed': 100, 'steps': 1, 'resolution': 64})
+
+    assert response.status_code == 200
+    assert [variation['seed'] for variation in response.json['variations']] == [100, 101, 102]
+    assert len(backend.calls) == 1
+
+
+def test_variation_count_is_bounded(client):
+    assert client.post('/generate-variations', json={'prompt': 'x', 'count': 0}).status_code == 400
+    assert client.post('/generate-variations', json={'prompt': 'x', 'count': 1000}).status_code == 400
@@ -0,0 +1,64 @@
+"""
+Benchmark harness: statistics and a short run against a stub bridge
+"""
+
+import json
+
+import pytest
+
+from bridge_bench import Sample, build_plan, main, percentile, start_stub_bridge, summarize
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 0.50) == 50
+    assert percentile(values, 0.95) == 95
+    assert percentile(values, 0.99) == 99
+    assert percentile([7], 0.99) == 7
+    assert percentile([], 0.5) is None
+
+
+def test_summary_counts_errors_and_throughput():
+    samples = [Sample('texture@64', 200, 0.1, 10), Sample('texture@64', 200, 0.3, 10), Sample('texture@64', 429, 0.0)]
+    summary = summarize(samples, elapsed=2.0)
+
+    assert summary['succeeded'] == 2
+    assert summary['errors'] == 1
+    assert summary['status_counts'] == {'200': 2, '429': 1}
+    assert summary['throughput_rps'] == 1.0
+    assert summary['latency_ms']['p50'] == 100.0
+    assert summary['latency_ms']['max'] == 300.0
+
+
+def test_plan_only_varies_map_count_where_it_matters():
+    plan = build_plan(['texture', 'pbr-set'], [64, 128], [1, 3])
+    assert plan == [
+        ('texture', 64, 1), ('texture', 128, 1),
+        ('pbr-set', 64, 1), ('pbr-set', 64, 3), ('pbr-set', 128, 1), ('pbr-set', 128, 3)
+    ]
+
+
+@pytest.mark.parametrize('accept', ['json', 'png'])
+def test_run_against_stub_bridge(tmp_path, accept):
+    output = tmp_path / 'bench.json'
+    code = main([
+        '--requests', '10', '--concurrency', '2', '--resolutions', '32', '--map-counts', '2',
+        '--steps', '2', '--delay', '0.01', '--accept', accept, '--output', str(output)
+    ])
+
+    result = json.loads(output.read_text())
+    assert code == 0
+    assert result['overall']['succeeded'] == 10
+    assert set(result['scenarios']) == {'texture@32', 'pbr-set@32x2', 'variations@32x2', 'job@32', 'refine@32'}
+    assert result['overall']['latency_ms']['p99'] >= result['overall']['latency_ms']['p50']
+
+
+def test_stub_bridge_keeps_its_store_out_of_the_users(tmp_path, monkeypatch):
+    user_store = tmp_path / 'user-store'
+    monkeypatch.setenv('DREAM_BRIDGE_STORE_DIR', str(user_store))
+
+    process, url = start_stub_bridge(0.01)
+    process.terminate()
+    process.wait(10)
+
+    assert not user_store.exists()
@@ -0,0 +1,138 @@
+"""
+Result cache tiers and the fixed-seed fast path
+"""
+
+import os
+import threading
+import time
+
+from bridge_cache import ResultCache
+
+
+def test_memory_tier_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path), memory_bytes=10, disk_bytes=0)
+    cache.put('a', b'aaaa')
+    cache.put('b', b'bbbb')
+    cache.get('a')
+    cache.put('c', b'cccc')
+
+    assert cache.get('a') == b'aaaa'
+    assert cache.get('b') is None
+    assert cache.stats()['memory_bytes'] == 8
+
+
+def test_disk_tier_evicts_by_size_and_survives_restart(tmp_path):
+    cache = ResultCache(str(tmp_path), memory_bytes=0, disk_bytes=10)
+    cache.put('a' * 64, b'1111')
+    cache.put('b' * 64, b'2222')
+    cache.put('c' * 64, b'3333')
+
+    reopened = ResultCache(str(tmp_path), memory_bytes=0, disk_bytes=10)
+
+    assert reopened.get('a' * 64) is None
+    assert reopened.get('c' * 64) == b'3333'
+    assert reopened.stats()['disk_bytes'] == 8
+
+
+def test_concurrent_writers_never_share_a_temp_file(tmp_path):
+    cache = ResultCache(str(tmp_path), memory_bytes=0, disk_bytes=1 << 20)
+    threads = [threading.Thread(target=cache.put, args=('d' * 64, bytes([index]) * 1024)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(os.listdir(tmp_path / 'dd')) == ['d' * 64]
+    assert len(set(cache.get('d' * 64))) == 1
+
+
+def test_failed_cache_write_still_returns_the_image(client, backend, cache, monkeypatch):
+    def disk_full(key, data):
+        raise OSError(28, 'No space left on device')
+
+    monkeypatch.setattr(cache, 'disk_bytes', 1 << 20)
+    monkeypatch.setattr(cache, '_write_file', disk_full)
+    response = client.post('/generate-texture', json={'prompt': 'slate', 'seed': 3, 'steps': 1, 'resolution': 64})
+
+    assert response.status_code == 200
+    assert response.json['image']
+
+
+def test_fixed_seed_requests_are_served_from_cache(client, backend, cache):
+    body = {'prompt': 'brushed steel', 'seed': 42, 'steps': 2, 'resolution': 64}
+    before = client.get('/cache').json
+    first = client.post('/generate-texture', json=body)
+
+    started = time.monotonic()
+    second = client.post('/generate-texture', json=body)
+    elapsed = time.monotonic() - started
+
+    assert second.json['image'] == first.json['image']
+    assert len(backend.calls) == 1
+    assert elapsed < backend.delay
+    after = client.get('/cache').json
+    assert after['hits'] - before['hits'] == 1
+    assert after['misses'] - before['misses'] == 1
+
+
+def test_cache_hits_do_not_wait_behind_running_jobs(bridge, client, backend, cache):
+    body = {'prompt': 'cobblestone', 'seed': 5, 'steps': 2, 'resolution': 64}
+    client.post('/generate-texture', json=body)
+    backend.delay = 1.0
+    slow = client.post('/jobs', json={'kind': 'pbr-set', 'prompt': 'moss', 'steps': 2, 'resolution': 64}).json['job_id']
+
+    started = time.monotonic()
+    response = client.post('/generate-texture', json=body)
+    elapsed = time.monotonic() - started
+
+    assert response.status_code == 200
+    assert elapsed < 0.5
+    assert client.get(f'/jobs/{slow}').json['state'] in ('queued', 'running')
+    job = client.post('/jobs', json={'kind': 'texture', **body}).json
+    assert job['state'] == 'succeeded'
+    assert client.get(f"/jobs/{job['job_id']}/result").json['image'] == response.json['image']
+    client.delete(f'/jobs/{slow}')
+    bridge.jobs.get(slow).wait(10)
+
+
+def test_random_seed_bypasses_cache_and_purge_empties_it(client, backend, cache):
+    client.post('/generate-texture', json={'prompt': 'oak', 'steps': 1, 'resolution': 64})
+    client.post('/generate-texture', json={'prompt': 'oak', 'steps': 1, 'resolution': 64})
+    assert len(backend.calls) == 2
+
+    client.post('/generate-pbr-set', json={'prompt': 'oak', 'seed': 7, 'steps': 1, 'resolution': 64})
+    assert client.get('/cache').json['memory_entries'] == 4
+
+    assert client.delete('/cache').json['removed'] == 4
+    assert client.get('/cache').json['memory_entries'] == 0
+
+
+def test_identical_in_flight_requests_share_one_generation(bridge, backend, cache):
+    backend.delay = 0.2
+    model = bridge.get_texture_model()
+    results = []
+
+    def request():
+        results.append(bridge.generate_encoded_map('rusty metal', 'albedo', 64, 2, 9, model))
+
+    threads = [threading.Thread(target=request) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(backend.calls) == 1
+    assert len(set(results)) == 1
+    assert bridge.flights.in_flight() == 0
+
+
+def test_equivalent_requests_are_normalized(bridge):
+    params = bridge.normalize_params({'prompt': '  brushed   steel ', 'resolution': '512', 'map_type': 'Normal'})
+
+    assert params == {'prompt': 'brushed steel', 'resolution': 512, 'map_type': 'normal'}
+
+
+def test_invalid_parameters_are_rejected(client):
+    response = client.post('/jobs', json={'kind': 'texture', 'prompt': 'oak', 'steps': 'many'})
+
+    assert response.status_code == 400
@@ -0,0 +1,167 @@
+"""
+Cancellation: DELETE /jobs/<id>, client disconnects and the deadline stop the backend at its next step
+"""
+
+import time
+
+import bpy
+
+from test_bridge_metrics import sample
+
+
+def metric(client, name, **labels):
+    return sample(client.get('/metrics').get_data(as_text=True), name, **labels) or 0
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def slow_refine(monkeypatch, seconds):
+    """Make each img2img call take seconds; returns the list of calls made"""
+    calls = []
+    operator = bpy.ops.dream_textures.refine_texture
+    refine = operator.function
+
+    def slow(**kwargs):
+        calls.append(kwargs.get('prompt'))
+        time.sleep(seconds)
+        return refine(**kwargs)
+
+    monkeypatch.setattr(operator, 'function', slow)
+    return calls
+
+
+TILED = {'kind': 'texture', 'prompt': 'cobblestones', 'resolution': 256, 'steps': 2, 'tiling': 'on',
+         'tile_size': 128, 'tile_overlap': 16}
+
+
+def test_delete_aborts_a_running_generation(client, backend, bridge):
+    backend.delay = 2.0
+    aborted = metric(client, 'dream_bridge_generation_aborts_total', reason='cancelled')
+    reclaimed = metric(client, 'dream_bridge_reclaimed_gpu_seconds_total')
+
+    job_id = client.post('/jobs', json={'kind': 'texture', 'prompt': 'marble', 'steps': 20}).json['job_id']
+    job = bridge.jobs.get(job_id)
+    wait_until(lambda: job.progress > 0)
+
+    started = time.monotonic()
+    response = client.delete(f'/jobs/{job_id}')
+    assert response.status_code == 202
+    assert response.json['cancel_reason'] == 'deleted'
+
+    assert job.wait(1.0)
+    assert time.monotonic() - started < 0.5
+    assert job.state == 'cancelled'
+    assert client.get(f'/jobs/{job_id}/result').status_code == 410
+    assert client.delete(f'/jobs/{job_id}').status_code == 409
+    assert metric(client, 'dream_bridge_generation_aborts_total', reason='cancelled') == aborted + 1
+    assert metric(client, 'dream_bridge_reclaimed_gpu_seconds_total') > reclaimed + 1.0
+
+
+def test_delete_removes_a_queued_job(client, backend, bridge):
+    backend.delay = 2.0
+    running = client.post('/jobs', json={'kind': 'texture', 'prompt': 'brick', 'steps': 20}).json['job_id']
+    queued = client.post('/jobs', json={'kind': 'texture', 'prompt': 'tile', 'steps': 20}).json['job_id']
+    wait_until(lambda: bridge.jobs.get(running).state == 'running')
+
+    response = client.delete(f'/jobs/{queued}')
+    assert response.status_code == 200
+    assert response.json['state'] == 'cancelled'
+
+    client.delete(f'/jobs/{running}')
+    assert bridge.jobs.get(running).wait(1.0)
+    assert len(backend.calls) == 1
+
+
+def test_client_disconnect_cancels_a_synchronous_request(client, backend, bridge, monkeypatch):
+    backend.delay = 2.0
+    monkeypatch.setattr(bridge, 'DISCONNECT_POLL', 0.05)
+    monkeypatch.setattr(bridge, 'client_disconnected', lambda: True)
+
+    response = client.post('/generate-pbr-set', json={'prompt': 'gravel', 'steps': 20, 'maps': ['albedo', 'ao']})
+
+    assert response.status_code == 499
+    job = bridge.jobs.get(response.json['job_id'])
+    assert job.wait(1.0)
+    assert (job.state, job.cancel_reason) == ('cancelled', 'disconnected')
+
+
+def test_deadline_frees_the_backend(client, backend, bridge, monkeypatch):
+    backend.delay = 1.0
+    monkeypatch.setattr(bridge, 'GENERATION_TIMEOUT', 0.1)
+    aborted = metric(client, 'dream_bridge_generation_aborts_total', reason='deadline')
+
+    response = client.post('/generate-texture', json={'prompt': 'glacier', 'steps': 10})
+
+    assert response.json['error'] == 'Generation timed out'
+    wait_until(lambda: metric(client, 'dream_bridge_generation_aborts_total', reason='deadline') == aborted + 1)
+
+
+def test_delete_aborts_even_when_previews_fail(client, backend, bridge, monkeypatch):
+    def broken_preview(image, size):
+        raise ValueError('cannot encode preview')
+
+    backend.delay = 2.0
+    monkeypatch.setattr(bridge, 'encode_preview', broken_preview)
+
+    job_id = client.post('/jobs', json={'kind': 'texture', 'prompt': 'basalt', 'steps': 20,
+                                        'preview_every': 1}).json['job_id']
+    job = bridge.jobs.get(job_id)
+    with job.watching():
+        wait_until(lambda: job.progress > 0)
+        client.delete(f'/jobs/{job_id}')
+
+        assert job.wait(1.0)
+    assert job.state == 'cancelled'
+
+
+def test_delete_stops_a_tiled_job_between_tiles(client, backend, bridge, monkeypatch):
+    refined = slow_refine(monkeypatch, 0.2)
+
+    job_id = client.post('/jobs', json=TILED).json['job_id']
+    job = bridge.jobs.get(job_id)
+    wait_until(lambda: refined)
+    client.delete(f'/jobs/{job_id}')
+
+    assert job.wait(2.0)
+    assert job.state == 'cancelled'
+    assert len(refined) < len(bridge.tile_grid(256, 128, 16))
+
+
+def test_deadline_covers_the_whole_tiled_run(client, backend, bridge, monkeypatch):
+    refined = slow_refine(monkeypatch, 0.1)
+    monkeypatch.setattr(bridge, 'GENERATION_TIMEOUT', 0.02)
+
+    response = client.post('/generate-texture', json={key: value for key, value in TILED.items() if key != 'kind'})
+
+    assert response.json['error'] == 'Generation timed out'
+    assert len(refined) < len(bridge.tile_grid(256, 128, 16))
+
+
+def test_tiled_budget_scales_with_the_tile_count(client, backend, bridge, monkeypatch):
+    refined = slow_refine(monkeypatch, 0.05)
+    monkeypatch.setattr(bridge, 'GENERATION_TIMEOUT', 0.2)
+
+    started = time.monotonic()
+    response = client.post('/generate-texture', json={key: value for key, value in TILED.items() if key != 'kind'})
+
+    assert response.status_code == 200
+    assert time.monotonic() - started > bridge.GENERATION_TIMEOUT
+    assert len(refined) == len(bridge.tile_grid(256, 128, 16))
+
+
+def test_client_disconnect_cancels_variations(client, backend, bridge, monkeypatch):
+    backend.delay = 2.0
+    monkeypatch.setattr(bridge, 'DISCONNECT_POLL', 0.05)
+    monkeypatch.setattr(bridge, 'client_disconnected', lambda: True)
+
+    response = client.post('/generate-variations', json={'prompt': 'moss', 'count': 2, 'steps': 20})
+
+    assert response.status_code == 499
+    job = bridge.jobs.get(response.json['job_id'])
+    assert job.wait(1.0)
+    assert (job.state, job.cancel_reason) == ('cancelled', 'disconnected')
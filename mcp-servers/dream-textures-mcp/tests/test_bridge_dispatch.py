@@ -0,0 +1,53 @@
+"""
+All bpy work runs on the dispatcher thread and never mutates the shared scene
+"""
+
+import threading
+
+import bpy
+
+from bridge_dispatch import MainThreadDispatcher
+
+
+def test_dispatcher_runs_calls_on_its_own_thread():
+    dispatcher = MainThreadDispatcher()
+    thread = threading.Thread(target=dispatcher.run_forever, name='owner', daemon=True)
+    thread.start()
+    while not dispatcher.running:
+        pass
+
+    assert dispatcher.call(lambda: threading.current_thread().name) == 'owner'
+    assert dispatcher.call(lambda: dispatcher.call(lambda: 'nested')) == 'nested'
+
+    dispatcher.stop()
+    thread.join(1)
+    assert not dispatcher.running
+
+
+def test_concurrent_requests_keep_their_own_parameters(bridge, backend, monkeypatch):
+    scene_prompt = bpy.context.scene.dream_textures_prompt
+    before = dict(vars(scene_prompt))
+    threads_seen = set()
+    original = scene_prompt.generate_args
+
+    def recording_generate_args(context):
+        threads_seen.add(threading.current_thread().name)
+        return original(context)
+
+    monkeypatch.setattr(scene_prompt, 'generate_args', recording_generate_args)
+    model = bridge.get_texture_model()
+    sizes = {}
+
+    def request(resolution):
+        result = bridge.run_generation([f'tile {resolution}'], resolution, 2, resolution, model)[0]
+        sizes[resolution] = result.image.size
+
+    threads = [threading.Thread(target=request, args=(resolution,)) for resolution in (32, 48, 64, 80)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sizes == {resolution: (resolution, resolution) for resolution in (32, 48, 64, 80)}
+    assert threads_seen == {'blender-main'}
+    assert {key: value for key, value in vars(scene_prompt).items() if key != 'generate_args'} == before
@@ -0,0 +1,133 @@
+"""
+Draft-then-refine: a quick low-resolution draft first, refined at the requested size through the same job
+"""
+
+import base64
+import io
+
+import bpy
+import pytest
+from PIL import Image
+
+
+def decode(data):
+    return Image.open(io.BytesIO(base64.b64decode(data)))
+
+
+def record_refines(monkeypatch, takes_seed=True):
+    """Record img2img calls, on an operator that defines a seed property unless takes_seed is False"""
+    calls = []
+    refine = bpy.ops.dream_textures.refine_texture
+
+    def recording(seed=None, **kwargs):
+        calls.append(dict(kwargs, seed=seed))
+        return refine.function(**kwargs)
+
+    properties = refine.properties + ('seed',) if takes_seed else refine.properties
+    monkeypatch.setattr(bpy.ops.dream_textures, 'refine_texture', bpy.Operator(recording, *properties))
+    return calls
+
+
+def test_draft_texture_answers_with_draft_then_refines(client, backend, bridge, monkeypatch):
+    refines = record_refines(monkeypatch)
+    response = client.post('/generate-texture', json={
+        'prompt': 'oak bark', 'resolution': 512, 'steps': 30, 'quality': 'draft', 'format': 'jpeg'
+    })
+
+    assert response.status_code == 200
+    draft = response.json
+    assert draft['quality'] == 'draft' and draft['refining'] is True
+    assert (draft['resolution'], draft['steps']) == (256, 8)
+    assert decode(draft['image']).size == (256, 256)
+    assert [(call.size, call.steps) for call in backend.calls] == [((256, 256), 8)]
+
+    job = bridge.jobs.get(draft['job_id'])
+    assert job.wait(5)
+    final = client.get(f"/jobs/{draft['job_id']}/result").json
+    assert final['quality'] == 'final' and final['format'] == 'jpeg'
+    assert final['seed'] == draft['seed'] != -1
+    assert final['draft'] == {'resolution': 256, 'steps': 8}
+    assert decode(final['image']).size == (512, 512)
+    assert [(call['width'], call['steps'], call['seed']) for call in refines] == [(512, 30, draft['seed'])]
+
+    # The draft stays available next to the final result
+    assert client.get(f"/jobs/{draft['job_id']}/result?stage=draft").json['resolution'] == 256
+    assert len(bpy.data.images) == 0
+
+
+def test_draft_refines_on_an_operator_without_a_seed(client, bridge, monkeypatch):
+    refines = record_refines(monkeypatch, takes_seed=False)
+    draft = client.post('/generate-texture', json={'prompt': 'oak bark', 'resolution': 512, 'quality': 'draft'}).json
+
+    job = bridge.jobs.get(draft['job_id'])
+    assert job.wait(5)
+    assert job.state == 'succeeded', job.error
+    assert [call['seed'] for call in refines] == [None]
+
+
+def test_draft_without_refine_finishes_with_the_draft(client, backend, monkeypatch):
+    refines = record_refines(monkeypatch)
+    job_id = client.post('/jobs', json={
+        'kind': 'texture', 'prompt': 'slate', 'seed': 7, 'quality': 'draft', 'refine': False
+    }).json['job_id']
+
+    events = client.get(f'/jobs/{job_id}/events').get_data(as_text=True)
+    assert 'event: draft' in events
+    result = client.get(f'/jobs/{job_id}/result').json
+    assert (result['quality'], result['seed'], result['resolution']) == ('draft', 7, 256)
+    assert refines == []
+
+
+def test_draft_pbr_set_refines_each_map(client, backend, bridge, monkeypatch):
+    refines = record_refines(monkeypatch)
+    response = client.post('/generate-pbr-set', json={
+        'prompt': 'rusty iron', 'resolution': 384, 'maps': ['albedo', 'roughness'], 'quality': 'draft'
+    })
+
+    assert set(response.json['maps']) == {'albedo', 'roughness'}
+    bridge.jobs.get(response.json['job_id']).wait(5)
+    final = client.get(f"/jobs/{response.json['job_id']}/result").json
+    assert all(decode(image).size == (384, 384) for image in final['maps'].values())
+    assert len(refines) == 2
+
+
+def test_draft_derived_set_refines_only_the_albedo(client, backend, bridge, cache, monkeypatch):
+    refines = record_refines(monkeypatch)
+    response = client.post('/generate-pbr-set', json={
+        'prompt': 'granite', 'resolution': 384, 'maps': ['normal', 'roughness'], 'mode': 'derive',
+        'quality': 'draft'
+    })
+
+    bridge.jobs.get(response.json['job_id']).wait(5)
+    final = client.get(f"/jobs/{response.json['job_id']}/result").json
+    assert decode(final['maps']['normal']).size == (384, 384)
+    assert len(refines) == 1
+    # The draft albedo comes back from the cache for the refine pass
+    assert len(backend.calls) == 1
+
+
+def test_quality_values_are_validated(client):
+    assert client.post('/generate-texture', json={'prompt': 'moss', 'quality': 'best'}).status_code == 400
+    assert client.post('/generate-texture', json={'prompt': 'moss', 'quality': 'draft',
+                                                  'refine_strength': 2}).status_code == 400
+    # A number is still JPEG quality
+    response = client.post('/generate-texture', json={'prompt': 'moss', 'resolution': 64, 'steps': 1,
+                                                      'format': 'jpeg', 'quality': '80'})
+    assert response.status_code == 200 and 'job_id' not in response.json
+
+
+def test_draft_can_set_jpeg_quality(bridge):
+    params = bridge.normalize_params({'prompt': 'moss', 'quality': 'draft', 'format': 'jpeg', 'jpeg_quality': '40'})
+
+    assert params['draft'] and 'quality' not in params
+    assert bridge.encoding_for(params, 'albedo').quality == 40
+    assert bridge.normalize_params({'prompt': 'moss', 'quality': 70})['jpeg_quality'] == 70
+    with pytest.raises(ValueError):
+        bridge.normalize_params({'prompt': 'moss', 'quality': 'draft', 'jpeg_quality': 0})
+
+
+def test_missing_draft_stage(client, bridge):
+    job_id = client.post('/jobs', json={'kind': 'texture', 'prompt': 'clay', 'resolution': 64, 'steps': 1}).json['job_id']
+    bridge.jobs.get(job_id).wait(5)
+    assert client.get(f'/jobs/{job_id}/result?stage=draft').status_code == 404
+    assert client.get(f'/jobs/{job_id}').json['partials'] == []
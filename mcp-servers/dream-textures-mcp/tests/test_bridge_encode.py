@@ -0,0 +1,128 @@
+"""
+Output encodings: formats, compression levels and per-map selection
+"""
+
+import base64
+import io
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from bridge_encode import Encoding, encode_image, encode_png16, encoding_for
+
+
+def gradient(size=32):
+    ramp = np.linspace(0, 255, size, dtype=np.uint8)
+    return Image.fromarray(np.stack(list(np.meshgrid(ramp, ramp[::-1])) + [np.full((size, size), 128, np.uint8)], axis=-1), 'RGB')
+
+
+@pytest.mark.parametrize('format, signature', [
+    ('png', b'\x89PNG'),
+    ('webp', b'RIFF'),
+    ('jpeg', b'\xff\xd8\xff')
+])
+def test_formats_decode_back(format, signature):
+    data = encode_image(gradient(), Encoding(format))
+
+    assert data.startswith(signature)
+    assert data.format == format
+    decoded = Image.open(io.BytesIO(data))
+    assert decoded.size == (32, 32)
+    if format != 'jpeg':
+        assert np.array_equal(np.asarray(decoded.convert('RGB')), np.asarray(gradient()))
+
+
+def test_png_compression_level_trades_size():
+    image = gradient(128)
+    assert len(encode_image(image, Encoding('png', compression=0))) > len(encode_image(image, Encoding('png', compression=9)))
+
+
+def test_raw_rgba_is_unframed_pixels():
+    data = encode_image(gradient(), Encoding('rgba'))
+
+    assert data.mimetype == 'application/octet-stream'
+    pixels = np.frombuffer(data, dtype=np.uint8).reshape(32, 32, 4)
+    assert np.array_equal(pixels[..., :3], np.asarray(gradient()))
+    assert (pixels[..., 3] == 255).all()
+
+
+def decode_png16_rgb(data):
+    """Minimal reader for the files encode_png16 writes (Pillow reads 16-bit RGB as 8-bit)"""
+    width, height, depth, colour_type = struct.unpack('>IIBB', data[16:26])
+    assert (depth, colour_type) == (16, 2)
+    length = struct.unpack('>I', data[33:37])[0]
+    raw = np.frombuffer(zlib.decompress(data[41:41 + length]), dtype=np.uint8).reshape(height, -1)
+    assert (raw[:, 0] == 2).all()
+    rows = np.cumsum(raw[:, 1:], axis=0, dtype=np.uint8)
+    return rows.view('>u2').reshape(height, width, 3).astype(np.uint16)
+
+
+def test_png16_keeps_sixteen_bit_values():
+    values = (np.arange(4 * 5 * 3).reshape(4, 5, 3) * 1009 % 65536).astype(np.uint16)
+    assert np.array_equal(decode_png16_rgb(encode_png16(values)), values)
+
+    widened = decode_png16_rgb(encode_image(gradient(), Encoding('png16')))
+    assert np.array_equal(widened, np.asarray(gradient()).astype(np.uint16) * 257)
+
+
+def test_format_map_and_validation():
+    params = {'format': {'albedo': 'jpeg', 'normal': 'png16', 'default': 'webp'}}
+    assert encoding_for(params, 'albedo').format == 'jpeg'
+    assert encoding_for(params, 'normal').format == 'png16'
+    assert encoding_for(params, 'ao').format == 'webp'
+    assert encoding_for({}, 'ao').format == 'png'
+
+    with pytest.raises(ValueError):
+        Encoding('tiff')
+    with pytest.raises(ValueError):
+        Encoding('png', compression=12)
+    with pytest.raises(ValueError):
+        Encoding('webp', compression=9)
+    with pytest.raises(ValueError):
+        Encoding('jpeg', quality=100)
+
+
+def test_texture_request_with_format(client, backend):
+    response = client.post('/generate-texture', json={'prompt': 'oak', 'steps': 1, 'resolution': 64, 'format': 'webp'},
+                           headers={'Accept': 'image/webp'})
+
+    assert response.mimetype == 'image/webp'
+    assert Image.open(io.BytesIO(response.get_data())).format == 'WEBP'
+
+
+def test_pbr_set_with_per_map_formats(client, backend):
+    response = client.post('/generate-pbr-set', json={
+        'prompt': 'oak',
+        'steps': 1,
+        'resolution': 64,
+        'mode': 'derive',
+        'maps': ['albedo', 'normal', 'roughness'],
+        'format': {'albedo': 'jpeg', 'normal': 'png16'}
+    })
+
+    assert response.json['formats'] == {'albedo': 'jpeg', 'normal': 'png16', 'roughness': 'png'}
+    maps = {map_type: base64.b64decode(data) for map_type, data in response.json['maps'].items()}
+    assert maps['albedo'].startswith(b'\xff\xd8\xff')
+    assert maps['normal'][24] == 16
+    assert maps['roughness'].startswith(b'\x89PNG')
+
+
+def test_unknown_format_is_rejected(client):
+    response = client.post('/generate-texture', json={'prompt': 'oak', 'format': 'bmp'})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('body', [
+    {'format': 'jpeg', 'jpeg_quality': 100},
+    {'format': 'jpeg', 'quality': 96},
+    {'format': 'webp', 'compression': 9},
+    {'format': {'albedo': 'webp'}, 'compression': 7}
+])
+def test_settings_the_encoder_would_not_honour_are_rejected(client, backend, body):
+    response = client.post('/generate-texture', json={'prompt': 'oak', **body})
+
+    assert response.status_code == 400
+    assert backend.calls == []
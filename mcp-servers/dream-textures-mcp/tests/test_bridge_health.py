@@ -0,0 +1,43 @@
+"""
+Liveness, readiness and warm-up reporting
+"""
+
+import threading
+
+
+def test_ready_bridge_reports_resolved_model(client):
+    ready = client.get('/health/ready')
+    health = client.get('/health').json
+
+    assert ready.status_code == 200
+    assert health['live'] and health['ready']
+    assert health['status'] == 'healthy'
+    assert health['model'] == 'dream-textures/texture-diffusion'
+
+
+def test_warmup_is_timed(bridge, backend):
+    bridge.initialize(warmup=True)
+
+    assert bridge.runtime.warmup_seconds is not None
+    assert backend.calls[-1].size == (bridge.WARMUP_RESOLUTION, bridge.WARMUP_RESOLUTION)
+
+
+def test_generation_is_gated_until_ready(client, bridge, monkeypatch):
+    monkeypatch.setattr(bridge.runtime, 'ready', threading.Event())
+
+    assert client.get('/health/live').status_code == 200
+    assert client.get('/health/ready').status_code == 503
+    assert client.get('/health').json['status'] == 'starting'
+
+    response = client.post('/generate-texture', json={'prompt': 'oak'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+
+
+def test_backend_and_model_are_resolved_once(client, backend, bridge, monkeypatch):
+    calls = []
+    monkeypatch.setattr(bridge, 'find_texture_model', lambda: calls.append(1))
+
+    client.post('/generate-texture', json={'prompt': 'oak', 'steps': 1, 'resolution': 32})
+
+    assert calls == []
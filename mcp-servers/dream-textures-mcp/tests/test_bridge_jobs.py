@@ -0,0 +1,155 @@
+"""
+Job API: submit / poll / fetch and the SSE event stream
+"""
+
+import json
+import threading
+
+import pytest
+
+from bridge_jobs import JobManager
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_submit_poll_and_fetch(client, backend):
+    response = client.post('/jobs', json={'kind': 'pbr-set', 'prompt': 'oak', 'maps': ['albedo', 'ao'], 'steps': 2})
+    assert response.status_code == 202
+    job_id = response.json['job_id']
+
+    events = parse_sse(client.get(f'/jobs/{job_id}/events').get_data(as_text=True))
+    assert events[-1][1]['state'] == 'succeeded'
+
+    status = client.get(f'/jobs/{job_id}').json
+    assert status['state'] == 'succeeded'
+    assert status['progress'] == 1.0
+
+    result = client.get(f'/jobs/{job_id}/result').json
+    assert set(result['maps']) == {'albedo', 'ao'}
+
+
+def test_unknown_job_and_kind(client):
+    assert client.get('/jobs/missing').status_code == 404
+    assert client.get('/jobs/missing/events').status_code == 404
+    assert client.post('/jobs', json={'kind': 'video', 'prompt': 'x'}).status_code == 400
+    assert client.post('/jobs', json={'kind': 'texture'}).status_code == 400
+
+
+def test_manager_runs_jobs_and_records_outcomes():
+    release = threading.Event()
+
+    def slow(job):
+        release.wait(5)
+        return {'value': job.params['value']}
+
+    def broken(job):
+        raise KeyError('missing')
+
+    manager = JobManager({'slow': slow, 'broken': broken, 'expected': lambda job: 1 / 0},
+                         expected_errors=(ZeroDivisionError,))
+    job = manager.submit('slow', {'value': 3})
+    assert manager.get(job.id) is job and not job.finished
+    release.set()
+    assert job.wait(5)
+    assert (job.state, job.result, job.progress) == ('succeeded', {'value': 3}, 1.0)
+
+    failed = manager.submit('broken', {})
+    expected = manager.submit('expected', {})
+    assert failed.wait(5) and expected.wait(5)
+    assert failed.state == 'failed' and 'KeyError' in failed.traceback
+    assert expected.state == 'failed' and expected.traceback is None
+
+    with pytest.raises(ValueError):
+        manager.submit('video', {})
+    assert manager.get('missing') is None
+
+
+def test_finished_jobs_expire_after_retention():
+    manager = JobManager({'noop': lambda job: {}}, retention=0)
+    job = manager.submit('noop', {})
+    assert job.wait(5)
+
+    manager.submit('noop', {}).wait(5)
+    assert manager.get(job.id) is None
+
+
+def test_finished_jobs_drop_their_previews():
+    def previewing(job):
+        job.set_progress(0.5, step=1, preview='base64 png')
+        return {}
+
+    job = JobManager({'preview': previewing}).submit('preview', {})
+    assert job.wait(5)
+
+    progress = [data for _, name, data in job.events_after(0) if name == 'progress']
+    assert progress == [{'progress': 0.5, 'step': 1}]
+
+
+def test_result_waits_for_the_job_and_reports_failures(client, backend, bridge):
+    backend.delay = 0.5
+    job_id = client.post('/jobs', json={'kind': 'texture', 'prompt': 'slate', 'steps': 2}).json['job_id']
+    pending = client.get(f'/jobs/{job_id}/result')
+    assert pending.status_code == 409
+    assert pending.json['state'] in ('queued', 'running')
+    bridge.jobs.get(job_id).wait(5)
+
+    backend.error = RuntimeError('out of memory')
+    job_id = client.post('/jobs', json={'kind': 'texture', 'prompt': 'slate', 'steps': 1}).json['job_id']
+    bridge.jobs.get(job_id).wait(5)
+    failed = client.get(f'/jobs/{job_id}/result')
+    assert failed.status_code == 500
+    assert 'out of memory' in failed.json['error']
+    assert client.get(f'/jobs/{job_id}').json['state'] == 'failed'
+
+
+def test_events_report_steps_and_previews(client, backend):
+    # Slow enough that the stream is open before the first preview is due
+    backend.delay = 0.4
+    response = client.post('/jobs', json={
+        'kind': 'texture',
+        'prompt': 'granite',
+        'steps': 4,
+        'resolution': 256,
+        'preview_every': 2,
+        'preview_size': 32
+    })
+    job_id = response.json['job_id']
+
+    events = parse_sse(client.get(f'/jobs/{job_id}/events').get_data(as_text=True))
+    progress = [data for name, data in events if name == 'progress']
+
+    assert [data['step'] for data in progress] == [1, 2, 3, 4]
+    assert [('preview' in data) for data in progress] == [False, True, False, True]
+    assert all(data['eta'] is not None for data in progress)
+    assert progress[-1]['eta'] == 0
+
+
+def test_previews_are_validated_and_only_encoded_for_watchers(client, backend, bridge, monkeypatch):
+    for bad in ({'preview_every': -1}, {'preview_every': 'often'}, {'preview_size': 0}, {'preview_size': 4096}):
+        assert client.post('/jobs', json={'kind': 'texture', 'prompt': 'clay', **bad}).status_code == 400
+
+    encoded = []
+    monkeypatch.setattr(bridge, 'encode_preview', lambda image, size: encoded.append(size) or '')
+    response = client.post('/generate-texture', json={'prompt': 'clay', 'steps': 4, 'resolution': 64,
+                                                      'preview_every': 1})
+
+    assert response.status_code == 200
+    assert encoded == []
+
+
+def test_events_resume_from_last_event_id(client, backend):
+    job_id = client.post('/jobs', json={'kind': 'texture', 'prompt': 'slate', 'steps': 2}).json['job_id']
+    client.get(f'/jobs/{job_id}/result')
+    first = client.get(f'/jobs/{job_id}/events').get_data(as_text=True)
+    total = len(parse_sse(first))
+
+    resumed = client.get(f'/jobs/{job_id}/events', headers={'Last-Event-ID': str(total - 1)})
+
+    assert len(parse_sse(resumed.get_data(as_text=True))) == 1
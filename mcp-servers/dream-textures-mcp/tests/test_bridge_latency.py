@@ -0,0 +1,53 @@
+"""
+Completion latency of the generate endpoints against the stub backend
+"""
+
+import time
+
+
+def test_single_map_returns_as_soon_as_backend_completes(client, backend):
+    backend.delay = 0.05
+
+    started = time.monotonic()
+    response = client.post('/generate-texture', json={'prompt': 'brushed steel', 'steps': 5})
+    elapsed = time.monotonic() - started
+
+    assert response.status_code == 200
+    assert response.json['success']
+    # The old 0.5 s poll loop could never return in under half a second
+    assert elapsed < 0.3
+
+
+def test_pbr_set_has_no_per_map_polling_overhead(client, backend):
+    backend.delay = 0.05
+    maps = ['albedo', 'normal', 'roughness', 'metallic', 'ao']
+
+    started = time.monotonic()
+    response = client.post('/generate-pbr-set', json={'prompt': 'rusty metal', 'maps': maps, 'steps': 5})
+    elapsed = time.monotonic() - started
+
+    assert response.status_code == 200
+    assert all(response.json['maps'][map_type] for map_type in maps)
+    assert elapsed < len(maps) * backend.delay + 0.5
+
+
+def test_deadline_is_enforced(client, backend, bridge, monkeypatch):
+    backend.delay = 1.0
+    monkeypatch.setattr(bridge, 'GENERATION_TIMEOUT', 0.1)
+
+    started = time.monotonic()
+    response = client.post('/generate-texture', json={'prompt': 'slow', 'steps': 1})
+    elapsed = time.monotonic() - started
+
+    assert response.status_code == 500
+    assert response.json['error'] == 'Generation timed out'
+    assert elapsed < 0.5
+
+
+def test_backend_error_is_reported(client, backend):
+    backend.error = RuntimeError('CUDA out of memory')
+
+    response = client.post('/generate-texture', json={'prompt': 'steel', 'steps': 1})
+
+    assert response.status_code == 500
+    assert response.json['error'] == 'Generation failed: CUDA out of memory'
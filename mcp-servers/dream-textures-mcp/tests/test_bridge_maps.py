@@ -0,0 +1,155 @@
+"""
+NumPy map derivation, ORM packing and LOD levels, and the /generate-pbr-set options using them
+"""
+
+import base64
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from bridge_maps import (ao_map, box_blur, derive_maps, downsample, lod_levels, normal_map, pack_channels,
+                         roughness_map)
+
+
+def test_flat_albedo_gives_flat_normal_and_full_ao():
+    rgb = np.full((16, 16, 3), 120, dtype=np.float32)
+
+    normal = normal_map(rgb)
+    ao = ao_map(rgb)
+
+    assert (normal == [127, 127, 255]).all()
+    assert (ao == 255).all()
+
+
+def test_roughness_matches_web_app_curve():
+    rgb = np.array([[[0, 0, 0], [255, 255, 255]]], dtype=np.float32)
+
+    assert roughness_map(rgb).tolist() == [[255, 0]]
+
+
+def test_box_blur_wraps_around_edges():
+    values = np.zeros((5, 5), dtype=np.float32)
+    values[0, 0] = 9.0
+
+    blurred = box_blur(values, 1)
+
+    assert np.isclose(blurred[4, 4], 1.0)
+    assert np.isclose(blurred.sum(), 9.0)
+
+
+def test_derive_maps_only_returns_derivable_maps():
+    albedo = Image.new('RGB', (8, 8), (200, 200, 200))
+
+    maps = derive_maps(albedo, ['albedo', 'normal', 'metallic'], metallic=1.0)
+
+    assert set(maps) == {'normal', 'metallic'}
+    assert (maps['metallic'] == 255).all()
+
+
+def test_derive_mode_runs_one_diffusion(client, backend):
+    maps = ['albedo', 'normal', 'roughness', 'metallic', 'ao']
+    response = client.post('/generate-pbr-set', json={
+        'prompt': 'cobblestone',
+        'resolution': 64,
+        'steps': 2,
+        'maps': maps,
+        'mode': 'derive'
+    })
+
+    assert response.status_code == 200
+    assert len(backend.calls) == 1
+    sizes = {Image.open(io.BytesIO(base64.b64decode(response.json['maps'][m]))).size for m in maps}
+    assert sizes == {(64, 64)}
+
+
+def test_unknown_mode_is_rejected(client):
+    response = client.post('/generate-pbr-set', json={'prompt': 'oak', 'mode': 'magic'})
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('metallic', [5, -1])
+def test_metallic_outside_zero_to_one_is_rejected(client, metallic):
+    response = client.post('/generate-pbr-set', json={'prompt': 'oak', 'mode': 'derive', 'metallic': metallic})
+
+    assert response.status_code == 400
+
+
+def decode(data):
+    return Image.open(io.BytesIO(base64.b64decode(data)))
+
+
+def test_orm_packs_grayscale_maps_and_fills_missing_channels():
+    ao = np.full((4, 4, 3), 10, dtype=np.uint8)
+    roughness = np.full((4, 4), 200, dtype=np.uint8)
+
+    packed, filled = pack_channels('orm', {'ao': ao, 'roughness': roughness}, 4)
+
+    assert packed.shape == (4, 4, 3)
+    assert packed[0, 0].tolist() == [10, 200, 0]
+    assert filled == ['metallic']
+
+
+def test_lod_levels_average_blocks_and_renormalize_normals():
+    checker = np.indices((8, 8)).sum(axis=0) % 2 * 255
+    levels = lod_levels(checker.astype(np.uint8), [4, 2, 3])
+
+    assert sorted(levels) == [2, 3, 4]
+    assert (levels[4] == 128).all() and (levels[2] == 128).all()
+    assert levels[3].shape == (3, 3)
+
+    # Opposite tilts average out to a straight-up normal of unit length
+    normals = np.zeros((2, 2, 3), dtype=np.uint8)
+    normals[:, 0] = [204, 127, 229]
+    normals[:, 1] = [51, 127, 229]
+    flat = lod_levels(normals, [1], normal=True)[1][0, 0]
+    assert flat[2] == 255 and abs(int(flat[0]) - 127) <= 1
+    assert downsample(normals, 2) is normals
+
+
+def test_pbr_set_returns_packed_orm_and_lods(client, backend):
+    response = client.post('/generate-pbr-set', json={
+        'prompt': 'slate roof',
+        'steps': 1,
+        'pack': 'orm',
+        'lods': [128, 64, 32],
+        'format': {'orm': 'webp', 'default': 'png'}
+    })
+
+    assert response.status_code == 200
+    body = response.json
+    assert body['resolution'] == 128
+    assert set(body['maps']) == {'albedo', 'normal', 'orm'}
+    assert body['formats']['orm'] == 'webp' and body['packed_defaults'] == []
+    assert sorted(body['lods']) == ['32', '64']
+    assert decode(body['lods']['32']['orm']).size == (32, 32)
+    assert decode(body['maps']['orm']).format == 'WEBP'
+    # One generation: five maps batched, no extra passes for the levels
+    assert sum(getattr(call, 'batch_size', 1) for call in backend.calls) == 5
+
+
+def test_unrefined_draft_keeps_only_smaller_lods(client, backend, bridge):
+    job_id = client.post('/jobs', json={
+        'kind': 'pbr-set',
+        'prompt': 'slate roof',
+        'steps': 1,
+        'resolution': 1024,
+        'quality': 'draft',
+        'refine': False,
+        'pack': 'orm',
+        'lods': [512, 128]
+    }).json['job_id']
+    bridge.jobs.get(job_id).wait(10)
+
+    body = client.get(f'/jobs/{job_id}/result').json
+    assert body['resolution'] == 256
+    assert sorted(body['lods']) == ['128']
+    assert decode(body['lods']['128']['orm']).size == (128, 128)
+
+
+def test_pack_and_lods_are_validated(client):
+    assert client.post('/generate-pbr-set', json={'prompt': 'oak', 'pack': 'rma'}).status_code == 400
+    assert client.post('/generate-pbr-set', json={'prompt': 'oak', 'resolution': 256,
+                                                  'lods': [512]}).status_code == 400
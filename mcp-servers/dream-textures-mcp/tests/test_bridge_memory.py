@@ -0,0 +1,94 @@
+"""
+Memory hygiene: sweeping leaked Blender data, /debug/memory and the soft limit
+"""
+
+import threading
+import tracemalloc
+
+import bpy
+
+from bridge_memory import RECYCLE_EXIT_CODE, MemoryMonitor
+from test_bridge_refine import png_bytes
+
+
+def test_sweep_removes_leaked_bridge_images(client):
+    bpy.data.images.new('dream_input_leaked', 2, 2)
+    bpy.data.images.new('DreamTextures_Refined', 2, 2)
+    bpy.data.images.new('Material Texture', 2, 2)
+    try:
+        body = client.post('/debug/memory/sweep').json
+
+        assert body['images_removed'] == 2
+        assert list(bpy.data.images) == ['Material Texture']
+        assert body['rss_bytes'] > 0
+    finally:
+        bpy.data.images.clear()
+
+
+def test_failed_refinement_leaves_no_images(client, monkeypatch):
+    def refine_then_fail(image, width, height, **kwargs):
+        bpy.data.images.new('DreamTextures_Refined', width, height)
+        raise RuntimeError('Refinement failed')
+
+    monkeypatch.setattr(bpy.ops.dream_textures.refine_texture, 'function', refine_then_fail)
+    response = client.post('/refine-texture', data=png_bytes((10, 20, 30, 255)), content_type='image/png',
+                           query_string={'prompt': 'rust', 'resolution': 8})
+
+    assert response.status_code == 500
+    assert len(bpy.data.images) == 0
+
+
+def test_debug_memory_reports_rss_images_and_allocators(client):
+    body = client.get('/debug/memory').json
+    assert body['success']
+    assert body['rss_bytes'] > 0
+    assert body['blender_images'] == 0
+    assert body['tracemalloc'] == {'tracing': False}
+
+    tracemalloc.start()
+    try:
+        hoard = [bytearray(1024) for _ in range(100)]
+        body = client.get('/debug/memory?limit=3').json
+    finally:
+        tracemalloc.stop()
+    assert body['tracemalloc']['tracing'] and len(body['tracemalloc']['top']) == 3
+    assert hoard
+
+
+def test_soft_limit_fires_once():
+    crossings = []
+    monitor = MemoryMonitor(0, soft_limit_bytes=1, sweep=lambda: {'swept': 1}, on_limit=crossings.append)
+
+    assert monitor.check()['swept'] == 1
+    monitor.check()
+    assert len(crossings) == 1 and crossings[0] > 1
+    assert monitor.stats()['sweeps'] == 2
+
+
+def test_soft_limit_drains_then_exits(client, bridge, monkeypatch):
+    exited = []
+    done = threading.Event()
+    monkeypatch.setattr(bridge.runtime, 'draining', threading.Event())
+    monkeypatch.setattr(bridge, 'DRAIN_GRACE', 0)
+    monkeypatch.setattr(bridge, 'exit_process', lambda code: (exited.append(code), done.set()))
+    monkeypatch.setattr(bridge, 'store', None)
+
+    bridge.start_recycle(2 ** 31)
+
+    assert client.get('/health/ready').status_code == 503
+    assert client.get('/health').json['status'] == 'draining'
+    response = client.post('/generate-texture', json={'prompt': 'oak'})
+    assert response.status_code == 503
+    assert 'recycling' in response.json['error']
+
+    assert done.wait(10)
+    assert exited == [RECYCLE_EXIT_CODE]
+
+
+def test_sweep_forgets_expired_jobs(client, bridge, monkeypatch):
+    job = bridge.jobs.submit('texture', {'prompt': 'oak', 'resolution': 32, 'steps': 1})
+    assert job.wait(5)
+    monkeypatch.setattr(bridge.jobs, '_persisted_retention', 0)
+
+    assert client.post('/debug/memory/sweep').json['jobs_pruned'] >= 1
+    assert bridge.jobs.get(job.id).state == 'succeeded'
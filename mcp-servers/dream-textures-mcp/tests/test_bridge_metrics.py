@@ -0,0 +1,92 @@
+"""
+Metrics: the exposition format and what the bridge records per request and stage
+"""
+
+import re
+
+from bridge_metrics import Registry
+
+
+def sample(text, name, **labels):
+    """Value of one sample line in exposition text, or None"""
+    label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = '^' + re.escape(name + (f'{{{label_text}}}' if labels else '')) + r' (\S+)$'
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_exposition_format():
+    registry = Registry()
+    counter = registry.counter('demo_total', 'A counter', ('kind',))
+    gauge = registry.gauge('demo_depth', 'A gauge')
+    histogram = registry.histogram('demo_seconds', 'A histogram', buckets=(0.1, 1.0))
+
+    counter.inc(kind='a')
+    counter.inc(2, kind='a "quoted"')
+    gauge.set_function(lambda: 3)
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    text = registry.render()
+    assert '# TYPE demo_total counter' in text
+    assert sample(text, 'demo_total', kind='a') == 1
+    assert 'demo_total{kind="a \\"quoted\\""} 2' in text
+    assert sample(text, 'demo_depth') == 3
+    assert sample(text, 'demo_seconds_bucket', le='0.1') == 1
+    assert sample(text, 'demo_seconds_bucket', le='1') == 2
+    assert sample(text, 'demo_seconds_bucket', le='+Inf') == 3
+    assert sample(text, 'demo_seconds_count') == 3
+    assert sample(text, 'demo_seconds_sum') == 5.55
+
+
+def test_bridge_records_requests_and_stages(client, backend, cache):
+    before = client.get('/metrics').get_data(as_text=True)
+    requests_before = sample(before, 'dream_bridge_requests_total',
+                             endpoint='/generate-texture', method='POST', status='200') or 0
+
+    response = client.post('/generate-texture', json={'prompt': 'basalt', 'steps': 2, 'resolution': 64})
+    assert response.status_code == 200
+
+    response = client.get('/metrics')
+    assert response.content_type.startswith('text/plain')
+    text = response.get_data(as_text=True)
+
+    assert sample(text, 'dream_bridge_requests_total',
+                  endpoint='/generate-texture', method='POST', status='200') == requests_before + 1
+    assert sample(text, 'dream_bridge_request_seconds_count', endpoint='/generate-texture', method='POST') >= 1
+    assert sample(text, 'dream_bridge_response_bytes_total', endpoint='/generate-texture') > 0
+    for stage in ('args', 'diffusion', 'png_encode', 'base64_encode'):
+        assert sample(text, 'dream_bridge_stage_seconds_count', stage=stage) >= 1
+    assert sample(text, 'dream_bridge_generations_in_flight') == 0
+    assert sample(text, 'dream_bridge_queued_jobs', priority='bulk') == 0
+
+
+def test_previews_are_timed_as_their_own_stage(client, backend, bridge, cache):
+    before = client.get('/metrics').get_data(as_text=True)
+    encodes_before = sample(before, 'dream_bridge_stage_seconds_count', stage='png_encode') or 0
+    previews_before = sample(before, 'dream_bridge_stage_seconds_count', stage='preview_encode') or 0
+
+    backend.delay = 0.4
+    response = client.post('/jobs', json={'kind': 'texture', 'prompt': 'granite', 'steps': 4, 'resolution': 64,
+                                          'preview_every': 1})
+    job = bridge.jobs.get(response.json['job_id'])
+    # Previews are only encoded while someone watches
+    with job.watching():
+        assert job.wait(5)
+
+    text = client.get('/metrics').get_data(as_text=True)
+    assert sample(text, 'dream_bridge_stage_seconds_count', stage='png_encode') == encodes_before + 1
+    assert sample(text, 'dream_bridge_stage_seconds_count', stage='preview_encode') == previews_before + 4
+
+
+def test_bridge_counts_map_failures(client, backend):
+    text = client.get('/metrics').get_data(as_text=True)
+    failures_before = sample(text, 'dream_bridge_map_failures_total', map_type='roughness') or 0
+
+    backend.error = RuntimeError('out of memory')
+    response = client.post('/generate-texture', json={'prompt': 'moss', 'map_type': 'roughness', 'steps': 2})
+    assert response.status_code == 500
+
+    text = client.get('/metrics').get_data(as_text=True)
+    assert sample(text, 'dream_bridge_map_failures_total', map_type='roughness') == failures_before + 1
@@ -0,0 +1,31 @@
+"""
+Model selection per request and the /models listing
+"""
+
+SECOND_MODEL = 'stabilityai/stable-diffusion-2-1-base'
+
+
+def test_models_endpoint_lists_installed_models(client):
+    body = client.get('/models').json
+
+    assert body['success']
+    assert body['default'] == 'dream-textures/texture-diffusion'
+    assert [model['id'] for model in body['models']] == ['dream-textures/texture-diffusion', SECOND_MODEL]
+    assert body['models'][0]['default'] and not body['models'][1]['default']
+
+
+def test_model_parameter_selects_the_model(client, backend):
+    payload = {'prompt': 'slate', 'steps': 1, 'resolution': 32}
+
+    assert client.post('/generate-texture', json=payload).status_code == 200
+    assert backend.calls[-1].model.model_base == 'dream-textures/texture-diffusion'
+    response = client.post('/generate-texture', json={**payload, 'model': SECOND_MODEL})
+    assert response.status_code == 200
+    assert backend.calls[-1].model.model_base == SECOND_MODEL
+
+
+def test_unknown_model_is_rejected(client):
+    response = client.post('/generate-texture', json={'prompt': 'slate', 'model': 'nope/missing'})
+
+    assert response.status_code == 400
+    assert 'nope/missing' in response.json['error']
@@ -0,0 +1,75 @@
+"""
+Pipelined /generate-pbr-set: map i encodes while map i+1 generates
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+@pytest.fixture
+def slow_encoder(bridge, monkeypatch):
+    """Encoding that takes as long as a generation, and records when it ran"""
+    spans = []
+    encode_image = bridge.encode_image
+
+    def slow_encode(image, encoding=None, stage=None):
+        if stage == 'preview_encode':
+            return encode_image(image, encoding, stage)
+        started = time.monotonic()
+        time.sleep(0.15)
+        spans.append((started, time.monotonic()))
+        return encode_image(image, encoding, stage)
+
+    monkeypatch.setattr(bridge, 'encode_image', slow_encode)
+    # The default pool is sized by CPU count; the timings assume a batch encodes in parallel
+    with ThreadPoolExecutor(max_workers=4) as encoder:
+        monkeypatch.setattr(bridge, 'encoder', encoder)
+        yield spans
+
+
+def timed_pbr_set(client):
+    started = time.monotonic()
+    response = client.post('/generate-pbr-set', json={
+        'prompt': 'slate',
+        'maps': ['albedo', 'normal', 'roughness', 'metallic'],
+        'steps': 1,
+        'resolution': 32
+    })
+    assert response.status_code == 200
+    assert all(response.json['maps'].values())
+    return time.monotonic() - started
+
+
+@pytest.mark.parametrize('batch_size', [1, 2])
+def test_encoding_overlaps_the_next_generation(client, backend, bridge, slow_encoder, monkeypatch, batch_size):
+    backend.delay = 0.15
+    monkeypatch.setattr(bridge, 'MAX_BATCH_SIZE', batch_size)
+
+    monkeypatch.setattr(bridge, 'PIPELINE_ENCODE', False)
+    serial = timed_pbr_set(client)
+    monkeypatch.setattr(bridge, 'PIPELINE_ENCODE', True)
+    pipelined = timed_pbr_set(client)
+
+    # Serially every encode adds to the total; pipelined, only the last one does
+    assert pipelined < serial - 0.2
+
+
+def test_failed_map_does_not_block_the_rest(client, backend, bridge, monkeypatch):
+    monkeypatch.setattr(bridge, 'MAX_BATCH_SIZE', 1)
+    calls = []
+    run_generation = bridge.run_generation
+
+    def failing_second_map(prompts, *args, **kwargs):
+        calls.append(prompts)
+        if len(calls) == 2:
+            raise bridge.GenerationError('Generation timed out')
+        return run_generation(prompts, *args, **kwargs)
+
+    monkeypatch.setattr(bridge, 'run_generation', failing_second_map)
+    response = client.post('/generate-pbr-set', json={'prompt': 'tile', 'maps': ['albedo', 'normal', 'ao'], 'steps': 1, 'resolution': 32})
+
+    maps = response.json['maps']
+    assert maps['normal'] is None
+    assert maps['albedo'] and maps['ao']
@@ -0,0 +1,259 @@
+"""
+Bridge pool with stub workers: routing, job ownership and restarts
+"""
+
+import http.server
+import json
+import socket
+import threading
+import time
+import urllib.request
+
+import pytest
+
+from bridge_pool import BridgePool, affinity_key, job_owner_ttl, serve, stub_command, stub_environment
+
+
+def free_ports(count):
+    for base in range(20000, 40000, 97):
+        sockets = []
+        try:
+            for port in range(base, base + count):
+                sock = socket.socket()
+                sock.bind(('127.0.0.1', port))
+                sockets.append(sock)
+            return base
+        except OSError:
+            continue
+        finally:
+            for sock in sockets:
+                sock.close()
+    raise RuntimeError('No free ports')
+
+
+def wait_for(condition, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return
+        time.sleep(0.1)
+    raise AssertionError('Timed out waiting for pool')
+
+
+def request(url, body=None, method=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=20) as response:
+        return response.status, json.loads(response.read())
+
+
+@pytest.fixture(scope='module')
+def pool(tmp_path_factory):
+    env = stub_environment()
+    env['DREAM_BRIDGE_CACHE_DIR'] = str(tmp_path_factory.mktemp('pool-cache'))
+    pool = BridgePool(2, free_ports(3), stub_command(), env, health_interval=0.2, startup_grace=15)
+    pool.start()
+    server = serve(pool, '127.0.0.1', pool.workers[-1].port + 1)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    pool.url = f'http://127.0.0.1:{server.server_address[1]}'
+    try:
+        wait_for(lambda: pool.status()['ready_workers'] == 2)
+        yield pool
+    finally:
+        server.shutdown()
+        pool.stop()
+
+
+def test_requests_are_routed_through_the_front_endpoint(pool):
+    status, body = request(f'{pool.url}/generate-texture', {'prompt': 'oak', 'steps': 1, 'resolution': 32})
+
+    assert status == 200
+    assert body['success']
+
+
+def test_job_requests_follow_their_worker(pool):
+    _, submitted = request(f'{pool.url}/jobs', {'kind': 'texture', 'prompt': 'slate', 'steps': 1, 'resolution': 32})
+    job_id = submitted['job_id']
+
+    def finished():
+        return request(f'{pool.url}/jobs/{job_id}')[1]['state'] == 'succeeded'
+
+    wait_for(finished)
+    status, result = request(f'{pool.url}/jobs/{job_id}/result')
+    assert status == 200 and result['image']
+
+
+def test_refined_result_of_a_sync_draft_is_routed(pool):
+    status, draft = request(f'{pool.url}/generate-texture',
+                            {'prompt': 'slate', 'steps': 2, 'resolution': 64, 'quality': 'draft'})
+    assert status == 200 and draft['quality'] == 'draft'
+    job_id = draft['job_id']
+
+    wait_for(lambda: request(f'{pool.url}/jobs/{job_id}')[1]['state'] == 'succeeded')
+    status, result = request(f'{pool.url}/jobs/{job_id}/result')
+    assert status == 200 and result['quality'] == 'final'
+
+
+def test_cache_requests_cover_every_worker(pool):
+    for prompt in ('oak', 'ash', 'elm'):
+        request(f'{pool.url}/generate-texture', {'prompt': prompt, 'seed': 1, 'steps': 1, 'resolution': 32})
+
+    _, stats = request(f'{pool.url}/cache')
+    assert len(stats['workers']) == 2
+    assert stats['memory_entries'] == sum(worker['memory_entries'] for worker in stats['workers']) >= 3
+
+    _, purged = request(f'{pool.url}/cache', method='DELETE')
+    assert purged['removed'] == stats['memory_entries']
+    assert request(f'{pool.url}/cache')[1]['memory_entries'] == 0
+
+
+def test_least_loaded_worker_is_picked(pool):
+    busy, idle = pool.workers
+    busy.acquire()
+    try:
+        assert pool.pick() is idle
+    finally:
+        busy.release()
+
+
+def test_fixed_seed_requests_keep_to_one_worker(pool):
+    busy, idle = pool.workers
+    body = next(
+        {'prompt': 'basalt', 'seed': seed, 'steps': 1, 'resolution': 32}
+        for seed in range(100)
+        if pool.pick(affinity_key(json.dumps({'prompt': 'basalt', 'seed': seed, 'steps': 1, 'resolution': 32})))
+        is busy
+    )
+    key = affinity_key(json.dumps(body))
+    assert affinity_key(json.dumps({**body, 'prompt': ' basalt  '})) == key
+    assert affinity_key(json.dumps({**body, 'seed': -1})) is None
+    assert affinity_key(b'not json') is None
+
+    hits_before = [worker['hits'] for worker in request(f'{pool.url}/cache')[1]['workers']]
+    busy.acquire()
+    try:
+        # Repeats go to the worker whose cache has the result, even while it is busier
+        request(f'{pool.url}/generate-texture', body)
+        request(f'{pool.url}/generate-texture', body)
+    finally:
+        busy.release()
+    _, stats = request(f'{pool.url}/cache')
+    hits = [worker['hits'] - before for worker, before in zip(stats['workers'], hits_before)]
+    assert hits == [1, 0]
+
+    busy.ready = False
+    try:
+        assert pool.pick(key) is idle
+    finally:
+        busy.ready = True
+
+
+def test_dead_worker_is_restarted(pool):
+    worker = pool.workers[0]
+    worker.process.kill()
+
+    wait_for(lambda: worker.restarts == 1 and worker.ready)
+    assert pool.status()['ready_workers'] == 2
+
+
+def health_server(health):
+    """An HTTP server answering GET /health with 200 and the given body"""
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps(health).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.mark.parametrize('health, restarted', [
+    ({'ready': False, 'error': 'CUDA out of memory'}, True),
+    ({'ready': False, 'draining': True}, False),
+    ({'ready': True}, False)
+])
+def test_worker_that_never_gets_ready_is_restarted(health, restarted, monkeypatch):
+    server = health_server(health)
+    pool = BridgePool(1, server.server_address[1], stub_command(), {}, max_failures=2)
+    worker = pool.workers[0]
+    worker.started_at = time.monotonic()
+    restarts = []
+    monkeypatch.setattr(worker, 'alive', lambda: True)
+    monkeypatch.setattr(pool, 'restart', restarts.append)
+    try:
+        for _ in range(2):
+            pool.check_health(worker)
+    finally:
+        server.shutdown()
+
+    assert worker.ready is health['ready']
+    assert restarts == ([worker] if restarted else [])
+
+
+def test_client_disconnect_closes_the_upstream_request():
+    # A worker that reads the request and never answers, like one busy generating
+    upstream = socket.create_server(('127.0.0.1', 0))
+    closed = threading.Event()
+
+    def accept():
+        connection, _ = upstream.accept()
+        connection.settimeout(10)
+        received = b''
+        while not received.endswith(b'}'):
+            received += connection.recv(65536)
+        try:
+            if connection.recv(1) == b'':
+                closed.set()
+        except ConnectionResetError:
+            closed.set()
+        connection.close()
+
+    threading.Thread(target=accept, daemon=True).start()
+    pool = BridgePool(1, upstream.getsockname()[1], stub_command(), {})
+    pool.workers[0].ready = True
+    server = serve(pool, '127.0.0.1', 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = socket.create_connection(server.server_address)
+        body = b'{"prompt": "oak"}'
+        client.sendall(b'POST /generate-texture HTTP/1.1\r\nHost: pool\r\nContent-Type: application/json\r\n'
+                       b'Content-Length: %d\r\n\r\n%s' % (len(body), body))
+        time.sleep(0.2)
+        client.close()
+
+        assert closed.wait(5)
+    finally:
+        server.shutdown()
+        upstream.close()
+
+
+def test_workers_get_their_own_store_and_cache(tmp_path):
+    env = {'DREAM_BRIDGE_STORE_DIR': str(tmp_path / 'store'), 'DREAM_BRIDGE_CACHE_DIR': str(tmp_path / 'cache')}
+    first, second = BridgePool(2, 1, stub_command(), env).workers
+
+    assert first.env['DREAM_BRIDGE_CACHE_DIR'] == str(tmp_path / 'cache' / 'worker-0')
+    assert second.env['DREAM_BRIDGE_CACHE_DIR'] == str(tmp_path / 'cache' / 'worker-1')
+    assert first.env['DREAM_BRIDGE_STORE_DIR'] != second.env['DREAM_BRIDGE_STORE_DIR']
+
+
+def test_job_owners_expire():
+    assert job_owner_ttl({'DREAM_BRIDGE_STORE_DIR': '', 'DREAM_BRIDGE_JOB_RETENTION': '60'}) == 60
+    assert job_owner_ttl({'DREAM_BRIDGE_JOB_RETENTION': '60', 'DREAM_BRIDGE_STORE_TTL': '600'}) == 600
+
+    pool = BridgePool(1, 1, stub_command(), {}, job_ttl=0.1)
+    worker = pool.workers[0]
+    pool.remember_job('old', worker)
+    time.sleep(0.15)
+    pool.remember_job('new', worker)
+
+    assert pool.status()['tracked_jobs'] == 1
+    assert pool.job_owner('new') is worker
+    time.sleep(0.15)
+    assert pool.job_owner('new') is None
@@ -0,0 +1,78 @@
+"""
+In-memory /refine-texture: no temp files, images always released
+"""
+
+import base64
+import io
+import time
+
+import bpy
+import pytest
+from PIL import Image
+
+
+def png_bytes(colour, size=(8, 4)):
+    buffer = io.BytesIO()
+    Image.new('RGBA', size, colour).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_refine_round_trips_pixels_in_memory(client):
+    response = client.post('/refine-texture', json={
+        'base_texture': base64.b64encode(png_bytes((10, 20, 30, 255))).decode(),
+        'prompt': 'add scratches'
+    })
+
+    refined = Image.open(io.BytesIO(base64.b64decode(response.json['image'])))
+    assert refined.size == (8, 4)
+    assert refined.getpixel((3, 1)) == (245, 235, 225, 255)
+    assert len(bpy.data.images) == 0
+
+
+def test_refine_accepts_binary_body_and_returns_png(client):
+    response = client.post('/refine-texture?prompt=weathered&steps=5', data=png_bytes((0, 0, 0, 255)),
+                           content_type='image/png', headers={'Accept': 'image/png'})
+
+    assert response.mimetype == 'image/png'
+    assert Image.open(io.BytesIO(response.get_data())).getpixel((0, 0)) == (255, 255, 255, 255)
+
+
+def test_failed_refine_releases_images(client):
+    response = client.post('/refine-texture', json={
+        'base_texture': base64.b64encode(png_bytes((1, 2, 3, 255))).decode(),
+        'prompt': 'fail please'
+    })
+
+    assert response.status_code == 500
+    assert len(bpy.data.images) == 0
+
+
+def test_refine_runs_as_a_queued_job(client, backend, bridge, monkeypatch):
+    texture = base64.b64encode(png_bytes((10, 20, 30, 255))).decode()
+    response = client.post('/refine-texture', json={'base_texture': texture, 'prompt': 'add moss'})
+    job = client.get(f"/jobs/{response.headers['X-Dream-Job-Id']}").json
+    assert (job['kind'], job['state'], job['priority']) == ('refine', 'succeeded', 'interactive')
+
+    backend.delay = 1.0
+    monkeypatch.setattr(bridge.jobs._queue, 'per_client', 1)
+    running = bridge.jobs.get(client.post('/jobs', json={'kind': 'texture', 'prompt': 'oak', 'steps': 2}).json['job_id'])
+    while running.state == 'queued':
+        time.sleep(0.01)
+    headers = {'X-Client-Id': 'editor'}
+    queued = client.post('/jobs', json={'kind': 'refine', 'base_texture': texture, 'prompt': 'rust'}, headers=headers)
+    rejected = client.post('/refine-texture', json={'base_texture': texture, 'prompt': 'rust'}, headers=headers)
+
+    assert queued.status_code == 202
+    assert rejected.status_code == 429 and int(rejected.headers['Retry-After']) >= 1
+    assert client.post('/refine-texture', json={'prompt': 'rust'}).status_code == 400
+    bridge.jobs.get(queued.json['job_id']).wait(10)
+
+
+@pytest.mark.parametrize('base_texture', [None, '', 'not base64!', 42])
+def test_refine_jobs_need_a_base_texture(client, base_texture):
+    body = {'kind': 'refine', 'prompt': 'rust', 'base_texture': base_texture}
+
+    response = client.post('/jobs', json=body)
+    assert response.status_code == 400
+    assert 'base_texture' in response.json['error']
+    assert client.post('/refine-texture', json=body).status_code == 400
@@ -0,0 +1,105 @@
+"""
+Admission control: bounded queue, per-client fair share and priority classes
+"""
+
+import threading
+
+import pytest
+
+from bridge_scheduler import BULK, INTERACTIVE, FairQueue, QueueFull
+
+
+def drain(queue):
+    return [queue.get() for _ in range(queue.qsize())]
+
+
+def test_clients_take_turns():
+    queue = FairQueue()
+    for index in range(4):
+        queue.put(f'a{index}', 'a', BULK)
+    queue.put('b0', 'b', BULK)
+    queue.put('b1', 'b', BULK)
+
+    assert drain(queue) == ['a0', 'b0', 'a1', 'b1', 'a2', 'a3']
+
+
+def test_weights_give_consecutive_turns():
+    queue = FairQueue(weights={'a': 2})
+    for index in range(4):
+        queue.put(f'a{index}', 'a', BULK)
+        queue.put(f'b{index}', 'b', BULK)
+
+    assert drain(queue) == ['a0', 'a1', 'b0', 'a2', 'a3', 'b1', 'b2', 'b3']
+
+
+def test_interactive_overtakes_bulk_without_starving_it():
+    queue = FairQueue(max_priority_burst=2)
+    for index in range(3):
+        queue.put(f'bulk{index}', 'a', BULK)
+    for index in range(5):
+        queue.put(f'single{index}', 'b', INTERACTIVE)
+
+    assert drain(queue) == ['single0', 'single1', 'bulk0', 'single2', 'single3', 'bulk1', 'single4', 'bulk2']
+
+
+def test_limits_raise_queue_full():
+    queue = FairQueue(maxsize=3, per_client=2)
+    queue.put(1, 'a', BULK)
+    queue.put(2, 'a', BULK)
+    with pytest.raises(QueueFull):
+        queue.put(3, 'a', BULK)
+
+    queue.put(3, 'b', BULK)
+    with pytest.raises(QueueFull) as error:
+        queue.put(4, 'c', BULK, retry_after=7)
+    assert error.value.retry_after == 7
+
+    with pytest.raises(ValueError):
+        FairQueue().put(1, 'a', 'urgent')
+
+
+def test_removed_items_are_never_served():
+    queue = FairQueue(per_client=2)
+    queue.put('a0', 'a', BULK)
+    queue.put('a1', 'a', BULK)
+    queue.put('b0', 'b', INTERACTIVE)
+
+    assert queue.remove('b0') and queue.remove('a0')
+    assert not queue.remove('a0')
+    queue.put('a2', 'a', BULK)
+    assert drain(queue) == ['a1', 'a2']
+
+
+def test_get_blocks_until_put():
+    queue = FairQueue()
+    got = []
+    thread = threading.Thread(target=lambda: got.append(queue.get()))
+    thread.start()
+    queue.put('job', 'a', INTERACTIVE)
+    thread.join(timeout=5)
+    assert got == ['job']
+
+
+def test_full_queue_returns_429(client, backend, bridge, monkeypatch):
+    backend.delay = 0.2
+    monkeypatch.setattr(bridge.jobs._queue, 'per_client', 1)
+
+    headers = {'X-Client-Id': 'batch-agent'}
+    first = client.post('/jobs', json={'kind': 'pbr-set', 'prompt': 'oak', 'maps': ['albedo'], 'steps': 2}, headers=headers)
+    second = client.post('/jobs', json={'kind': 'pbr-set', 'prompt': 'ash', 'maps': ['albedo'], 'steps': 2}, headers=headers)
+    third = client.post('/jobs', json={'kind': 'pbr-set', 'prompt': 'elm', 'maps': ['albedo'], 'steps': 2}, headers=headers)
+
+    assert first.status_code == 202
+    assert first.json['priority'] == 'bulk'
+    statuses = [second.status_code, third.status_code]
+    assert 429 in statuses
+    rejected = [response for response in (second, third) if response.status_code == 429][0]
+    assert int(rejected.headers['Retry-After']) >= 1
+
+    other = client.post('/jobs', json={'kind': 'texture', 'prompt': 'slate', 'steps': 2}, headers={'X-Client-Id': 'editor'})
+    assert other.status_code == 202
+    assert other.json['priority'] == 'interactive'
+
+    for response in (first, second, third, other):
+        if response.status_code == 202:
+            bridge.jobs.get(response.json['job_id']).wait(10)
@@ -0,0 +1,88 @@
+"""
+Staged startup: the early responder on the bound port, its hand-over, and phase timings
+"""
+
+import http.client
+import json
+import threading
+
+from flask import Flask
+from werkzeug.serving import make_server
+
+from bridge_startup import EarlyServer, StartupPhases, bind_listener
+
+
+def request(port, method, path, body=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    connection.request(method, path, body=body)
+    response = connection.getresponse()
+    payload = response.read()
+    connection.close()
+    return response, json.loads(payload)
+
+
+def test_early_server_answers_liveness_while_starting():
+    phases = StartupPhases()
+    phases.enter('bind')
+    listener = bind_listener('127.0.0.1', 0)
+    port = listener.getsockname()[1]
+    server = EarlyServer(listener, phases)
+    server.start()
+    phases.enter('imports')
+    try:
+        response, body = request(port, 'GET', '/health/live')
+        assert response.status == 200 and body['live']
+        assert body['startup']['phase'] == 'imports'
+        assert 'bind' in body['startup']['phases']
+
+        response, body = request(port, 'GET', '/health')
+        assert response.status == 200 and body['status'] == 'starting' and not body['ready']
+
+        response, _ = request(port, 'GET', '/health/ready')
+        assert response.status == 503
+
+        response, body = request(port, 'POST', '/generate-texture', body=b'{"prompt": "oak"}')
+        assert response.status == 503
+        assert response.getheader('Retry-After') == '5'
+        assert not body['success']
+    finally:
+        server.stop()
+        listener.close()
+
+
+def test_flask_takes_over_the_bound_socket():
+    listener = bind_listener('127.0.0.1', 0)
+    port = listener.getsockname()[1]
+    early = EarlyServer(listener, StartupPhases())
+    early.start()
+    assert request(port, 'GET', '/health/ready')[0].status == 503
+    early.stop()
+
+    app = Flask(__name__)
+    app.add_url_rule('/health/ready', 'ready', lambda: {'ready': True})
+    server = make_server('127.0.0.1', port, app, threaded=True, fd=listener.fileno())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        response, body = request(port, 'GET', '/health/ready')
+        assert response.status == 200 and body['ready']
+    finally:
+        server.shutdown()
+        listener.close()
+
+
+def test_phases_are_timed_in_order():
+    phases = StartupPhases()
+    for name in ('bind', 'imports', 'addon'):
+        phases.enter(name)
+
+    assert phases.finish() >= 0
+    startup = phases.to_dict()
+    assert startup['phase'] is None
+    assert list(startup['phases']) == ['bind', 'imports', 'addon']
+
+
+def test_bridge_reports_startup_phases(client):
+    startup = client.get('/health/ready').json['startup']
+
+    assert startup['phase'] is None
+    assert {'imports', 'addon', 'resolve'} <= set(startup['phases'])
@@ -0,0 +1,106 @@
+"""
+Persistent job store: results survive a restart, pending jobs are re-queued, files expire
+"""
+
+import os
+import threading
+
+from bridge_encode import EncodedImage
+from bridge_jobs import MAX_ATTEMPTS, JobManager
+from bridge_store import JobStore
+
+
+def test_finished_results_survive_a_restart(tmp_path):
+    def handler(job):
+        return {
+            'image': EncodedImage(b'albedo bytes', 'webp'),
+            'maps': {'ao': EncodedImage(b'albedo bytes'), 'normal': None},
+            'resolution': 64
+        }
+
+    manager = JobManager({'texture': handler}, store=JobStore(str(tmp_path)))
+    job = manager.submit('texture', {'prompt': 'oak'}, client='alice')
+    assert job.wait(5)
+
+    # A new process: nothing in memory, same directory
+    store = JobStore(str(tmp_path))
+    restored = JobManager({'texture': handler}, store=store).get(job.id)
+
+    assert (restored.state, restored.client, restored.params) == ('succeeded', 'alice', {'prompt': 'oak'})
+    assert restored.result['image'] == b'albedo bytes' and restored.result['image'].format == 'webp'
+    assert restored.result['maps'] == {'ao': b'albedo bytes', 'normal': None}
+    # Identical images are stored once
+    assert store.stats()['files'] == 1
+
+
+def test_stored_jobs_leave_memory_after_a_short_retention(tmp_path):
+    manager = JobManager({'texture': lambda job: {'image': EncodedImage(b'albedo bytes')}},
+                         store=JobStore(str(tmp_path)), persisted_retention=0)
+    job = manager.submit('texture', {'prompt': 'oak'})
+    assert job.wait(5)
+
+    assert manager.prune() == 1
+    served = manager.get(job.id)
+    assert served is not job
+    assert served.state == 'succeeded' and served.result['image'] == b'albedo bytes'
+
+
+def test_pending_jobs_are_requeued(tmp_path):
+    release = threading.Event()
+    crashed = JobManager({'texture': lambda job: release.wait()}, store=JobStore(str(tmp_path)))
+    running = crashed.submit('texture', {'prompt': 'running'})
+    queued = crashed.submit('texture', {'prompt': 'queued'})
+
+    manager = JobManager({'texture': lambda job: {'prompt': job.params['prompt']}}, store=JobStore(str(tmp_path)))
+    assert manager.restore() == 2
+    assert manager.get(running.id).wait(5) and manager.get(queued.id).wait(5)
+    assert manager.get(running.id).result == {'prompt': 'running'}
+    assert manager.get(running.id).attempts == 2
+    assert manager.get(queued.id).attempts == 1
+    release.set()
+
+
+def test_jobs_interrupted_too_often_are_failed(tmp_path):
+    store = JobStore(str(tmp_path))
+    crashed = JobManager({'texture': lambda job: threading.Event().wait()}, store=store)
+    job = crashed.submit('texture', {'prompt': 'crashes blender'})
+    job.attempts = MAX_ATTEMPTS
+    store.save(job)
+
+    manager = JobManager({'texture': lambda job: {}}, store=JobStore(str(tmp_path)))
+    assert manager.restore() == 0
+    assert manager.get(job.id).state == 'failed'
+    assert 'interrupted' in manager.get(job.id).error
+
+
+def test_ttl_and_size_expiry(tmp_path):
+    store = JobStore(str(tmp_path), ttl=100, max_bytes=100)
+    results = iter([
+        {'image': EncodedImage(b'a' * 10)},
+        {'image': EncodedImage(b'b' * 10), 'copy': EncodedImage(b'a' * 10)},
+        {'image': EncodedImage(b'c' * 10)}
+    ])
+    manager = JobManager({'texture': lambda job: next(results)}, store=store)
+    first, second, third = [manager.submit('texture', {'prompt': str(index)}) for index in range(3)]
+    for job in (first, second, third):
+        assert job.wait(5)
+
+    # Past the TTL the first job goes, but its image is still used by the second
+    first.finished_at -= 1000
+    store.save(first)
+    store.expire()
+    assert store.load(first.id) is None
+    assert store.load(second.id)['result']['copy'] == b'a' * 10
+    assert store.stats()['bytes'] == 30
+
+    # Over the size limit the oldest jobs go until the files fit
+    store.max_bytes = 15
+    store.expire()
+    assert store.load(second.id) is None
+    assert store.load(third.id)['result']['image'] == b'c' * 10
+    assert store.stats()['files'] == 1
+
+    store.expire(now=third.finished_at + 101)
+    assert store.load(third.id) is None
+    assert store.stats()['files'] == 0
+    assert not any(files for _, _, files in os.walk(store.files_directory))
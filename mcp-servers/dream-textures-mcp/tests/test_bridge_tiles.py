@@ -0,0 +1,99 @@
+"""
+Tiled high-resolution generation: tile layout, wrap-around feather blending
+"""
+
+import base64
+import io
+
+import bpy
+import numpy as np
+import pytest
+from PIL import Image
+
+from bridge_tiles import TileBlender, extract_tile, tile_grid, tile_starts
+
+
+def test_tiles_cover_the_ring_with_overlap():
+    size, tile, overlap = 1000, 256, 32
+    starts = tile_starts(size, tile, overlap)
+
+    ends = [start + tile for start in starts]
+    following = starts[1:] + [starts[0] + size]
+    assert all(end - start >= overlap for end, start in zip(ends, following))
+    assert tile_starts(200, 256, 32) == [0]
+
+
+def test_blending_unchanged_tiles_reproduces_the_image():
+    image = np.random.default_rng(1).integers(0, 256, (300, 300, 3), dtype=np.uint8)
+    blender = TileBlender(300, 128, 24)
+    for top, left in tile_grid(300, 128, 24):
+        blender.add(top, left, extract_tile(image, top, left, 128))
+
+    assert np.abs(blender.result().astype(int) - image).max() <= 1
+
+
+def test_feathering_hides_seams_including_the_wrap():
+    size, tile, overlap = 256, 96, 24
+    blender = TileBlender(size, tile, overlap, channels=1)
+    for index, (top, left) in enumerate(tile_grid(size, tile, overlap)):
+        # Every tile comes back a different flat shade
+        blender.add(top, left, np.full((tile, tile, 1), 20 * (index % 4), dtype=np.uint8))
+
+    result = blender.result()[..., 0].astype(int)
+    steps = [np.abs(result - np.roll(result, 1, axis=axis)).max() for axis in (0, 1)]
+    assert max(steps) <= 12
+
+
+def test_tiled_texture_generates_at_tile_size(client, backend):
+    response = client.post('/generate-texture', json={
+        'prompt': 'cobblestones',
+        'resolution': 256,
+        'steps': 2,
+        'tiling': 'on',
+        'tile_size': 128,
+        'tile_overlap': 16
+    })
+
+    assert response.status_code == 200
+    assert response.json['tiled'] is True
+    assert [call.size for call in backend.calls] == [(128, 128)]
+    image = Image.open(io.BytesIO(base64.b64decode(response.json['image'])))
+    assert image.size == (256, 256)
+    assert len(bpy.data.images) == 0
+
+
+def test_auto_tiling_only_above_the_direct_limit(client, backend):
+    response = client.post('/generate-texture', json={'prompt': 'sand', 'resolution': 64, 'steps': 1})
+
+    assert response.json['tiled'] is False
+    assert client.post('/generate-texture', json={'prompt': 'sand', 'tiling': 'sometimes'}).status_code == 400
+    assert client.post('/generate-texture', json={'prompt': 'sand', 'tile_overlap': 400}).status_code == 400
+
+
+@pytest.mark.parametrize('body', [{'resolution': 0}, {'resolution': -64}, {'resolution': 65536}, {'steps': 0}])
+def test_resolution_and_steps_are_bounded(client, backend, body):
+    response = client.post('/generate-texture', json={'prompt': 'sand', **body})
+
+    assert response.status_code == 400
+    assert backend.calls == []
+
+
+def test_fixed_seed_tiled_maps_are_reproducible(client, backend, cache, monkeypatch):
+    seeds = []
+    refine = bpy.ops.dream_textures.refine_texture
+
+    def recording(seed, **kwargs):
+        seeds.append(seed)
+        return refine.function(**kwargs)
+
+    monkeypatch.setattr(bpy.ops.dream_textures, 'refine_texture', bpy.Operator(recording, *refine.properties, 'seed'))
+    body = {'prompt': 'cobblestones', 'resolution': 256, 'seed': 11, 'steps': 2, 'tiling': 'on',
+            'tile_size': 128, 'tile_overlap': 16}
+
+    first = client.post('/generate-texture', json=body).json['image']
+    cache.purge()
+    second = client.post('/generate-texture', json=body).json['image']
+
+    assert first == second
+    assert len(backend.calls) == 2
+    assert seeds and set(seeds) == {11}
@@ -0,0 +1,52 @@
+"""
+Content negotiation between JSON/base64, image/png and multipart/mixed
+"""
+
+import email
+import io
+import json
+
+from PIL import Image
+
+
+def parse_multipart(response):
+    message = email.message_from_bytes(
+        f"Content-Type: {response.headers['Content-Type']}\r\n\r\n".encode() + response.get_data()
+    )
+    return {part.get_param('name', header='content-disposition'): part.get_payload(decode=True) for part in message.get_payload()}
+
+
+def test_json_stays_the_default(client):
+    response = client.post('/generate-texture', json={'prompt': 'oak', 'steps': 1, 'resolution': 64},
+                           headers={'Accept': 'application/json, text/plain, */*'})
+
+    assert response.mimetype == 'application/json'
+    assert isinstance(response.json['image'], str)
+
+
+def test_single_map_as_raw_png(client):
+    response = client.post('/generate-texture', json={'prompt': 'oak', 'map_type': 'normal', 'steps': 1, 'resolution': 64},
+                           headers={'Accept': 'image/png'})
+
+    assert response.mimetype == 'image/png'
+    assert response.headers['X-Dream-map-type'] == 'normal'
+    assert Image.open(io.BytesIO(response.get_data())).size == (64, 64)
+
+
+def test_pbr_set_as_multipart(client):
+    response = client.post('/generate-pbr-set', json={'prompt': 'oak', 'maps': ['albedo', 'ao'], 'steps': 1, 'resolution': 64},
+                           headers={'Accept': 'multipart/mixed'})
+
+    parts = parse_multipart(response)
+    metadata = json.loads(parts.pop('metadata'))
+
+    assert metadata['maps'] == {'albedo': 'maps.albedo', 'ao': 'maps.ao'}
+    assert set(parts) == {'maps.albedo', 'maps.ao'}
+    assert all(data.startswith(b'\x89PNG') for data in parts.values())
+
+
+def test_pbr_set_cannot_be_a_single_png(client):
+    response = client.post('/generate-pbr-set', json={'prompt': 'oak', 'maps': ['albedo', 'ao'], 'steps': 1, 'resolution': 64},
+                           headers={'Accept': 'image/png'})
+
+    assert response.status_code == 406